@@ -182,16 +182,17 @@ class SensorCloudClient:
         packer.pack_int(len(data_points))
 
         # Handle different data point formats
-        timestamp_ns = int(time.time() * 1000000000)
-        sample_interval_ns = int(1e9 / sample_rate) if sample_rate_type == self.HERTZ else int(sample_rate * 1e9)
+        start_ns = int(time.time() * 1000000000)
+        sample_index = 0
 
         print(f"Uploading {len(data_points)} data points...")
         for point in data_points:
             if isinstance(point, tuple) and len(point) == 2:
                 ts, value = point
             else:
-                ts, value = timestamp_ns, point
-                timestamp_ns += sample_interval_ns
+                # offsets are computed from the first sample with integer math so they don't drift
+                ts, value = start_ns + self._sample_offset_ns(sample_index, sample_rate, sample_rate_type), point
+                sample_index += 1
 
             packer.pack_hyper(ts)
             packer.pack_float(float(value))
@@ -210,6 +211,12 @@ class SensorCloudClient:
             print(f"✗ Error uploading data: {error}")
             return False
 
+    def _sample_offset_ns(self, index, sample_rate, sample_rate_type):
+        """Exact nanosecond offset of sample number index from the first sample."""
+        if sample_rate_type == self.HERTZ:
+            return index * 1000000000 // sample_rate
+        return index * sample_rate * 1000000000
+
     def upload_sin_wave(self, sensor_name, channel_name, duration_minutes=10, frequency_hz=10, timestamp_ns=time.time_ns()):
         """
         Upload generated sine wave data (useful for testing).
@@ -227,13 +234,12 @@ class SensorCloudClient:
         total_points = duration_minutes * 60 * frequency_hz
         print(f"Generating {total_points} sine wave data points ({duration_minutes} minutes at {frequency_hz} Hz)...")
 
-        sample_interval_ns = int(1e9 / frequency_hz)
         data_points = []
 
         for i in range(total_points):
-            value = math.sin(timestamp_ns / 20000000000.0)
-            data_points.append((timestamp_ns, value))
-            timestamp_ns += sample_interval_ns
+            ts = timestamp_ns + self._sample_offset_ns(i, frequency_hz, self.HERTZ)
+            value = math.sin(ts / 20000000000.0)
+            data_points.append((ts, value))
 
         return self.upload_data(sensor_name, channel_name, data_points, sample_rate=frequency_hz)
 
@@ -0,0 +1,57 @@
+"""
+Measure how long it takes to create a Device from a cache file as the number of cached channels grows.
+
+usage: python benchmarks/cache_startup.py [channels ...]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.append(os.getcwd())
+
+import sensorcloud
+
+CHANNELS_PER_SENSOR = 100
+
+def make_cache(path, channel_count):
+    sensors = {}
+    for i in xrange(channel_count):
+        sensor = sensors.setdefault("sensor_%d" % (i // CHANNELS_PER_SENSOR), {})
+        sensor["channel_%d" % i] = {
+            "timeseries_partitions": {"10 hertz": {"last_timestamp": 1388534400000000000 + i}},
+            "histogram_partitions": {},
+        }
+    with open(path, 'wb') as f:
+        f.write(json.dumps({"token": "token", "server": "https://dsx.sensorcloud.microstrain.com", "sensors": sensors}))
+
+def measure(path):
+    start = time.time()
+    device = sensorcloud.Device("FAKE", "fake", cache_file=path)
+    startup = time.time() - start
+
+    start = time.time()
+    channel = device.sensor("sensor_0").channel("channel_0")
+    channel.last_timeseries_timestamp()
+    first_use = time.time() - start
+
+    return startup, first_use
+
+def main():
+    counts = [int(c) for c in sys.argv[1:]] or [1000, 10000, 50000, 100000]
+
+    print "%10s %12s %14s %14s" % ("channels", "file (MB)", "startup (ms)", "first use (ms)")
+    for count in counts:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            make_cache(path, count)
+            startup, first_use = measure(path)
+            print "%10d %12.2f %14.2f %14.2f" % (count, os.path.getsize(path) / 1e6, startup * 1000, first_use * 1000)
+        finally:
+            os.unlink(path)
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,13 @@ See file license.txt
 import sys
 from samplerate import SampleRate
 from device import Device
-from point import Point
+from point import Point, PointBlock
 from histogram import Histogram
+from ratelimit import RateLimiter, UploadScheduler, LIVE, BACKFILL
+from ringbuffer import RingBufferPool
+from pipeline import Scale, Biquad, Expression
+from materialize import Materializer
+from follow import Follower, FollowScheduler
 from error import *
 
 __version__ = '0.3.1'
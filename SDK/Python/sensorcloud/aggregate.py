@@ -0,0 +1,235 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Aggregation of raw samples into lower rate summary channels.
+
+A WindowAggregator splits samples into windows, one per interval of a coarse sample rate.  It keeps a running
+count, sum, sum of squares, min and max for each window that's still open, so its memory doesn't grow with the number
+of samples.  A window is closed once a sample arrives that is later than the end of the window plus the allowed
+lateness.  Samples that arrive for a window that's already closed are dropped and counted in late_samples.  numpy
+is used to summarize a whole block of samples at once when it's available.
+
+A ChannelAggregator puts a WindowAggregator in front of Channel.timeseries_append.  The summaries of each statistic
+are uploaded to a derived channel on the same sensor, and the raw samples can be uploaded in full, downsampled or not
+at all.
+"""
+
+import math
+from collections import namedtuple
+
+from point import PointBlock
+from samplerate import HERTZ, SampleRate
+
+STATISTICS = ("min", "max", "mean", "rms", "count")
+
+Summary = namedtuple("Summary", ["timestamp", "count", "min", "max", "mean", "rms"])
+
+def derived_channel_name(channel_name, statistic):
+    """
+    name of the channel a statistic of channel_name is uploaded to.  Channel names can only contain letters, digits,
+    '-' and '_', so the rms of accel_x goes to accel_x_rms
+    """
+    return "%s_%s" % (channel_name, statistic)
+
+class WindowAggregator(object):
+
+    def __init__(self, sample_rate, lateness=0):
+        """
+        sample_rate - rate of the summaries, each window is one interval of the rate, e.g. SampleRate.seconds(10)
+        lateness    - nanoseconds a sample can arrive behind the latest sample and still be counted in its window
+        """
+        self._sample_rate = sample_rate
+        self._lateness = lateness
+
+        # interval -> [count, sum, sum of squares, min, max]
+        self._windows = {}
+        self._latest = None
+        self._closed_below = 0
+        self.late_samples = 0
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @property
+    def open_windows(self):
+        return len(self._windows)
+
+    def push(self, timestamps, values):
+        """
+        add samples and return the Summaries of the windows that closed, in time order.  Samples don't have to be
+        in time order, as long as they're no later than the allowed lateness.
+        """
+        if len(timestamps) == 0:
+            return []
+
+        try:
+            import numpy as np
+        except ImportError:
+            latest = self._push_samples(timestamps, values)
+        else:
+            latest = self._push_arrays(np, timestamps, values)
+
+        if self._latest is None or latest > self._latest:
+            self._latest = latest
+        watermark = max(0, self._latest - self._lateness)
+        return self._close(self._sample_rate.interval_index(watermark))
+
+    def flush(self):
+        """
+        close every open window and return their Summaries
+        """
+        if not self._windows:
+            return []
+        return self._close(max(self._windows) + 1)
+
+    def _push_samples(self, timestamps, values):
+        interval_index = self._sample_rate.interval_index
+        for timestamp, value in zip(timestamps, values):
+            interval = interval_index(timestamp)
+            if interval < self._closed_below:
+                self.late_samples += 1
+                continue
+            value = float(value)
+            window = self._windows.get(interval)
+            if window is None:
+                self._windows[interval] = [1, value, value * value, value, value]
+            else:
+                window[0] += 1
+                window[1] += value
+                window[2] += value * value
+                window[3] = min(window[3], value)
+                window[4] = max(window[4], value)
+        return max(timestamps)
+
+    def _push_arrays(self, np, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.float64)
+        latest = int(timestamps.max())
+
+        intervals = self._sample_rate.interval_indexes(timestamps)
+        on_time = intervals >= np.uint64(self._closed_below)
+        if not on_time.all():
+            self.late_samples += int(len(intervals) - on_time.sum())
+            intervals, values = intervals[on_time], values[on_time]
+            if len(intervals) == 0:
+                return latest
+
+        # sort the samples by window, a stable sort is nearly free on data that's already in order
+        order = np.argsort(intervals, kind="mergesort")
+        intervals, values = intervals[order], values[order]
+        starts = np.concatenate(([0], np.flatnonzero(intervals[1:] != intervals[:-1]) + 1))
+
+        counts = np.diff(np.append(starts, len(values)))
+        sums = np.add.reduceat(values, starts)
+        squares = np.add.reduceat(values * values, starts)
+        minimums = np.minimum.reduceat(values, starts)
+        maximums = np.maximum.reduceat(values, starts)
+
+        for interval, count, total, square, minimum, maximum in zip(intervals[starts].tolist(), counts.tolist(),
+                                                                     sums.tolist(), squares.tolist(),
+                                                                     minimums.tolist(), maximums.tolist()):
+            window = self._windows.get(interval)
+            if window is None:
+                self._windows[interval] = [count, total, square, minimum, maximum]
+            else:
+                window[0] += count
+                window[1] += total
+                window[2] += square
+                window[3] = min(window[3], minimum)
+                window[4] = max(window[4], maximum)
+        return latest
+
+    def _close(self, below):
+        """
+        close the windows before interval below
+        """
+        if below <= self._closed_below:
+            return []
+        self._closed_below = below
+
+        summaries = []
+        for interval in sorted(k for k in self._windows if k < below):
+            count, total, squares, minimum, maximum = self._windows.pop(interval)
+            summaries.append(Summary(timestamp=self._sample_rate.sample_offset(interval), count=count,
+                                     min=minimum, max=maximum, mean=total / count,
+                                     rms=math.sqrt(squares / count)))
+        return summaries
+
+class ChannelAggregator(object):
+    """
+    a stage in front of Channel.timeseries_append that uploads per window summaries to derived channels.  e.g.
+        aggregator = channel.aggregator(SampleRate.seconds(10), lateness=2 * 10 ** 9, raw=False)
+        aggregator.timeseries_append(SampleRate.hertz(1000), block)
+        ...
+        aggregator.flush()
+    """
+
+    def __init__(self, channel, sample_rate, statistics=STATISTICS, lateness=0, raw=True):
+        """
+        channel     - the channel that gets the raw data, the summaries go to derived channels on the same sensor
+        sample_rate - rate of the summaries
+        statistics  - the statistics to upload, any of min, max, mean, rms and count
+        lateness    - nanoseconds a sample can arrive behind the latest sample and still be counted
+        raw         - True to upload every raw sample, False to upload none, or n to upload every nth sample
+        """
+        for statistic in statistics:
+            if statistic not in STATISTICS:
+                raise ValueError("unknown statistic: %s" % statistic)
+        self._channel = channel
+        self._statistics = tuple(statistics)
+        self._aggregator = WindowAggregator(sample_rate, lateness)
+        self._raw = raw
+        self._raw_phase = 0
+
+    @property
+    def late_samples(self):
+        return self._aggregator.late_samples
+
+    def derived_channel(self, statistic):
+        return self._channel.sensor.channel(derived_channel_name(self._channel.name, statistic))
+
+    def timeseries_append(self, samplerate, data):
+        """
+        takes the same arguments as Channel.timeseries_append
+        """
+        block = PointBlock.from_points(data)
+        self._append_raw(samplerate, block)
+        self._upload(self._aggregator.push(block.timestamps, block.values))
+
+    def flush(self):
+        """
+        close the open windows and upload their summaries
+        """
+        self._upload(self._aggregator.flush())
+
+    def _append_raw(self, samplerate, block):
+        if self._raw is True:
+            self._channel.timeseries_append(samplerate, block)
+        elif self._raw:
+            step = int(self._raw)
+            rate = _downsampled_rate(samplerate, step)
+            first = -self._raw_phase % step
+            self._raw_phase = (self._raw_phase + len(block)) % step
+            self._channel.timeseries_append(rate, block[first::step])
+
+    def _upload(self, summaries):
+        if not summaries:
+            return
+        timestamps = [summary.timestamp for summary in summaries]
+        for statistic in self._statistics:
+            values = [float(getattr(summary, statistic)) for summary in summaries]
+            self.derived_channel(statistic).timeseries_append(self._aggregator.sample_rate,
+                                                              PointBlock(timestamps, values))
+
+def _downsampled_rate(sample_rate, step):
+    if sample_rate.rate_type == HERTZ:
+        if sample_rate.rate % step:
+            raise ValueError("%s can't be downsampled by %d" % (sample_rate, step))
+        return SampleRate.hertz(sample_rate.rate // step)
+    return SampleRate.seconds(sample_rate.rate * step)
@@ -0,0 +1,224 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Alignment of several channels onto a common time grid.
+
+Each channel is read a page at a time through a cursor that only holds the points that are still needed: the last
+point at or before the next grid time and the points after it.  The grid is filled a block at a time, up to the
+earliest time every channel has data past (the horizon), so a grid time always has its neighbours on both sides
+loaded.  Within a block each channel is matched to the grid with searchsorted, so the work is a handful of vectorized
+operations per block no matter how many points there are.
+
+The grid is either a SampleRate, whose intervals are aligned to the unix epoch the same way SampleRate.timestamps is,
+or "union", every timestamp of any of the channels, which is a k-way merge of the channels.  Methods:
+
+    nearest  the value of the closest point, the earlier one on a tie
+    linear   linear interpolation between the points on either side, nan outside of the channel's data
+    ffill    the value of the last point at or before the grid time
+
+Only points between start and end are used, so the first grid times can be nan for linear and ffill.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from samplerate import SampleRate
+from csvdownload import parse_selector, to_nanoseconds
+
+METHODS = ("nearest", "linear", "ffill")
+
+DEFAULT_BLOCK_SIZE = 65536
+
+class AlignedBlock(namedtuple("AlignedBlock", ["timestamps", "values"])):
+    """
+    timestamps is a uint64 array of grid times, values is a 2-D float32 array with one column per channel.  Grid times
+    a channel has no value for are nan.
+    """
+    __slots__ = ()
+
+class _Cursor(object):
+    """
+    the points of one channel that are still needed, refilled a page at a time
+    """
+
+    def __init__(self, blocks):
+        self._blocks = iter(blocks)
+        self.timestamps = np.empty(0, dtype=np.uint64)
+        self.values = np.empty(0, dtype=np.float32)
+        self.exhausted = False
+
+    @property
+    def last(self):
+        return int(self.timestamps[-1]) if len(self.timestamps) else None
+
+    def fetch(self):
+        """
+        load the next page, returns False once the channel has no more data
+        """
+        for block in self._blocks:
+            if len(block) == 0:
+                continue
+            timestamps, values = block.to_numpy()
+            self.timestamps = np.concatenate((self.timestamps, timestamps))
+            self.values = np.concatenate((self.values, values))
+            return True
+        self.exhausted = True
+        return False
+
+    def fill_past(self, timestamp):
+        """
+        load pages until there's a point after timestamp or the data runs out
+        """
+        while not self.exhausted and (self.last is None or self.last <= timestamp):
+            if self.fetch():
+                self.drop_before(timestamp)
+
+    def drop_before(self, timestamp):
+        """
+        drop the points that can't be a neighbour of timestamp or any later time
+        """
+        keep = max(0, int(np.searchsorted(self.timestamps, np.uint64(timestamp), side="right")) - 1)
+        if keep:
+            self.timestamps = self.timestamps[keep:]
+            self.values = self.values[keep:]
+
+def align_column(timestamps, values, grid, method, tolerance=None):
+    """
+    values of a channel at the grid times.  timestamps and grid are sorted uint64 arrays.  Values further than
+    tolerance nanoseconds from the point they came from are nan.
+    """
+    result = np.full(len(grid), np.nan, dtype=np.float64)
+    if len(timestamps) == 0 or len(grid) == 0:
+        return result.astype(np.float32)
+
+    values = values.astype(np.float64)
+    # the last point at or before each grid time and the first point at or after it
+    left = np.searchsorted(timestamps, grid, side="right") - 1
+    right = np.searchsorted(timestamps, grid, side="left")
+    has_left = left >= 0
+    has_right = right < len(timestamps)
+    left = np.maximum(left, 0)
+    right = np.minimum(right, len(timestamps) - 1)
+
+    # distances as signed integers, uint64 timestamps can't be subtracted in either order
+    to_left = (grid.astype(np.int64) - timestamps[left].astype(np.int64)).astype(np.float64)
+    to_right = (timestamps[right].astype(np.int64) - grid.astype(np.int64)).astype(np.float64)
+
+    if method == "ffill":
+        result[has_left] = values[left][has_left]
+        distance = to_left
+
+    elif method == "nearest":
+        use_left = has_left & (~has_right | (to_left <= to_right))
+        use_right = has_right & ~use_left
+        result[use_left] = values[left][use_left]
+        result[use_right] = values[right][use_right]
+        distance = np.where(use_left, to_left, to_right)
+
+    elif method == "linear":
+        exact = has_left & (to_left == 0)
+        between = has_left & has_right & ~exact
+        weight = to_left[between] / (to_left[between] + to_right[between])
+        result[between] = values[left][between] + (values[right][between] - values[left][between]) * weight
+        result[exact] = values[left][exact]
+        distance = np.where(exact, 0, np.maximum(to_left, to_right))
+
+    else:
+        raise ValueError("unknown alignment method: %s" % method)
+
+    if tolerance is not None:
+        result[distance > tolerance] = np.nan
+    return result.astype(np.float32)
+
+class Alignment(object):
+    """
+    several channels aligned onto a common time grid, iterated a block at a time.  e.g.
+        for block in device.aligned(["bearing:x", "bearing:y"], start, end, SampleRate.hertz(100), "linear"):
+            rms = np.sqrt(np.nanmean(block.values ** 2, axis=0))
+    """
+
+    def __init__(self, device, selectors, start, end, grid="union", method="nearest", tolerance=None,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        if method not in METHODS:
+            raise ValueError("unknown alignment method: %s" % method)
+        if not isinstance(grid, SampleRate) and grid != "union":
+            raise ValueError("grid must be a SampleRate or 'union'")
+
+        self._channels = [device.sensor(sensor).channel(channel)
+                          for sensor, channel in (parse_selector(s) for s in selectors)]
+        self._start = to_nanoseconds(start)
+        self._end = to_nanoseconds(end)
+        self._grid = grid
+        self._method = method
+        self._tolerance = tolerance
+        self._block_size = block_size
+
+    def __iter__(self):
+        return self.blocks()
+
+    def blocks(self):
+        cursors = [_Cursor(channel.timeseries_data(self._start, self._end).blocks()) for channel in self._channels]
+        if isinstance(self._grid, SampleRate):
+            grids = self._rate_grid(cursors)
+        else:
+            grids = self._union_grid(cursors)
+
+        for grid in grids:
+            columns = [align_column(cursor.timestamps, cursor.values, grid, self._method, self._tolerance)
+                       for cursor in cursors]
+            yield AlignedBlock(grid, np.column_stack(columns) if columns else np.empty((len(grid), 0), np.float32))
+            for cursor in cursors:
+                cursor.drop_before(int(grid[-1]) + 1)
+
+    def to_block(self):
+        """
+        the whole alignment as a single AlignedBlock
+        """
+        blocks = list(self.blocks())
+        if not blocks:
+            return AlignedBlock(np.empty(0, dtype=np.uint64), np.empty((0, len(self._channels)), dtype=np.float32))
+        return AlignedBlock(np.concatenate([b.timestamps for b in blocks]), np.vstack([b.values for b in blocks]))
+
+    def _horizon(self, cursors, position):
+        """
+        latest time every channel has its neighbours loaded for
+        """
+        for cursor in cursors:
+            cursor.fill_past(position)
+        return min([self._end] + [cursor.last for cursor in cursors if not cursor.exhausted])
+
+    def _rate_grid(self, cursors):
+        rate = self._grid
+        index = rate.interval_index(self._start)
+        if rate.sample_offset(index) < self._start:
+            index += 1
+        last = rate.interval_index(self._end)
+
+        while index <= last:
+            horizon = self._horizon(cursors, rate.sample_offset(index))
+            count = min(self._block_size, rate.interval_index(horizon) - index + 1)
+            grid = rate.interval_starts(np.arange(index, index + count, dtype=np.uint64))
+            index += count
+            yield grid
+
+    def _union_grid(self, cursors):
+        position = self._start
+        while position <= self._end:
+            horizon = self._horizon(cursors, position)
+            grid = np.unique(np.concatenate([c.timestamps[(c.timestamps >= np.uint64(position)) &
+                                                          (c.timestamps <= np.uint64(horizon))] for c in cursors]
+                                            + [np.empty(0, dtype=np.uint64)]))
+            if len(grid) == 0:
+                if all(cursor.exhausted for cursor in cursors):
+                    return
+                position = horizon + 1
+                continue
+            grid = grid[:self._block_size]
+            position = int(grid[-1]) + 1
+            yield grid
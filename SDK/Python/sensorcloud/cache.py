@@ -6,10 +6,12 @@ Created on Nov 13, 2014
 
 import json
 
+from partition import TimeSeriesKey, HistogramKey, PartitionIndex
+
 class Partition(object):
     @property
     def descriptor(self):
-        return self._descriptor
+        return _str(self._descriptor)
 
     @property
     def last_timestamp(self):
@@ -33,39 +35,63 @@ class ChannelCache(object):
     def name(self):
         return self._name
 
+    @property
+    def known(self):
+        """ true if the channel is known to exist on SensorCloud """
+        return self._cache.known_channel(self._name)
+
+    def mark_known(self):
+        self._cache.mark_known(self._name)
+
     @property
     def timeseries_partitions(self):
-        return [Partition(self._cache, descriptor, attributes) for descriptor, attributes in self._timeseries_partitions.items()]
+        return self.timeseries_index.values()
 
     @property
     def histogram_partitions(self):
-        return [Partition(self._cache, descriptor, attributes) for descriptor, attributes in self._histogram_partitions.items()]
+        return self.histogram_index.values()
+
+    @property
+    def timeseries_index(self):
+        """ PartitionIndex of the cached timeseries partitions, the descriptors are only parsed once """
+        if self._timeseries_index is None:
+            self._timeseries_index = _index(self._cache, TimeSeriesKey, self._timeseries_partitions)
+        return self._timeseries_index
+
+    @property
+    def histogram_index(self):
+        """ PartitionIndex of the cached histogram partitions, the descriptors are only parsed once """
+        if self._histogram_index is None:
+            self._histogram_index = _index(self._cache, HistogramKey, self._histogram_partitions)
+        return self._histogram_index
 
     def timeseries_partition(self, sample_rate):
-        descriptor = str(sample_rate)
-        if descriptor not in self._timeseries_partitions:
-            self._timeseries_partitions[descriptor] = {}
-        return Partition(self._cache, descriptor, self._timeseries_partitions[descriptor])
+        return self._partition(self.timeseries_index, self._timeseries_partitions, TimeSeriesKey(sample_rate))
 
     def delete_timeseries_partition(self, sample_rate):
-        descriptor = str(sample_rate)
-        try:
-            del self._timeseries_partitions[descriptor]
-        except KeyError:
-            pass
+        self._delete_partition(self.timeseries_index, self._timeseries_partitions, TimeSeriesKey(sample_rate))
 
     def histogram_partition(self, sample_rate, bin_start, bin_size, num_bins):
-        descriptor = "%s_%6e_%6e_%d" % (str(sample_rate), bin_start, bin_size, num_bins)
-        if descriptor not in self._histogram_partitions:
-            self._histogram_partitions[descriptor] = {}
-        return Partition(self._cache, descriptor, self._histogram_partitions[descriptor])
+        key = HistogramKey(sample_rate, bin_start, bin_size, num_bins)
+        return self._partition(self.histogram_index, self._histogram_partitions, key)
 
     def delete_histogram_partition(self, sample_rate, bin_start, bin_size, num_bins):
-        descriptor = "%s_%6e_%6e_%d" % (str(sample_rate), bin_start, bin_size, num_bins)
-        try:
-            del self._histogram_partitions[descriptor]
-        except KeyError:
-            pass
+        key = HistogramKey(sample_rate, bin_start, bin_size, num_bins)
+        self._delete_partition(self.histogram_index, self._histogram_partitions, key)
+
+    def _partition(self, index, partitions, key):
+        partition = index.get(key)
+        if partition is None:
+            descriptor = key.descriptor
+            partition = Partition(self._cache, descriptor, partitions.setdefault(descriptor, {}))
+            index[key] = partition
+        return partition
+
+    def _delete_partition(self, index, partitions, key):
+        partition = index.get(key)
+        if partition is not None:
+            del index[key]
+            partitions.pop(partition._descriptor, None)
 
     def save(self):
         self._cache.save()
@@ -79,6 +105,8 @@ class ChannelCache(object):
         if "histogram_partitions" not in attributes:
             attributes["histogram_partitions"] = {}
         self._histogram_partitions = attributes["histogram_partitions"]
+        self._timeseries_index = None
+        self._histogram_index = None
 
 class SensorCache(object):
 
@@ -86,9 +114,20 @@ class SensorCache(object):
     def name(self):
         return self._name
 
+    @property
+    def known(self):
+        """ true if the sensor is known to exist on SensorCloud """
+        return self._cache.known(self._name)
+
+    def known_channel(self, channel_name):
+        return self._cache.known(self._name, channel_name)
+
+    def mark_known(self, channel_name=None):
+        self._cache.mark_known(self._name, channel_name)
+
     @property
     def channels(self):
-        return [ChannelCache(self, channel[0], channel[1]) for channel in self._channels.items()]
+        return [ChannelCache(self, _str(channel[0]), channel[1]) for channel in self._channels.items()]
 
     def channel(self, name):
         if name not in self._channels:
@@ -103,13 +142,63 @@ class SensorCache(object):
         self._name = name
         self._channels = channels
 
+class JobCheckpoint(object):
+    """
+    how far a job has got through one partition of its source: the last source timestamp that was processed and the
+    last timestamp that was written to the output
+    """
+
+    @property
+    def source_timestamp(self):
+        return self._attributes.get('source_timestamp')
+
+    @source_timestamp.setter
+    def source_timestamp(self, value):
+        self._attributes['source_timestamp'] = long(value)
+
+    @property
+    def output_timestamp(self):
+        return self._attributes.get('output_timestamp')
+
+    @output_timestamp.setter
+    def output_timestamp(self, value):
+        self._attributes['output_timestamp'] = long(value)
+
+    def __init__(self, attributes):
+        self._attributes = attributes
+
+class JobCache(object):
+
+    @property
+    def name(self):
+        return self._name
+
+    def checkpoint(self, sample_rate):
+        """ JobCheckpoint for the source partition with sample_rate """
+        descriptor = TimeSeriesKey(sample_rate).descriptor
+        return JobCheckpoint(self._partitions.setdefault(descriptor, {}))
+
+    def reset(self):
+        """ forget every checkpoint, the next run starts from the beginning """
+        self._partitions.clear()
+
+    def save(self):
+        self._cache.save()
+
+    def __init__(self, cache, name, attributes):
+        self._cache = cache
+        self._name = name
+        self._partitions = attributes.setdefault("partitions", {})
+
 class Cache(object):
+    """
+    The cache file is only read the first time something in the cache is used.  Strings in the file are left as
+    unicode and only converted when a name or value is handed out, so loading a large cache is a single json parse.
+    """
 
     @property
     def server(self):
-        if 'server' in self._data:
-            return self._data["server"]
-        return None
+        return _str(self._data.get("server"))
 
     @server.setter
     def server(self, value):
@@ -117,9 +206,7 @@ class Cache(object):
 
     @property
     def token(self):
-        if 'token' in self._data:
-            return self._data['token']
-        return None
+        return _str(self._data.get("token"))
 
     @token.setter
     def token(self, value):
@@ -129,7 +216,7 @@ class Cache(object):
     def sensors(self):
         if 'sensors' not in self._data:
             self._data['sensors'] = {}
-        return [SensorCache(self, sensor[0], sensor[1]) for sensor in self._data['sensors'].items()]
+        return [SensorCache(self, _str(sensor[0]), sensor[1]) for sensor in self._data['sensors'].items()]
 
     def sensor(self, name):
         if 'sensors' not in self._data:
@@ -139,33 +226,56 @@ class Cache(object):
 
         return SensorCache(self, name, self._data['sensors'][name])
 
+    def job(self, name):
+        """ JobCache with the checkpoints of a materializer job """
+        return JobCache(self, name, self._data.setdefault('jobs', {}).setdefault(name, {}))
+
+    def known(self, sensor_name, channel_name=None):
+        """
+        true if the sensor, or the channel if channel_name is given, is known to exist on SensorCloud
+        """
+        channels = self._data.get('existing', {}).get(sensor_name)
+        if channels is None:
+            return False
+        return channel_name is None or channel_name in channels
+
+    def mark_known(self, sensor_name, channel_name=None):
+        channels = self._data.setdefault('existing', {}).setdefault(sensor_name, {})
+        if channel_name is not None:
+            channels[channel_name] = True
+
+    @property
+    def _data(self):
+        if self._loaded is None:
+            self._loaded = self._load()
+        return self._loaded
+
+    def _load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                return json.loads(f.read())
+        except: # the cache file doesn't exist yet
+            return {}
+
     def save(self):
         with open(self._path, 'wb') as f:
             f.write(json.dumps(self._data, encoding='utf8'))
 
     def __init__(self, path):
         self._path = path
-        self._data = {}
-        try:
-            self._data = json.loads(open(path, 'rb').read())
-            self._data = json_decode(self._data)
-        except: # the cache file doesn't exist yet
-            pass
+        self._loaded = None
 
-def json_decode(data):
-    def json_decode_unicode(data):
-        return data.encode('utf-8')
+def _str(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
 
-    def json_decode_list(data):
-        return [json_decode(i) for i in data]
-
-    def json_decode_dict(data):
-        return dict([(json_decode_unicode(k), json_decode(v)) for k,v in data.items()])
-
-    if isinstance(data, unicode):
-        return json_decode_unicode(data)
-    if isinstance(data, list):
-        return json_decode_list(data)
-    if isinstance(data, dict):
-        return json_decode_dict(data)
-    return data
+def _index(cache, key_type, partitions):
+    index = PartitionIndex()
+    for descriptor, attributes in partitions.items():
+        try:
+            key = key_type.from_descriptor(_str(descriptor))
+        except ValueError: # not a partition this version of the sdk understands
+            continue
+        index[key] = Partition(cache, descriptor, attributes)
+    return index
@@ -10,21 +10,71 @@ logger = logging.getLogger(__name__)
 
 import xdrlib
 import httplib
+import os
 import json
+import mmap
+from datetime import datetime
 from collections import namedtuple
 
-from util import nanosecond_to_timestamp as to_ts
-import timeseries
+from util import nanosecond_to_timestamp as to_ts, timestamp_to_nanosecond
 from timeseries import TimeSeriesStream
-from point import Point
-import histogram
+from timeseriesview import TimeSeriesView
+from point import Point, PointBlock, XDR_POINT_SIZE
 from histogram import Histogram
 from samplerate import SampleRate
+from partition import TimeSeriesKey, HistogramKey, PartitionIndex
+from aggregate import ChannelAggregator, STATISTICS
+from webrequest import Requests
 from error import *
 
 HistogramStreamInfo = namedtuple("HistogramStreamInfo", ["start_time", "end_time"])
 TimeSeriesStreamInfo = namedtuple("TimeSeriesStreamInfo", ["start_time", "end_time", "units"])
 Unit = namedtuple("Unit", ["stored_unit", "preferred_unit", "timestamp", "slope", "ofset"])
+ChannelInfo = namedtuple("ChannelInfo", ["name", "label", "description", "streams", "units"])
+
+def _slice(blob, start, end):
+    """
+    bytes [start, end) of a string, buffer, mmap or memoryview without copying them
+    """
+    if isinstance(blob, memoryview):
+        return blob[start:end]
+    return buffer(blob, start, end - start)
+
+def _tail(blob, size):
+    """
+    copy of the last size bytes of a blob, as a string
+    """
+    return str(bytearray(blob[len(blob) - size:]))
+
+def unpack_unit(unpacker):
+    stored_unit = unpacker.unpack_string()
+    preferred_unit = unpacker.unpack_string()
+    timestamp = unpacker.unpack_uhyper()
+    slope = unpacker.unpack_float()
+    offset = unpacker.unpack_float()
+    return Unit(stored_unit, preferred_unit, timestamp, slope, offset)
+
+def unpack_channel_info(unpacker):
+    """
+    unpack a channelInfo structure from a sensor or channel listing
+    """
+    name = unpacker.unpack_string()
+    label = unpacker.unpack_string()
+    description = unpacker.unpack_string()
+
+    streams = []
+    units = []
+    for _ in range(unpacker.unpack_uint()):
+        stream_type = unpacker.unpack_string()
+        streams.append(stream_type)
+        if stream_type == "TS_V1":
+            unpacker.unpack_int() # totalBytes
+            units = [unpack_unit(unpacker) for _ in range(unpacker.unpack_uint())]
+        elif stream_type != "FFT_V1":
+            # skip streams we don't understand
+            unpacker.unpack_fopaque(unpacker.unpack_int())
+
+    return ChannelInfo(name, label, description, streams, units)
 
 
 
@@ -43,10 +93,7 @@ class DoRequest_createChannel:
         """
         if response.status_code == httplib.NOT_FOUND:
 
-            print "here, " + str(response)
-
             if response.scerror and response.scerror.code == "404-001": #Sensor not found
-                print "creating sensor/channel"
                 logger.info("intercepted '404-001 Sensor Not Found' error and adding the sensor %s", self._channel.sensor.name)
                 self._channel.sensor.device.add_sensor(self._channel.sensor.name)
                 self._channel.sensor.add_channel(self._channel.name)
@@ -75,8 +122,15 @@ class Channel(object):
         self._timeseries_partitions = None
         self._histogram_partitions = None
 
+        self._label = None
+        self._description = None
+        self._units = None
+
         self._cache = cache
 
+        #True if the channel is known to exist, False if it's known not to, None if it hasn't been checked
+        self._exists = None
+
     @property
     def sensor(self):
         return self._sensor
@@ -85,6 +139,29 @@ class Channel(object):
     def name(self):
         return self._channel_name
 
+    @property
+    def label(self):
+        """ label of the channel, None until it's been read by Sensor.channels or Device.all_sensors """
+        return self._label
+
+    @property
+    def description(self):
+        """ description of the channel, None until it's been read by Sensor.channels or Device.all_sensors """
+        return self._description
+
+    def _prime(self, info):
+        """
+        called internally with the ChannelInfo from a channel listing so the stream info doesn't need to be requested again
+        """
+        self._mark_exists()
+        self._label = info.label
+        self._description = info.description
+        self._units = info.units
+
+        #a channel without a timeseries stream doesn't have any timeseries partitions
+        if "TS_V1" not in info.streams and self._timeseries_partitions is None:
+            self._timeseries_partitions = PartitionIndex()
+
     @property
     def last_point(self):
         if not self._last_point:
@@ -133,85 +210,70 @@ class Channel(object):
         """
         Get the timestamp for the last point stored for this channel with the given sample rate in nanoseconds since 1970
         """
-        def filter_fn(partition):
-            if sample_rate:
-                return sample_rate == partition['sample_rate']
-            return True
-
-        def filter_cache(partition):
-            return str(sample_rate) == partition.descriptor if sample_rate else True
-
-        if self._cache and self._cache.timeseries_partitions:
-            parts = filter(filter_cache, self._cache.timeseries_partitions)
+        if self._cache and self._cache.timeseries_index:
+            parts = self._cache.timeseries_index.find(sample_rate=sample_rate)
             if parts:
-                return max([p.last_timestamp for p in parts])
+                return max([p.last_timestamp for _, p in parts])
             return 0
 
-        parts = filter(filter_fn, self._get_timeseries_partitions().values())
+        parts = self._get_timeseries_partitions().find(sample_rate=sample_rate)
         if parts:
-            return max([p['end_time'] for p in parts])
+            return max([p['end_time'] for _, p in parts])
         return 0
 
     def first_timeseries_timestamp(self, sample_rate = None):
         """
         Get the timestamp for the first point stored for this channel with the given sample rate in nanoseconds since 1970
         """
-        def filter_fn(partition):
-            if sample_rate:
-                return sample_rate == partition['sample_rate']
-            return True
-
-        parts = filter(filter_fn, self._get_timeseries_partitions().values())
+        parts = self._get_timeseries_partitions().find(sample_rate=sample_rate)
+        parts = [p['start_time'] for _, p in parts if 'start_time' in p]
         if parts:
-            return min([p['start_time'] for p in parts])
+            return min(parts)
         return None
 
     def last_histogram_timestamp(self, sample_rate = None, bin_start = None, bin_size = None, num_bins = None):
         """
         Get the timestamp for the last histogram stored for this channel with the given sample rate and histogram parameters in nanoseconds since 1970
         """
-        def compare_floats(a, b):
-            return ("%6e" % a) == ("%6e" % b)
-
-        def filter_fn(partition):
-            ret = sample_rate == partition['sample_rate'] if sample_rate is not None else True
-            ret = ret and (compare_floats(bin_start, partition['bin_start']) if bin_start is not None else True)
-            ret = ret and (compare_floats(bin_size, partition['bin_size']) if bin_size is not None else True)
-            return ret and (num_bins == partition['num_bins'] if num_bins is not None else True)
-        
-        def filter_cache(partition):
-            return histogram.descriptor_match(partition.descriptor, sample_rate, bin_start, bin_size, num_bins)
-
-        if self._cache and self._cache.histogram_partitions:
-            parts = filter(filter_cache, self._cache.histogram_partitions)
+        if self._cache and self._cache.histogram_index:
+            parts = self._cache.histogram_index.find(sample_rate=sample_rate, bin_start=bin_start, bin_size=bin_size, num_bins=num_bins)
             if parts:
-                return max([p.last_timestamp for p in parts])
+                return max([p.last_timestamp for _, p in parts])
             return 0
 
-        parts = filter(filter_fn, self._get_histogram_partitions().values())
+        parts = self._get_histogram_partitions().find(sample_rate=sample_rate, bin_start=bin_start, bin_size=bin_size, num_bins=num_bins)
         if parts:
-            return max([p['end_time'] for p in parts])
+            return max([p['end_time'] for _, p in parts])
         return 0
 
     def first_histogram_timestamp(self, sample_rate = None, bin_start = None, bin_size = None, num_bins = None):
         """
         Get the timestamp for the first histogram stored for this channel with the given sample rate and histogram parameters in nanoseconds since 1970
         """
-        def compare_floats(a, b):
-            return ("%6e" % a) == ("%6e" % b)
+        parts = self._get_histogram_partitions().find(sample_rate=sample_rate, bin_start=bin_start, bin_size=bin_size, num_bins=num_bins)
+        parts = [p['start_time'] for _, p in parts if 'start_time' in p]
+        if parts:
+            return min(parts)
+        return None
 
-        def filter_fn(partition):
-            ret = sample_rate == partition['sample_rate'] if sample_rate is not None else True
-            ret = ret and (compare_floats(bin_start, partition['bin_start']) if bin_start is not None else True)
-            ret = ret and (compare_floats(bin_size, partition['bin_size']) if bin_size is not None else True)
-            return ret and (num_bins == partition['num_bins'] if num_bins is not None else True)
+    def _known_to_exist(self):
+        return bool(self._exists or (self._exists is None and self._cache and self._cache.known))
 
-        
+    def _mark_exists(self):
+        self._exists = True
+        self._sensor._mark_exists()
+        if self._cache:
+            self._cache.mark_known()
 
-        parts = filter(filter_fn, self._get_histogram_partitions().values())
-        if parts:
-            return min([p['start_time'] for p in parts])
-        return None
+    def _create_if_missing(self):
+        """
+        create the channel before an upload if it's known not to exist, so the upload isn't sent once just to get a 404
+        """
+        if self._exists is not False:
+            return
+        if self._sensor._exists is False:
+            self._sensor.device.add_sensor(self._sensor.name)
+        self._sensor.add_channel(self._channel_name)
 
     def url(self, url_path):
         """
@@ -245,12 +307,42 @@ class Channel(object):
         if self.last_timestamp_nanoseconds is None:
             self._last_point = None
         else:
-            points = list(self.timeseries_data(start=self.last_timestamp_nanoseconds, end=self.last_timestamp_nanoseconds))
+            points = list(self.timeseries_data(start=self.last_timestamp_nanoseconds, end=self.last_timestamp_nanoseconds,
+                                               convertToUnits=False))
             if points:
                 self._last_point = points[-1]
             else:
                 self._last_point = None
 
+    def latest_point(self):
+        """
+        download the most recent Point from data/latest/, a single point, without the partitions or a range download.
+        returns None if the channel doesn't have any timeseries data
+        """
+        response = self.url_without_create("/streams/timeseries/data/latest/")\
+                       .param("version", "1")\
+                       .accept("application/xdr")\
+                       .get()
+
+        if response.status_code == httplib.NOT_FOUND:
+            return None
+        if response.status_code != httplib.OK:
+            raise error(response, "get latest point")
+
+        if len(response.raw) < XDR_POINT_SIZE:
+            return None
+        self._last_point = PointBlock.from_xdr(response.raw[:XDR_POINT_SIZE])[0]
+        return self._last_point
+
+    def follow(self, since=None, min_interval=1.0, max_interval=60.0, convertToUnits=True):
+        """
+        generator of the new Points of this channel as they arrive.  since is the time to follow from, nanoseconds
+        or a datetime, by default only points that arrive from now on are returned.  The channel is polled every
+        min_interval seconds while data is arriving, backing off to max_interval while it isn't.  See follow.Follower
+        """
+        from follow import Follower, follow
+        return follow(Follower(self, since, min_interval, max_interval, convertToUnits=convertToUnits))
+
     def _update_last_histogram(self):
         """
         called internally to get an updated copy of the last histogram from the server.
@@ -324,25 +416,34 @@ class Channel(object):
         s = HistogramStreamInfo(start_time=start_nano, end_time=end_nano)
         return s
 
+    @property
+    def units(self):
+        """
+        list of Units for the timeseries stream.  The units are read from SensorCloud the first time they're needed
+        (or from a channel listing) and then kept.
+        """
+        if self._units is None:
+            self._update_timeseries_info()
+        return self._units
+
     def _update_timeseries_info(self):
         """
         called internally to update info about the stream from the server
         """
         self._timeseriesInfo = self._get_timeseries_info()
+        self._units = self._timeseriesInfo.units if self._timeseriesInfo else []
 
     def _get_timeseries_info(self):
         """ get a timeseries start, end and unit info from SensorCloud"""
 
-        response = self.url("/streams/timeseries/")\
+        response = self.url_without_create("/streams/timeseries/")\
                        .param("version", "1")\
                        .accept("application/xdr")\
                        .get()
 
-        #if the channel doesn't have timeseries data then we'll get a 404-003 error
+        #if the channel doesn't exist or doesn't have timeseries data then there isn't any info
         if response.status_code == httplib.NOT_FOUND:
-            error = json.loads(response.text)
-            if error.get("errorcode") == "404-003":
-                return None
+            return None
         #if we don't get a 200 ok then we had an error
         if response.status_code != httplib.OK:
             raise error(response, "get timeseries info")
@@ -361,43 +462,134 @@ class Channel(object):
         if not 0<= unit_count <= 100:
             raise Error("Invalid timeseres stream info structure. unit count not in the range [0,100]. value:%s"%unit_count)
 
-        units = []
-        for i in range(0,unit_count):
-            stored_unit = unpacker.unpack_string()
-            preferred_unit = unpacker.unpack_string()
-            timestamp = unpacker.unpack_uhyper()
-            slope = unpacker.unpack_float()
-            offset = unpacker.unpack_float()
-            units.append(Unit(stored_unit, preferred_unit, timestamp, slope, offset))
+        units = [unpack_unit(unpacker) for i in range(0,unit_count)]
 
         s = TimeSeriesStreamInfo(start_time=start_nano, end_time=end_nano, units=units)
         return s
 
 
+    def _range_cache(self, sample_rate):
+        """
+        get the range cache entry for a sample rate, or None if the device doesn't have a range cache
+        """
+        device = self._sensor.device
+        if device.range_cache is None:
+            return None
+        return device.range_cache.entry(device.device_id, self._sensor.name, self._channel_name, sample_rate)
+
     def timeseries_data(self, start=None, end=None, limit=None, samplerate=None, convertToUnits=True):
         """
-        get a range of timeseries data for this channel
+        get a range of timeseries data for this channel.  Iterating over the stream gives Points, use blocks() or
+        to_block() to get the data as PointBlocks, or segments() to get evenly spaced runs of data.  If samplerate is
+        given only the data uploaded with that sample rate is downloaded.  If convertToUnits is true the values are
+        converted to the preferred unit of the channel's units.
         """
         return TimeSeriesStream(self, start, end, samplerate, convertToUnits)
 
+    def view(self, samplerate=None, convertToUnits=True):
+        """
+        TimeSeriesView for random access to this channel's timeseries data by time, view[start:end] or view.at(time).
+        Only the pages that cover the requested times are downloaded, and they're kept in the device's page cache.
+        """
+        return TimeSeriesView(self, samplerate, convertToUnits)
+
     def timeseries_append(self, samplerate, data):
         """
-        append time-series data to this channel
+        append time-series data to this channel.  data is either a list of Points or a PointBlock
         """
 
         logger.debug("calling  timeseries_append. points:%s", len(data))
 
+        #the data is split into chunks sized by the device's upload chunker
+        self._upload_chunks(len(data), XDR_POINT_SIZE,
+                            lambda s, e: self._timeseries_append_chunk(samplerate, data[s:e]))
+
+    def timeseries_append_regular(self, sample_rate, start, values):
+        """
+        append regularly sampled data to this channel.  values is a list, array or numpy array of values and start is
+        the timestamp of the first value, either a datetime or nanoseconds since 1970.  The timestamps are generated
+        from the sample rate one chunk at a time as the data is uploaded.
+        """
+
+        logger.debug("calling  timeseries_append_regular. points:%s", len(values))
+
+        if isinstance(start, datetime):
+            start = timestamp_to_nanosecond(start)
+
+        def send(s, e):
+            chunk = values[s:e]
+            timestamps = sample_rate.timestamps(start, s, len(chunk))
+            self._timeseries_append_chunk(sample_rate, PointBlock(timestamps, chunk))
+
+        self._upload_chunks(len(values), XDR_POINT_SIZE, send)
+
+    def timeseries_append_detect(self, data, min_run=None):
+        """
+        append time-series data without a known sample rate.  The sample rate is detected from the spacing of the
+        timestamps, the data is split where the rate changes and each run is uploaded to the partition for its rate.
+        data is a PointBlock or a list of Points.  Runs shorter than min_run points are treated as part of the run
+        before them.  requires numpy.
+
+        returns a list of (SampleRate, PointBlock) for the runs that were uploaded
+        """
+        import ratedetect
+
+        block = PointBlock.from_points(data)
+        logger.debug("calling  timeseries_append_detect. points:%s", len(block))
+
+        timestamps, _ = block.to_numpy()
+        runs = [(rate, block[first:last]) for rate, first, last in
+                ratedetect.detect_runs(timestamps, min_run or ratedetect.DEFAULT_MIN_RUN)]
+
+        #an upload holds points of a single sample rate, so each run is uploaded through its own chunks.  A chunk
+        #spanning runs would take a request per run, and a chunk that's retried would send again the runs before
+        #the one that failed
+        for rate, run in runs:
+            self._upload_chunks(len(run), XDR_POINT_SIZE,
+                                lambda s, e: self._timeseries_submit_blob(rate, run[s:e].to_xdr()))
+            #the runs are in time order, so the last run leaves the last point of the whole upload
+            self._new_timeseries(rate, run[-1], run)
+
+        return runs
+
+    def _ring_buffer(self, create=False):
+        """
+        this channel's RingBuffer, or None if the device doesn't buffer recent points
+        """
+        pool = self._sensor.device.ring_buffers
+        if pool is None:
+            return None
+        key = (self._sensor.name, self._channel_name)
+        return pool.buffer(key) if create else pool.get(key)
+
+    def peek(self, n=1):
+        """
+        the nth newest buffered Point, peek() is the newest.  Served from the ring buffer without any requests,
+        returns None if the buffer doesn't hold that many points.
+        """
+        ring = self._ring_buffer()
+        return ring.peek(n) if ring is not None else None
+
+    def tail(self, n=None):
+        """
+        PointBlock of the newest n buffered points, or every buffered point if n is None.  Served from the ring buffer
+        without any requests, so it can have fewer than n points.  The values aren't converted to the preferred unit.
+        """
+        ring = self._ring_buffer()
+        return ring.tail(n) if ring is not None else PointBlock()
 
-        #server allows a maximum upload size of 100,000 (as of 3-12-2013) we're limitting upload size to 20,000 points
-        MAX_UPLOAD_SIZE = 20000
+    def aggregator(self, sample_rate, statistics=STATISTICS, lateness=0, raw=True):
+        """
+        ChannelAggregator that uploads summaries of the data appended through it, one window per interval of
+        sample_rate, to derived channels such as <channel>_rms.  See aggregate.ChannelAggregator
+        """
+        return ChannelAggregator(self, sample_rate, statistics, lateness, raw)
 
-        #split the data into MAX_UPLOAD_SIZE chunks to upload to sensorcloud
-        s = 0
-        e = MAX_UPLOAD_SIZE
-        while s < len(data):
-            self._timeseries_append_chunk(samplerate, data[s:e])
-            s = e
-            e = e + MAX_UPLOAD_SIZE
+    def _upload_chunks(self, count, point_size, send):
+        """
+        upload count points with send(start, end), in chunks sized by the device's AdaptiveChunker
+        """
+        self._sensor.device.upload_chunker.run(count, point_size, send)
 
     def _timeseries_append_chunk(self, sample_rate, data):
 
@@ -408,25 +600,52 @@ class Channel(object):
         if len(data) == 0:
             return
 
-        packer = xdrlib.Packer()
-        for point in data:
-            packer.pack_uhyper(point.timestamp_nanoseconds)
-            packer.pack_float(point.value)
+        if isinstance(data, PointBlock):
+            blob = data.to_xdr()
+        else:
+            packer = xdrlib.Packer()
+            for point in data:
+                packer.pack_uhyper(point.timestamp_nanoseconds)
+                packer.pack_float(point.value)
+            blob = packer.get_buffer()
 
-        self._timeseries_submit_blob(sample_rate, packer.get_buffer())
+        self._timeseries_submit_blob(sample_rate, blob)
 
-        self._new_timeseries(sample_rate, data[-1])
+        self._new_timeseries(sample_rate, data[-1], data)
 
     def timeseries_append_blob(self, sample_rate, blob):
+        """
+        append xdr encoded points to this channel.  blob is a string, buffer, mmap or memoryview of 12 byte points,
+        a timestamp as an xdr unsigned hyper followed by the value as an xdr float.  The chunks are sent as slices
+        of the blob, so it's never copied.
+        """
         assert(len(blob) % 12 == 0)
 
         if len(blob) == 0:
             return
 
-        self._timeseries_submit_blob(sample_rate, blob)
+        self._upload_chunks(len(blob) // XDR_POINT_SIZE, XDR_POINT_SIZE,
+                            lambda s, e: self._timeseries_submit_blob(sample_rate, _slice(blob, s * XDR_POINT_SIZE, e * XDR_POINT_SIZE)))
 
-        unpacker = xdrlib.Unpacker(blob[-12:])
-        self._new_timeseries(sample_rate, Point(unpacker.unpack_uhyper(), unpacker.unpack_float()))
+        #only the points that fit in the ring buffer are decoded
+        ring = self._ring_buffer(create=True)
+        count = min(len(blob) // XDR_POINT_SIZE, ring.capacity if ring is not None else 1)
+        recent = PointBlock.from_xdr(_tail(blob, count * XDR_POINT_SIZE))
+        self._new_timeseries(sample_rate, recent[-1], recent)
+
+    def timeseries_append_file(self, sample_rate, path):
+        """
+        append a file of xdr encoded points, in the format of timeseries_append_blob, to this channel.  The file is
+        memory mapped and uploaded a slice at a time, so files bigger than memory can be uploaded.
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.timeseries_append_blob(sample_rate, blob)
+            finally:
+                blob.close()
 
     def _timeseries_submit_blob(self, sampleRate, blob):
         pointCount = len(blob) / 12
@@ -438,7 +657,11 @@ class Channel(object):
 
         #Writing an array in XDR.  an array is always prefixed by the array length
         packer.pack_int(pointCount)
-        data = packer.get_buffer() + blob
+
+        #the header and the points are sent one after the other, so the points aren't copied
+        data = Requests.RequestBody(packer.get_buffer(), blob)
+
+        self._create_if_missing()
 
         response = self.url("/streams/timeseries/data/")\
                                  .param("version", "1")\
@@ -450,15 +673,21 @@ class Channel(object):
         if response.status_code != httplib.CREATED:
             raise error(response, "timeseries upload")
         
-    def _new_timeseries(self, sample_rate, point):
+    def _new_timeseries(self, sample_rate, point, recent=None):
+        """
+        record an upload that ended with point.  recent is the uploaded data, for the ring buffer
+        """
         self._last_point = point
-        descriptor = timeseries.descriptor(sample_rate)
+        ring = self._ring_buffer(create=True)
+        if ring is not None:
+            ring.extend(recent if recent is not None else [point])
+        key = TimeSeriesKey(sample_rate)
         if self._timeseries_partitions is None:
-            self._timeseries_partitions = {}
-        if not descriptor in self._timeseries_partitions:
-            self._timeseries_partitions[descriptor] = {'end_time': point.timestamp_nanoseconds}
+            self._timeseries_partitions = PartitionIndex()
+        if not key in self._timeseries_partitions:
+            self._timeseries_partitions[key] = {'sample_rate': sample_rate, 'end_time': point.timestamp_nanoseconds}
         else:
-            self._timeseries_partitions[descriptor]['end_time'] = point.timestamp_nanoseconds
+            self._timeseries_partitions[key]['end_time'] = point.timestamp_nanoseconds
 
         if self._cache:
             self._cache.timeseries_partition(sample_rate).last_timestamp = point.timestamp_nanoseconds
@@ -470,17 +699,12 @@ class Channel(object):
 
         logger.debug("calling  histogram_append. points:%s", len(data))
 
+        if len(data) == 0:
+            return
 
-        #server allows a maximum upload size of 100,000 (as of 3-12-2013) we're limitting upload size to 20,000 points
-        MAX_UPLOAD_SIZE = 20000
-
-        #split the data into MAX_UPLOAD_SIZE chuncks to upload to sensorcloud
-        s = 0
-        e = MAX_UPLOAD_SIZE
-        while s < len(data):
-            self._histogram_append_chunk(samplerate, data[s:e])
-            s = e
-            e = e + MAX_UPLOAD_SIZE
+        #the data is split into chunks sized by the device's upload chunker
+        self._upload_chunks(len(data), 8 + 4 * len(data[0].bins),
+                            lambda s, e: self._histogram_append_chunk(samplerate, data[s:e]))
 
     def _histogram_append_chunk(self, sample_rate, data):
 
@@ -511,6 +735,20 @@ class Channel(object):
 
         self._new_histogram(sample_rate, data[-1])
 
+    def histogram_append_arrays(self, sample_rate, bin_start, bin_size, timestamps, counts):
+        """
+        append histograms given as arrays: timestamps in nanoseconds and a row of counts per histogram.  The
+        histograms are encoded in one vectorized pass, without a Histogram object per histogram.  A HistogramBatch
+        from a HistogramEngine can be passed as channel.histogram_append_arrays(sample_rate, *batch)
+        """
+        from histogramengine import histograms_to_xdr
+
+        if len(timestamps) == 0:
+            return
+
+        num_bins = len(counts[0])
+        self.histogram_append_blob(sample_rate, bin_start, bin_size, num_bins, histograms_to_xdr(timestamps, counts))
+
     def histogram_append_blob(self, sample_rate, bin_start, bin_size, num_bins, blob):
         hist_size = 8 + (4 * num_bins)
         assert(len(blob) % hist_size == 0)
@@ -518,9 +756,11 @@ class Channel(object):
         if len(blob) == 0:
             return
 
-        self._histogram_submit_blob(sample_rate, bin_start, bin_size, num_bins, blob)
+        self._upload_chunks(len(blob) // hist_size, hist_size,
+                            lambda s, e: self._histogram_submit_blob(sample_rate, bin_start, bin_size, num_bins,
+                                                                     _slice(blob, s * hist_size, e * hist_size)))
 
-        unpacker = xdrlib.Unpacker(blob[-hist_size:])
+        unpacker = xdrlib.Unpacker(_tail(blob, hist_size))
         timestamp = unpacker.unpack_uhyper()
         bins = []
         for i in xrange(num_bins):
@@ -529,16 +769,17 @@ class Channel(object):
 
     def _new_histogram(self, sample_rate, histogram):
         self._last_histogram = histogram
-        descriptor = histogram.descriptor(sample_rate)
-        if self._histogram_partitions is None:
-            self._histogram_partitions = {}
-        if not descriptor in self._histogram_partitions:
-            self._histogram_partitions[descriptor] = {'end_time': histogram.timestamp_nanoseconds}
-        else:
-            self._histogram_partitions[descriptor]['end_time'] = histogram.timestamp_nanoseconds
         bin_start = histogram.bin_start
         bin_size = histogram.bin_size
         num_bins = len(histogram.bins)
+        key = histogram.partition_key(sample_rate)
+        if self._histogram_partitions is None:
+            self._histogram_partitions = PartitionIndex()
+        if not key in self._histogram_partitions:
+            self._histogram_partitions[key] = {'sample_rate': sample_rate, 'bin_start': bin_start, 'bin_size': bin_size,
+                                               'num_bins': num_bins, 'end_time': histogram.timestamp_nanoseconds}
+        else:
+            self._histogram_partitions[key]['end_time'] = histogram.timestamp_nanoseconds
         if self._cache:
             self._cache.histogram_partition(sample_rate, bin_start, bin_size, num_bins).last_timestamp = histogram.timestamp_nanoseconds
 
@@ -558,7 +799,9 @@ class Channel(object):
 
         #Writing an array in XDR.  an array is always prefixed by the array length
         packer.pack_int(hist_count)
-        data = packer.get_buffer() + blob
+        data = Requests.RequestBody(packer.get_buffer(), blob)
+
+        self._create_if_missing()
 
         response = self.url("/streams/histogram/data/")\
                                  .param("version", "1")\
@@ -585,7 +828,7 @@ class Channel(object):
                 popSize = unpacker.unpack_uint() * 12
                 unpacker.unpack_fopaque(popSize)
 
-            return timeseries.descriptor(partition['sample_rate']), partition
+            return TimeSeriesKey(partition['sample_rate']), partition
 
         response = self.url("/streams/timeseries/partitions/") \
             .param("version", "1") \
@@ -594,10 +837,9 @@ class Channel(object):
         if response.status_code != httplib.OK:
             raise error(response, "get timeseries partitions")
 
-        partitions = []
         unpacker = xdrlib.Unpacker(response.raw)
         unpacker.unpack_int()
-        return dict([unpackPartition(unpacker) for _ in range(unpacker.unpack_uint())])
+        return PartitionIndex([unpackPartition(unpacker) for _ in range(unpacker.unpack_uint())])
 
     def _get_timeseries_partitions(self):
         if self._timeseries_partitions is None:
@@ -621,7 +863,7 @@ class Channel(object):
             partition['num_bins'] = unpacker.unpack_uint()
             partition['bin_start'] = unpacker.unpack_float()
             partition['bin_size'] = unpacker.unpack_float()
-            return histogram.descriptor(partition['sample_rate'], partition['bin_start'], partition['bin_size'], partition['num_bins']), partition
+            return HistogramKey(partition['sample_rate'], partition['bin_start'], partition['bin_size'], partition['num_bins']), partition
 
         response = self.url("/streams/histogram/partitions/") \
             .param("version", "1") \
@@ -632,7 +874,7 @@ class Channel(object):
 
         unpacker = xdrlib.Unpacker(response.raw)
         unpacker.unpack_int() # version
-        return dict([unpackPartition(unpacker) for _ in range(unpacker.unpack_uint())])
+        return PartitionIndex([unpackPartition(unpacker) for _ in range(unpacker.unpack_uint())])
 
     def _get_histogram_partitions(self):
         if self._histogram_partitions is None:
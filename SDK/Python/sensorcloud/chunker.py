@@ -0,0 +1,140 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Adaptive sizing of upload chunks.
+
+Uploads are split into chunks, and the best chunk size depends on the link: on a fast link small chunks waste time on
+per-request overhead, on a slow link big chunks time out.  The chunker adjusts the chunk size with AIMD (additive
+increase, multiplicative decrease).  The chunk grows by a fixed number of bytes after every upload that finishes
+within the target time, and is halved when an upload is slow or times out.  Only the time on the network counts, the
+time a request waits on the device's rate limiter isn't part of it.  A chunk that times out is retried at the
+smaller size.  The size is kept in bytes so timeseries and histogram uploads of any width can share one chunker, and
+it is bounded in both points and bytes.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import socket
+import httplib
+import threading
+from collections import namedtuple
+
+from error import ServerError
+from ratelimit import wait_seconds
+
+UploadMetrics = namedtuple("UploadMetrics", ["chunk_bytes", "last_chunk_points", "uploads", "retries", "points",
+                                             "bytes", "seconds", "points_per_second", "bytes_per_second"])
+
+class AdaptiveChunker(object):
+
+    def __init__(self, initial_bytes=20000 * 12, min_points=100, max_points=100000, min_bytes=4 * 1024,
+                 max_bytes=100000 * 12, target_seconds=5.0, increase_bytes=64 * 1024, decrease=0.5):
+        """
+        initial_bytes            - size of the first chunk, the default is the old fixed size of 20,000 points
+        min_points, max_points   - bounds on the points in a chunk.  The server accepts at most 100,000 points
+        min_bytes, max_bytes     - bounds on the size of a chunk
+        target_seconds           - uploads that take longer than this shrink the chunk
+        increase_bytes, decrease - AIMD step sizes
+        """
+        assert 0 < decrease < 1
+        self._min_points = min_points
+        self._max_points = max_points
+        self._min_bytes = min_bytes
+        self._max_bytes = max_bytes
+        self._target_seconds = target_seconds
+        self._increase_bytes = increase_bytes
+        self._decrease = decrease
+
+        self._lock = threading.Lock()
+        self._bytes = self._clamp(initial_bytes)
+        self._last_chunk_points = 0
+        self._uploads = 0
+        self._retries = 0
+        self._points_sent = 0
+        self._bytes_sent = 0
+        self._seconds = 0.0
+
+    @property
+    def chunk_bytes(self):
+        """ current target size of a chunk in bytes """
+        return self._bytes
+
+    def chunk_points(self, point_size):
+        """
+        number of points to put in the next chunk, for points that are point_size bytes each
+        """
+        points = self._bytes // point_size
+        return int(max(self._min_points, min(self._max_points, points)))
+
+    def metrics(self):
+        with self._lock:
+            return UploadMetrics(chunk_bytes=self._bytes,
+                                 last_chunk_points=self._last_chunk_points,
+                                 uploads=self._uploads,
+                                 retries=self._retries,
+                                 points=self._points_sent,
+                                 bytes=self._bytes_sent,
+                                 seconds=self._seconds,
+                                 points_per_second=self._points_sent / self._seconds if self._seconds > 0 else 0.0,
+                                 bytes_per_second=self._bytes_sent / self._seconds if self._seconds > 0 else 0.0)
+
+    def success(self, points, nbytes, seconds):
+        """
+        record an upload that went through
+        """
+        with self._lock:
+            self._uploads += 1
+            self._points_sent += points
+            self._bytes_sent += nbytes
+            self._seconds += seconds
+            if seconds > self._target_seconds:
+                self._bytes = self._clamp(self._bytes * self._decrease)
+            elif nbytes >= self._bytes * self._decrease:
+                #only grow when the chunk was actually close to full size, a short final chunk says nothing
+                self._bytes = self._clamp(self._bytes + self._increase_bytes)
+        logger.debug("uploaded %d points in %0.2fs, chunk size is now %d bytes", points, seconds, self._bytes)
+
+    def failure(self, nbytes):
+        """
+        record an upload that timed out
+        """
+        with self._lock:
+            self._retries += 1
+            self._bytes = self._clamp(min(self._bytes, nbytes) * self._decrease)
+        logger.info("upload of %d bytes timed out, chunk size is now %d bytes", nbytes, self._bytes)
+
+    def run(self, count, point_size, send):
+        """
+        upload count points in chunks.  send(start, end) uploads points [start, end).  A chunk that times out is
+        retried at a smaller size, unless it was already as small as a chunk can be.
+        """
+        start = 0
+        while start < count:
+            points = min(self.chunk_points(point_size), count - start)
+            self._last_chunk_points = points
+            begin = time.time()
+            waited = wait_seconds()
+            try:
+                send(start, start + points)
+            except (ServerError, socket.timeout) as e:
+                if getattr(e, "code", httplib.GATEWAY_TIMEOUT) != httplib.GATEWAY_TIMEOUT:
+                    raise
+                self.failure(points * point_size)
+                if self.chunk_points(point_size) >= points:
+                    #the chunk can't get any smaller
+                    raise
+                continue
+            #time spent held back by the rate limiter says nothing about the link
+            seconds = time.time() - begin - (wait_seconds() - waited)
+            self.success(points, points * point_size, max(0.0, seconds))
+            start += points
+
+    def _clamp(self, nbytes):
+        return int(max(self._min_bytes, min(self._max_bytes, nbytes)))
@@ -0,0 +1,84 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+The sensorcloud command.
+
+    sensorcloud import --device DEVICE_ID --key KEY [--channel SENSOR:CHANNEL] [--sample-rate "10 hertz"]
+                       [--jobs N] [--uploads N] [--checkpoint FILE] FILE...
+
+The device key can also be given with the SENSORCLOUD_KEY environment variable, so it doesn't show up in the process
+list.
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+from device import Device, DEFAULT_AUTH_SERVER
+from samplerate import SampleRate
+from importer import BulkImporter
+
+def _sample_rate(text):
+    if text is None or text == "detect":
+        return None
+    try:
+        return SampleRate.from_string(text.replace("-", " "))
+    except ValueError:
+        raise argparse.ArgumentTypeError("sample rates look like '10 hertz' or '30 seconds'")
+
+def _print_progress(progress, stream=sys.stderr):
+    stream.write("\r%d/%d files  %d points  %0.0f points/s  %0.2f MB/s   " % (
+        progress.files_done, progress.files_total, progress.points, progress.points_per_second,
+        progress.bytes_per_second / (1024 * 1024)))
+    stream.flush()
+
+def _parser():
+    parser = argparse.ArgumentParser(prog="sensorcloud", description="SensorCloud command line tools")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests")
+    commands = parser.add_subparsers(dest="command")
+
+    bulk = commands.add_parser("import", help="import csv, npy, npz and xdr files into channels")
+    bulk.add_argument("files", nargs="+", help="files to import")
+    bulk.add_argument("--device", required=True, help="device id")
+    bulk.add_argument("--key", default=os.environ.get("SENSORCLOUD_KEY"), help="device key, or set SENSORCLOUD_KEY")
+    bulk.add_argument("--auth-server", default=DEFAULT_AUTH_SERVER)
+    bulk.add_argument("--cache-file", help="cache file for the device")
+    bulk.add_argument("--channel", help="sensor:channel for files that hold a single channel")
+    bulk.add_argument("--sample-rate", type=_sample_rate, default=None,
+                      help="sample rate of the data, e.g. '10 hertz'.  By default the rates are detected")
+    bulk.add_argument("--jobs", type=int, default=None, help="parsing processes, one per core by default")
+    bulk.add_argument("--uploads", type=int, default=4, help="concurrent uploads")
+    bulk.add_argument("--checkpoint", help="file that records the imported files, so an import can be resumed")
+    bulk.add_argument("--quiet", action="store_true", help="don't print progress")
+    return parser
+
+def import_files(args, device=None):
+    if device is None:
+        if not args.key:
+            raise SystemExit("a device key is needed, use --key or set SENSORCLOUD_KEY")
+        device = Device(args.device, args.key, args.auth_server, cache_file=args.cache_file)
+
+    importer = BulkImporter(device, channel=args.channel, sample_rate=args.sample_rate, jobs=args.jobs,
+                            uploads=args.uploads, checkpoint=args.checkpoint,
+                            progress=None if args.quiet else _print_progress)
+    progress = importer.run(args.files)
+    if not args.quiet:
+        sys.stderr.write("\n")
+    return progress
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    if args.command == "import":
+        import_files(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
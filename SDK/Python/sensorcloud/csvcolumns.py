@@ -0,0 +1,161 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Vectorized parsing of csv data from download/timeseries/csv into numpy columns.
+
+The csv is parsed a block at a time, each block of complete lines is split into a single 2-D array of fields which
+is converted to a uint64 timestamp column and a float32 column per selector.  Memory use is bounded by the block size
+no matter how large the csv is.  Timestamps must be integers, so the csv needs to be downloaded with timeFmt=unix or
+timeFmt=relative.
+"""
+
+import numpy as np
+from collections import namedtuple
+
+from error import Error
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+# the nan parameter of a csv download maps these names to the symbol that is actually used
+NAN_SYMBOLS = {"none": "", "excel": "#N/A", "default": "NaN"}
+
+CsvBlock = namedtuple("CsvBlock", ["timestamps", "values"])
+
+class CsvColumns(namedtuple("CsvColumns", ["selectors", "timestamps", "values"])):
+    """
+    timestamps is a uint64 array, values is a 2-D float32 array with one column per selector.  Missing values are nan.
+    """
+
+    def column(self, selector):
+        return self.values[:, self.selectors.index(selector)]
+
+class CsvColumnParser(object):
+    """
+    Push parser for a SensorCloud csv.  Data is passed to feed as it arrives, completed blocks are returned as CsvBlocks.
+    """
+
+    def __init__(self, nan="NaN", block_size=DEFAULT_BLOCK_SIZE):
+        nan = NAN_SYMBOLS.get(nan, nan)
+        self._missing = set(["", nan, "nan", "NaN"])
+        self._block_size = block_size
+        self._selectors = None
+        self._pending = []
+        self._pending_size = 0
+
+    @property
+    def selectors(self):
+        """ column names from the header, a list of "sensor:channel" strings.  None until the header is parsed """
+        return self._selectors
+
+    def feed(self, data):
+        """
+        add csv data to the parser.  returns a list of any blocks that are ready
+        """
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size < self._block_size:
+            return []
+        return self._parse_pending(final=False)
+
+    def close(self):
+        """
+        parse any remaining data.  returns a list of the remaining blocks
+        """
+        return self._parse_pending(final=True)
+
+    def _parse_pending(self, final):
+        text = "".join(self._pending)
+        if not final:
+            # only complete lines can be parsed, keep the rest for the next block
+            end = text.rfind("\n") + 1
+            text, rest = text[:end], text[end:]
+        else:
+            rest = ""
+            if text and not text.endswith("\n"):
+                text += "\n"
+
+        self._pending = [rest] if rest else []
+        self._pending_size = len(rest)
+
+        text = text.replace("\r", "")
+        if self._selectors is None:
+            header_end = text.find("\n")
+            if header_end < 0:
+                if text:
+                    self._pending.insert(0, text)
+                    self._pending_size += len(text)
+                return []
+            self._selectors = [name.strip() for name in text[:header_end].split(",")[1:]]
+            text = text[header_end + 1:]
+
+        lines = [line for line in text.split("\n") if line.strip()]
+        if not lines:
+            return []
+        return [self._parse(lines)]
+
+    def _parse(self, lines):
+        columns = len(self._selectors) + 1
+
+        # every line needs the same number of fields, or the fields of a short line would shift into the next
+        commas = np.char.count(np.array(lines, dtype=np.string_), ",")
+        uneven = np.flatnonzero(commas != columns - 1)
+        if len(uneven):
+            raise Error("malformed csv, expected %d columns on every line: %r" % (columns, lines[uneven[0]]))
+
+        fields = np.array(",".join(lines).split(","), dtype=np.string_).reshape(len(lines), columns)
+        timestamps = np.char.strip(fields[:, 0]).astype(np.uint64)
+
+        values = np.char.strip(fields[:, 1:])
+        if values.dtype.itemsize < len("nan"):
+            values = values.astype("S3")
+        missing = np.zeros(values.shape, dtype=bool)
+        for symbol in self._missing:
+            missing |= (values == symbol)
+        values[missing] = "nan"
+
+        return CsvBlock(timestamps, values.astype(np.float32))
+
+def iter_blocks(fileobj, nan="NaN", block_size=DEFAULT_BLOCK_SIZE):
+    """
+    parse a csv file object a block at a time.  yields (selectors, CsvBlock) pairs
+    """
+    parser = CsvColumnParser(nan, block_size)
+    while True:
+        data = fileobj.read(block_size)
+        if not data:
+            break
+        for block in parser.feed(data):
+            yield parser.selectors, block
+    for block in parser.close():
+        yield parser.selectors, block
+
+def join_blocks(selectors, blocks):
+    """
+    concatenate CsvBlocks into a single CsvColumns
+    """
+    blocks = list(blocks)
+    if not blocks:
+        return CsvColumns(selectors or [], np.zeros(0, dtype=np.uint64),
+                          np.zeros((0, len(selectors or [])), dtype=np.float32))
+    return CsvColumns(selectors,
+                      np.concatenate([b.timestamps for b in blocks]),
+                      np.concatenate([b.values for b in blocks]))
+
+def load(fileobj, nan="NaN", block_size=DEFAULT_BLOCK_SIZE):
+    """
+    parse a whole csv file object into a CsvColumns
+    """
+    parser = CsvColumnParser(nan, block_size)
+    blocks = []
+    while True:
+        data = fileobj.read(block_size)
+        if not data:
+            break
+        blocks.extend(parser.feed(data))
+    blocks.extend(parser.close())
+    return join_blocks(parser.selectors, blocks)
@@ -0,0 +1,233 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import time
+import httplib
+import tempfile
+import threading
+from datetime import datetime
+from collections import namedtuple, OrderedDict
+
+from util import timestamp_to_nanosecond, run_parallel
+from error import *
+
+# default length of a time slice when a long export is split up, one day
+DEFAULT_SLICE_NANOSECONDS = 24 * 60 * 60 * 1000000000
+
+ExportProgress = namedtuple("ExportProgress", ["bytes", "seconds", "bytes_per_second", "slices_done", "slices_total"])
+
+def to_nanoseconds(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp_to_nanosecond(timestamp)
+    return int(timestamp)
+
+def parse_selector(selector):
+    """
+    split a selector into (sensor_name, channel_name).  A selector is either a channel object, a
+    (sensor_name, channel_name) tuple, or a "sensor:channel" or "sensor(channel)" string.
+    """
+    if hasattr(selector, "sensor") and hasattr(selector, "name"):
+        return selector.sensor.name, selector.name
+    if isinstance(selector, basestring):
+        if selector.endswith(")") and "(" in selector:
+            return tuple(selector[:-1].split("(", 1))
+        return tuple(selector.split(":", 1))
+    sensor_name, channel_name = selector
+    return sensor_name, channel_name
+
+def selector_ts(selectors):
+    """
+    build a selector_ts parameter from a list of selectors, see parse_selector.
+
+    example: selector_ts([("sensor_1", "ch1"), "sensor_1:ch2", "sensor_2(ch1)"]) == "sensor_1(ch1,ch2),sensor_2(ch1)"
+    """
+    sensors = OrderedDict()
+    for selector in selectors:
+        sensor_name, channel_name = parse_selector(selector)
+
+        channels = sensors.setdefault(sensor_name, [])
+        for channel in channel_name.split(","):
+            if channel not in channels:
+                channels.append(channel)
+
+    return ",".join("%s(%s)" % (sensor, ",".join(channels)) for sensor, channels in sensors.items())
+
+def time_slices(start, end, slice_nanoseconds):
+    """
+    split the inclusive range [start, end] into inclusive slices no longer than slice_nanoseconds
+    """
+    slices = []
+    while start <= end:
+        slice_end = min(start + slice_nanoseconds - 1, end)
+        slices.append((start, slice_end))
+        start = slice_end + 1
+    return slices
+
+class CsvExport(object):
+    """
+    Streams a multi-channel csv download to a file.  Long ranges are split into time slices that are downloaded in
+    parallel to temporary files and then joined in order.
+    """
+
+    def __init__(self, device, selectors, start, end, nan="NaN", time_format="unix",
+                 slice_nanoseconds=DEFAULT_SLICE_NANOSECONDS, parallel=4, progress=None):
+        self._device = device
+        self._selector = selector_ts(selectors)
+        self._start = to_nanoseconds(start)
+        self._end = to_nanoseconds(end)
+        self._nan = nan
+        self._time_format = time_format
+        self._slices = time_slices(self._start, self._end, slice_nanoseconds) if slice_nanoseconds else [(self._start, self._end)]
+        self._parallel = max(1, parallel)
+        self._progress = progress
+
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._slices_done = 0
+        self._begin = None
+
+    @property
+    def selector(self):
+        return self._selector
+
+    @property
+    def slices(self):
+        return self._slices
+
+    def progress(self):
+        seconds = time.time() - self._begin if self._begin else 0.0
+        return ExportProgress(bytes=self._bytes,
+                              seconds=seconds,
+                              bytes_per_second=self._bytes / seconds if seconds > 0 else 0.0,
+                              slices_done=self._slices_done,
+                              slices_total=len(self._slices))
+
+    def run(self, path):
+        """
+        download the export to path.  returns the final ExportProgress
+        """
+        assert self._end >= self._start
+
+        self._begin = time.time()
+
+        # authenticate up front so the slice threads don't all try to authenticate at once
+        requests = self._device._requests
+        if not requests.authToken:
+            requests.authenticate()
+
+        if len(self._slices) == 1:
+            with open(path, 'wb') as f:
+                self._download(self._slices[0], f.write)
+            self._slice_done()
+            return self.progress()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        parts = []
+        try:
+            for _ in self._slices:
+                fd, part = tempfile.mkstemp(suffix=".csv.part", dir=directory)
+                os.close(fd)
+                parts.append(part)
+
+            self._download_parts(parts)
+
+            # join the slices in order, every slice after the first repeats the header line
+            with open(path, 'wb') as out:
+                for i, part in enumerate(parts):
+                    with open(part, 'rb') as f:
+                        if i > 0:
+                            f.readline()
+                        while True:
+                            block = f.read(1024 * 1024)
+                            if not block:
+                                break
+                            out.write(block)
+        finally:
+            for part in parts:
+                try:
+                    os.unlink(part)
+                except OSError:
+                    pass
+
+        return self.progress()
+
+    def stream(self, write):
+        """
+        download the slices one after another, passing the csv to write as it arrives.  returns the final ExportProgress
+        """
+        assert self._end >= self._start
+
+        self._begin = time.time()
+        for i, time_slice in enumerate(self._slices):
+            self._download(time_slice, write if i == 0 else _SkipHeader(write))
+            self._slice_done()
+        return self.progress()
+
+    def _download_parts(self, parts):
+
+        def download(job):
+            time_slice, part = job
+            with open(part, 'wb') as f:
+                self._download(time_slice, f.write)
+            self._slice_done()
+
+        run_parallel(download, zip(self._slices, parts), self._parallel)
+
+    def _download(self, time_slice, write):
+
+        def sink(block):
+            write(block)
+            with self._lock:
+                self._bytes += len(block)
+                if self._progress:
+                    self._progress(self.progress())
+
+        start, end = time_slice
+        logger.debug("downloading csv slice [%d, %d] for %s", start, end, self._selector)
+
+        response = self._device.url("/download/timeseries/csv/")\
+                               .param("version", "1")\
+                               .param("selector_ts", self._selector)\
+                               .param("startTime", start)\
+                               .param("endTime", end)\
+                               .param("nan", self._nan)\
+                               .param("timeFmt", self._time_format)\
+                               .accept("text/csv")\
+                               .stream_to(sink)\
+                               .get()
+
+        if response.status_code != httplib.OK:
+            raise error(response, "download csv")
+
+    def _slice_done(self):
+        with self._lock:
+            self._slices_done += 1
+            if self._progress:
+                self._progress(self.progress())
+
+class _SkipHeader(object):
+    """
+    drops the header line from a stream of csv blocks
+    """
+
+    def __init__(self, write):
+        self._write = write
+        self._in_header = True
+
+    def __call__(self, block):
+        if self._in_header:
+            end = block.find("\n")
+            if end < 0:
+                return
+            self._in_header = False
+            block = block[end + 1:]
+        if block:
+            self._write(block)
@@ -7,42 +7,80 @@ See file license.txt
 
 import xdrlib
 import httplib
+from collections import namedtuple, OrderedDict
 
 import logging
 logger = logging.getLogger(__name__)
 
 from sensorcloudrequest import SensorCloudRequests
 from sensor import Sensor
+from channel import unpack_channel_info
 from cache import Cache
+from rangecache import RangeCache
+from timeseriesview import PageCache, DEFAULT_PAGE_CACHE_BYTES
+from chunker import AdaptiveChunker
+from ratelimit import UploadScheduler
+from csvdownload import CsvExport, DEFAULT_SLICE_NANOSECONDS, parse_selector
+from util import run_parallel
 from error import *
 
 DEFAULT_AUTH_SERVER = "https://sensorcloud.microstrain.com"
 
+ProvisionResult = namedtuple("ProvisionResult", ["sensors_created", "channels_created"])
+
+def _manifest(manifest):
+    """
+    normalize a channel manifest into an OrderedDict of sensor name -> OrderedDict of channel name -> (label, description)
+    """
+    sensors = OrderedDict()
+    if isinstance(manifest, dict):
+        for sensor_name, channels in manifest.items():
+            sensor = sensors.setdefault(sensor_name, OrderedDict())
+            if isinstance(channels, dict):
+                for channel_name, info in channels.items():
+                    info = info or {}
+                    sensor[channel_name] = (info.get("label", ""), info.get("description", ""))
+            else:
+                for channel_name in channels:
+                    sensor[channel_name] = ("", "")
+    else:
+        for selector in manifest:
+            sensor_name, channel_name = parse_selector(selector)
+            sensors.setdefault(sensor_name, OrderedDict())[channel_name] = ("", "")
+    return sensors
+
 class Device(object):
 
 
-    def __init__(self, device_id, device_key, auth_server=DEFAULT_AUTH_SERVER, request_factory=None, cache_file=None):
+    def __init__(self, device_id, device_key, auth_server=DEFAULT_AUTH_SERVER, request_factory=None, cache_file=None,
+                 range_cache_dir=None, chunker=None, rate_limiter=None, ring_buffers=None,
+                 page_cache_bytes=DEFAULT_PAGE_CACHE_BYTES):
         self._cache = Cache(cache_file) if cache_file else None
-        self._requests = SensorCloudRequests(device_id, device_key, auth_server, requests = request_factory, cache = self._cache)
+        self._ring_buffers = ring_buffers
+        self._chunker = chunker or AdaptiveChunker()
+        self._range_cache = RangeCache(range_cache_dir) if range_cache_dir else None
+        self._page_cache = PageCache(page_cache_bytes)
+        self._requests = SensorCloudRequests(device_id, device_key, auth_server, requests = request_factory, cache = self._cache,
+                                             limiter = rate_limiter)
         self._sensors = {}
-        if self._cache:
-
-            self._requests._authToken = self._cache.token
-            self._requests._apiServer = self._cache.server
-
-            for sensorCache in self._cache.sensors:
-                self._sensors[sensorCache.name] = Sensor(self, sensorCache.name, sensorCache)
 
     def __contains__(self, sensor_name):
         """
-        check if a sensor exits for this device on SensorCloud
+        check if a sensor exits for this device on SensorCloud.  Sensors that are already known to exist, from an
+        earlier check, a listing or the cache, aren't checked again.
         """
 
+        sensor = self.sensor(sensor_name)
+        if sensor._known_to_exist():
+            return True
+
         response = self.url("/sensors/%s/" % sensor_name)\
                        .param("version", "1")\
                        .accept("application/xdr").get()
 
-        if response.status_code == httplib.OK: return True
+        if response.status_code == httplib.OK:
+            sensor._mark_exists()
+            return True
         if response.status_code == httplib.NOT_FOUND: return False
 
         raise error(response, "has sensor")
@@ -50,6 +88,65 @@ class Device(object):
     def url(self, url_path):
         return self._requests.url(url_path)
 
+    @property
+    def device_id(self):
+        return self._requests.deviceId
+
+    @property
+    def upload_chunker(self):
+        """
+        AdaptiveChunker that sizes the upload chunks for every channel of the device
+        """
+        return self._chunker
+
+    def upload_metrics(self):
+        """
+        UploadMetrics with the current chunk size and the upload throughput so far
+        """
+        return self._chunker.metrics()
+
+    @property
+    def rate_limiter(self):
+        """
+        RateLimiter that every request of the device waits on, or None if requests aren't rate limited
+        """
+        return self._requests.limiter
+
+    def upload_scheduler(self, workers=2):
+        """
+        UploadScheduler that runs upload jobs for this device in priority order.  Use LIVE for current data and
+        BACKFILL for historical data, so live uploads keep flowing during a large backfill.
+        """
+        return UploadScheduler(self._requests.limiter, workers)
+
+    @property
+    def cache(self):
+        """
+        the Cache kept in cache_file, or None if the device doesn't have a cache file
+        """
+        return self._cache
+
+    @property
+    def range_cache(self):
+        """
+        on disk cache of downloaded timeseries ranges, or None if range caching isn't enabled
+        """
+        return self._range_cache
+
+    @property
+    def page_cache(self):
+        """
+        in memory PageCache of the pages downloaded through TimeSeriesViews
+        """
+        return self._page_cache
+
+    @property
+    def ring_buffers(self):
+        """
+        RingBufferPool with the recent points of each channel, or None if recent points aren't buffered
+        """
+        return self._ring_buffers
+
     def has_sensor(self, sensor_name):
         return self.__contains__(sensor_name)
 
@@ -88,7 +185,9 @@ class Device(object):
         if response.status_code != httplib.CREATED:
             raise error(response, "add sensor")
 
-        return self.sensor(sensor_name)
+        sensor = self.sensor(sensor_name)
+        sensor._mark_exists()
+        return sensor
 
     def sensor(self, sensor_name):
 
@@ -102,9 +201,175 @@ class Device(object):
 
         return sensor
 
+    def export_csv(self, selectors, start, end, path, nan="NaN", time_format="unix",
+                   slice_nanoseconds=DEFAULT_SLICE_NANOSECONDS, parallel=4, progress=None):
+        """
+        Export timeseries data for several channels to a csv file.  The download is streamed to disk, so the size
+        of the export isn't limited by memory.
+
+        selectors   - channels to export, as Channel objects, (sensor, channel) tuples or "sensor:channel" strings
+        start, end  - range to export in nanoseconds or as datetimes
+        slice_nanoseconds, parallel - long ranges are split into slices of this length which are downloaded in parallel
+        progress    - optional callable that is passed an ExportProgress as the export is downloaded
+
+        returns the final ExportProgress with the number of bytes written and the throughput
+        """
+        export = CsvExport(self, selectors, start, end, nan=nan, time_format=time_format,
+                           slice_nanoseconds=slice_nanoseconds, parallel=parallel, progress=progress)
+        return export.run(path)
+
+    def csv_columns(self, selectors, start, end, nan="NaN", block_size=None):
+        """
+        Download several channels from the csv endpoint straight into numpy columns aligned on a shared timestamp
+        column.  The csv is parsed a block at a time as it is downloaded, so the text is never held in memory.
+        Requires numpy.
+
+        returns a CsvColumns with a timestamps array and a 2-D values array with one column per selector
+        """
+        import csvcolumns
+
+        parser = csvcolumns.CsvColumnParser(nan, block_size or csvcolumns.DEFAULT_BLOCK_SIZE)
+        blocks = []
+
+        export = CsvExport(self, selectors, start, end, nan=nan, slice_nanoseconds=None, parallel=1)
+        export.stream(lambda data: blocks.extend(parser.feed(data)))
+        blocks.extend(parser.close())
+
+        return csvcolumns.join_blocks(parser.selectors, blocks)
+
+    def aligned(self, selectors, start, end, grid="union", method="nearest", tolerance=None, block_size=None):
+        """
+        Align several channels onto a common time grid.  The channels are downloaded a page at a time together and
+        matched to the grid a block at a time, so memory use doesn't grow with the length of the range.  Requires numpy.
+
+        selectors  - channels to align, see export_csv
+        start, end - range to align in nanoseconds or as datetimes
+        grid       - a SampleRate for evenly spaced grid times, or "union" for every timestamp of any of the channels
+        method     - "nearest", "linear" or "ffill", see align.align_column
+        tolerance  - nanoseconds a value can be from the point it came from, further values are nan
+
+        returns an Alignment, iterating over it gives AlignedBlocks of grid timestamps and a 2-D array of values with
+        one column per selector, to_block() gives the whole range as one AlignedBlock
+        """
+        import align
+
+        return align.Alignment(self, selectors, start, end, grid, method, tolerance,
+                               block_size or align.DEFAULT_BLOCK_SIZE)
+
+    def follow_many(self, selectors, since=None, workers=4, min_interval=1.0, max_interval=60.0, convertToUnits=True):
+        """
+        Follow several channels as new data arrives.  The channels are polled on a shared set of worker threads, each
+        with its own pooled connection, so hundreds of channels can be followed with a few connections.  Each
+        channel's polling backs off while it has no new data.
+
+        returns a FollowScheduler, iterating over it gives (channel, PointBlock) pairs of new data.  Call close() on it,
+        or stop iterating, to stop following.
+        """
+        from follow import Follower, FollowScheduler
+
+        followers = [Follower(self.sensor(sensor_name).channel(channel_name), since, min_interval, max_interval,
+                              convertToUnits=convertToUnits)
+                     for sensor_name, channel_name in (parse_selector(s) for s in selectors)]
+        return FollowScheduler(followers, workers)
+
+    def ensure_channels(self, manifest, parallel=8):
+        """
+        Make sure every sensor and channel in manifest exists, creating the ones that are missing.  Safe to call again
+        with the same manifest, only what's missing is created.  The sensors and channels that exist are remembered
+        (in the cache file too, if there is one), so later uploads and "in" checks don't need to ask SensorCloud.
+
+        manifest    - dict of sensor name -> list of channel names, or -> dict of channel name -> {"label", "description"},
+                      or a list of "sensor:channel" strings or (sensor, channel) tuples
+        parallel    - number of sensors or channels to create at the same time
+
+        returns a ProvisionResult with the sensor names and (sensor, channel) pairs that were created
+        """
+        wanted = _manifest(manifest)
+
+        def known(sensor_name, channel_name):
+            sensor = self.sensor(sensor_name)
+            return sensor._known_to_exist() and sensor.channel(channel_name)._known_to_exist()
+
+        #one listing of the whole device is enough to find out what's missing
+        if not all(known(s, c) for s, channels in wanted.items() for c in channels):
+            self.all_sensors()
+
+        # authenticate up front so the threads don't all try to authenticate at once
+        if not self._requests.authToken:
+            self._requests.authenticate()
+
+        def create_sensor(sensor_name):
+            try:
+                self.add_sensor(sensor_name)
+            except UserError as e:
+                #someone else may have created it since the listing
+                if e.code != httplib.BAD_REQUEST or sensor_name not in self:
+                    raise
+                return None
+            return sensor_name
+
+        def create_channel(args):
+            sensor_name, channel_name, label, description = args
+            sensor = self.sensor(sensor_name)
+            try:
+                sensor.add_channel(channel_name, label, description)
+            except UserError as e:
+                if e.code != httplib.BAD_REQUEST or channel_name not in sensor:
+                    raise
+                return None
+            return sensor_name, channel_name
+
+        missing = [s for s in wanted if not self.sensor(s)._known_to_exist()]
+        sensors_created = [s for s in run_parallel(create_sensor, missing, parallel) if s is not None]
+
+        missing = [(s, c, label, description) for s, channels in wanted.items()
+                   for c, (label, description) in channels.items() if not self.sensor(s).channel(c)._known_to_exist()]
+        channels_created = [c for c in run_parallel(create_channel, missing, parallel) if c is not None]
+
+        return ProvisionResult(sensors_created, channels_created)
+
     def save_cache(self):
         self._cache.save()
 
     def all_sensors(self):
-        pass
+        """
+        return all sensors for the device.  The sensors and their channels are downloaded in a single request and
+        the stream info for each channel is kept, so walking every channel of the device doesn't need a request per channel.
+        """
+
+        response = self.url("/sensors/")\
+                       .param("version", "1")\
+                       .accept("application/xdr")\
+                       .header("Accept-Encoding", "gzip")\
+                       .get()
+
+        if response.status_code != httplib.OK:
+            raise error(response, "get sensors")
+
+        unpacker = xdrlib.Unpacker(response.raw)
+
+        datastructure_version = unpacker.unpack_int()
+        assert datastructure_version == 1, "structure version should always be 1"
+
+        sensors = []
+        for _ in range(unpacker.unpack_uint()):
+            name = unpacker.unpack_string()
+            sensor_type = unpacker.unpack_string()
+            label = unpacker.unpack_string()
+            description = unpacker.unpack_string()
+            channel_infos = [unpack_channel_info(unpacker) for _ in range(unpacker.unpack_uint())]
+
+            sensor = self.sensor(name)
+            sensor._prime(sensor_type, label, description, channel_infos)
+            sensors.append(sensor)
+
+        #the listing is complete, so any other sensor we know about doesn't exist anymore
+        listed = set(sensor.name for sensor in sensors)
+        for name, sensor in self._sensors.items():
+            if name not in listed:
+                sensor._exists = False
+                for channel in sensor._channels.values():
+                    channel._exists = False
+
+        return sensors
 
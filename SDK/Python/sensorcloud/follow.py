@@ -0,0 +1,210 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Following channels as new data arrives.
+
+A Follower polls a channel's data/latest/ endpoint, a single point, and only downloads a range when the latest point
+is newer than the last point it has seen.  The range starts just after the last seen point, so every new point is
+downloaded once.  While no new data arrives the time between polls grows, up to max_interval, and it drops back to
+min_interval as soon as there's new data.
+
+A FollowScheduler follows many channels on a fixed number of worker threads.  The followers are kept in a heap by the
+time of their next poll, so hundreds of channels share the workers and each worker keeps one pooled connection.
+
+A poll that fails with a server error, a quota error or a network error is logged and tried again after
+max_interval, the other errors, such as an authentication failure, stop the follow.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import heapq
+import itertools
+import socket
+import httplib
+import threading
+import Queue
+from datetime import datetime
+
+from util import timestamp_to_nanosecond
+from point import PointBlock
+from error import ServerError, UserError, QuotaExceededError
+
+class Follower(object):
+
+    def __init__(self, channel, since=None, min_interval=1.0, max_interval=60.0, backoff=2.0, convertToUnits=True):
+        """
+        channel        - the channel to follow
+        since          - only points after this time are returned, nanoseconds or a datetime.  None for the points
+                         that arrive after the first poll.
+        min_interval   - seconds between polls while data is arriving
+        max_interval   - longest time between polls while no data arrives
+        backoff        - factor the time between polls grows by after a poll that found nothing new
+        """
+        self._channel = channel
+        if isinstance(since, datetime):
+            since = timestamp_to_nanosecond(since)
+        self._last_seen = since
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._convertToUnits = convertToUnits
+        self.interval = min_interval
+
+    @property
+    def channel(self):
+        return self._channel
+
+    @property
+    def last_seen(self):
+        """
+        timestamp of the last point that was returned
+        """
+        return self._last_seen
+
+    def poll(self):
+        """
+        the new points since the last poll as a PointBlock, and sets interval to the time to wait before the next poll
+        """
+        latest = self._channel.latest_point()
+        if latest is None:
+            return self._nothing_new()
+
+        if self._last_seen is None:
+            # following from now, the points that are already there aren't returned
+            self._last_seen = latest.timestamp_nanoseconds
+            return self._nothing_new()
+
+        if latest.timestamp_nanoseconds <= self._last_seen:
+            return self._nothing_new()
+
+        block = PointBlock.concat(self._channel.timeseries_data(self._last_seen + 1, latest.timestamp_nanoseconds,
+                                                                convertToUnits=self._convertToUnits).blocks())
+        if len(block) > 0:
+            self._last_seen = block.last_timestamp
+        self.interval = self._min_interval
+        return block
+
+    def failed(self, e):
+        """
+        record a poll that failed with an error that can be retried, the next poll waits max_interval
+        """
+        logger.warning("polling %s failed, retrying in %0.1fs: %s", self._channel.name, self._max_interval, e)
+        self.interval = self._max_interval
+
+    def _nothing_new(self):
+        self.interval = min(self._max_interval, self.interval * self._backoff)
+        return PointBlock()
+
+def _retriable(e):
+    """
+    True for errors a later poll can get past: server errors, quota errors and network errors
+    """
+    if isinstance(e, QuotaExceededError):
+        return True
+    if isinstance(e, UserError):
+        return False
+    return isinstance(e, (ServerError, socket.error, httplib.HTTPException))
+
+def follow(follower, sleep=time.sleep):
+    """
+    generator of the new Points of a Follower, polling forever
+    """
+    while True:
+        try:
+            block = follower.poll()
+        except Exception as e:
+            if not _retriable(e):
+                raise
+            follower.failed(e)
+            block = PointBlock()
+        for point in block:
+            yield point
+        sleep(follower.interval)
+
+class FollowScheduler(object):
+    """
+    polls many Followers on a shared set of worker threads.  Iterating over the scheduler gives (channel, PointBlock)
+    pairs as new data arrives, until close() is called or a poll fails with an error that can't be retried, which
+    raises the error.  e.g.
+        for channel, block in device.follow_many(["sensor:ch1", "sensor:ch2"]):
+            ...
+    """
+
+    def __init__(self, followers, workers=4, start=True):
+        self._followers = list(followers)
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        now = time.time()
+        self._heap = [(now, next(self._seq), follower) for follower in self._followers]
+        heapq.heapify(self._heap)
+        self._results = Queue.Queue()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._worker, name="follow %d" % i) for i in range(workers)]
+        for worker in self._workers:
+            worker.daemon = True
+        if start:
+            self.start()
+
+    @property
+    def followers(self):
+        return self._followers
+
+    def start(self):
+        for worker in self._workers:
+            if not worker.is_alive():
+                worker.start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._results.put(None)
+
+    def __iter__(self):
+        try:
+            while True:
+                result = self._results.get()
+                if result is None:
+                    return
+                if isinstance(result, BaseException):
+                    raise result
+                yield result
+        finally:
+            self.close()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    due = self._heap[0][0] if self._heap else None
+                    if due is not None and due <= time.time():
+                        break
+                    # wakes up for the next due poll, or when a follower is put back on the heap
+                    self._cond.wait(None if due is None else due - time.time())
+                if self._closed:
+                    return
+                _, _, follower = heapq.heappop(self._heap)
+
+            try:
+                block = follower.poll()
+            except BaseException as e:
+                if not _retriable(e):
+                    self._results.put(e)
+                    self.close()
+                    return
+                # only this channel waits, the others keep being followed
+                follower.failed(e)
+                block = PointBlock()
+            if len(block) > 0:
+                self._results.put((follower.channel, block))
+
+            with self._cond:
+                heapq.heappush(self._heap, (time.time() + follower.interval, next(self._seq), follower))
+                self._cond.notify()
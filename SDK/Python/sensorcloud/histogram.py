@@ -7,28 +7,26 @@ See file license.txt
 
 from datetime import datetime
 
+from partition import HistogramKey, normalize_float
+
 NANOSECONDS_PER_SECOND = 1000000000
 UNIX_EPOCH = datetime(1970, 1, 1)
 
 def descriptor(sample_rate, bin_start, bin_size, num_bins):
-    return "%s_%6e_%6e_%d" % (str(sample_rate), bin_start, bin_size, num_bins)
+    """ cache file descriptor of a histogram partition, see partition.HistogramKey """
+    return HistogramKey(sample_rate, bin_start, bin_size, num_bins).descriptor
 
 def descriptor_match(descriptor, sample_rate = None, bin_start = None, bin_size = None, num_bins = None):
-    
-    def descriptor_float(value):
-        return "%6e" % value
-
-    def split_descriptor():
-        sp = descriptor.split("_")
-        if len(sp) != 4:
-            return (None, None, None, None)
-        return sp
-
-    d_sample_rate, d_bin_start, d_bin_size, d_num_bins = split_descriptor()
-    ret = str(sample_rate) == d_sample_rate if sample_rate is not None else True
-    ret = ret and (descriptor_float(bin_start) == d_bin_start if bin_start is not None else True)
-    ret = ret and (descriptor_float(bin_size) == d_bin_size if bin_size is not None else True)
-    return ret and (str(num_bins) == d_num_bins if num_bins is not None else True)
+    """ True if a descriptor matches every parameter that isn't None, see PartitionIndex.find """
+    try:
+        key = HistogramKey.from_descriptor(descriptor)
+    except ValueError:
+        return sample_rate is None and bin_start is None and bin_size is None and num_bins is None
+
+    ret = str(key.sample_rate) == str(sample_rate) if sample_rate is not None else True
+    ret = ret and (key.bin_start == normalize_float(bin_start) if bin_start is not None else True)
+    ret = ret and (key.bin_size == normalize_float(bin_size) if bin_size is not None else True)
+    return ret and (key.num_bins == int(num_bins) if num_bins is not None else True)
 
 class Histogram(object):
     """
@@ -77,8 +75,11 @@ class Histogram(object):
     def bins(self):
         return self._bins
 
+    def partition_key(self, sample_rate):
+        return HistogramKey(sample_rate, self.bin_start, self.bin_size, len(self.bins))
+
     def descriptor(self, sample_rate):
-        return descriptor(sample_rate, self.bin_start, self.bin_size, len(self.bins))
+        return self.partition_key(sample_rate).descriptor
 
     def __repr__(self):
         return "Histogram(Bin Start:%s,Bin Size:%s, %s, %s)"%(self.bin_start, self.bin_size, self.timestamp, self.bins)
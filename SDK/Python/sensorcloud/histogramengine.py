@@ -0,0 +1,150 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Histograms computed on the client from raw samples.
+
+Sending raw high rate data is expensive, so HistogramEngine bins the raw samples into one histogram per interval of
+the histogram sample rate and only the histograms are uploaded.  The samples are binned in one vectorized pass with
+bincount: every sample gets the row of its interval and its bin, and bincount counts the (row, bin) pairs.  Samples
+can be pushed a block at a time.  The last interval of a block stays open until a later sample shows it's complete.
+Batches of histograms are kept as arrays, a column of timestamps and a row of counts per histogram, and go straight to
+Channel.histogram_append_arrays without making a Histogram object per interval.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from histogram import Histogram
+
+class HistogramBatch(namedtuple("HistogramBatch", ["bin_start", "bin_size", "timestamps", "counts"])):
+    """
+    histograms with the same bin configuration, as a uint64 array of timestamps and a num histograms x num bins
+    uint32 array of counts.  The fields are in the order Channel.histogram_append_arrays takes them, so a batch can be
+    uploaded with channel.histogram_append_arrays(sample_rate, *batch)
+    """
+    __slots__ = ()
+
+    @property
+    def num_bins(self):
+        return self.counts.shape[1]
+
+    def to_xdr(self):
+        return histograms_to_xdr(self.timestamps, self.counts)
+
+    def histograms(self):
+        """
+        list of Histogram objects for the batch
+        """
+        return [Histogram(timestamp, self.bin_start, self.bin_size, bins)
+                for timestamp, bins in zip(self.timestamps.tolist(), self.counts.tolist())]
+
+def histograms_to_xdr(timestamps, counts):
+    """
+    xdr encoding of histograms: for each one the timestamp as an unsigned hyper followed by the counts as unsigned ints
+    """
+    counts = np.asarray(counts, dtype=np.uint32)
+    if counts.ndim != 2 or counts.shape[0] != len(timestamps):
+        raise ValueError("counts must have a row of bins for each timestamp")
+    records = np.empty(len(timestamps), dtype=[("timestamp", ">u8"), ("bins", ">u4", (counts.shape[1],))])
+    records["timestamp"] = timestamps
+    records["bins"] = counts
+    return records.tostring()
+
+class HistogramEngine(object):
+    """
+    bins raw samples into one histogram per interval of sample_rate.  e.g.
+        engine = HistogramEngine(SampleRate.hertz(1), bin_start=-10.0, bin_size=0.5, num_bins=40)
+        for timestamps, values in blocks:
+            batch = engine.push(timestamps, values)
+            channel.histogram_append_arrays(SampleRate.hertz(1), *batch)
+        channel.histogram_append_arrays(SampleRate.hertz(1), *engine.flush())
+
+    The intervals are aligned to the unix epoch the same way SampleRate.timestamps is, and a histogram is timestamped
+    with the start of its interval.
+    Samples outside the bins are dropped, or counted in the first or last bin if clip is True.
+    """
+
+    def __init__(self, sample_rate, bin_start, bin_size, num_bins, clip=False):
+        assert bin_size > 0 and num_bins > 0
+        self._sample_rate = sample_rate
+        self._bin_start = bin_start
+        self._bin_size = bin_size
+        self._num_bins = int(num_bins)
+        self._clip = clip
+
+        # the interval that can still get samples, and its counts so far
+        self._open_interval = None
+        self._open_counts = None
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    def push(self, timestamps, values):
+        """
+        add samples, in time order.  returns a HistogramBatch of the intervals that are complete.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(timestamps) != len(values):
+            raise ValueError("timestamps and values must be the same length")
+        if len(timestamps) == 0:
+            return self._batch(np.empty(0, dtype=np.uint64), np.empty((0, self._num_bins), dtype=np.uint32))
+
+        intervals = self._sample_rate.interval_indexes(timestamps)
+        if np.any(intervals[1:] < intervals[:-1]) or \
+                (self._open_interval is not None and intervals[0] < self._open_interval):
+            raise ValueError("samples must be pushed in time order")
+
+        bins = np.floor((values - self._bin_start) / self._bin_size)
+        if self._clip:
+            bins = np.clip(np.nan_to_num(bins), 0, self._num_bins - 1)
+            keep = ~np.isnan(values)
+        else:
+            keep = (bins >= 0) & (bins < self._num_bins)
+        bins = bins.astype(np.int64)
+
+        # a row for every interval that has samples, then count the (row, bin) pairs
+        unique, rows = np.unique(intervals, return_inverse=True)
+        flat = rows[keep] * self._num_bins + bins[keep]
+        counts = np.bincount(flat, minlength=len(unique) * self._num_bins).reshape(len(unique), self._num_bins)
+
+        if self._open_interval is not None:
+            if unique[0] == self._open_interval:
+                counts[0] += self._open_counts
+            else:
+                unique = np.concatenate(([self._open_interval], unique))
+                counts = np.vstack((self._open_counts, counts))
+
+        # the last interval might get more samples
+        self._open_interval = unique[-1]
+        self._open_counts = counts[-1].copy()
+        return self._batch(unique[:-1], counts[:-1])
+
+    def push_regular(self, sample_rate, start, values):
+        """
+        add regularly sampled values, start is the timestamp of the first value in nanoseconds
+        """
+        return self.push(sample_rate.timestamps(start, 0, len(values)), values)
+
+    def flush(self):
+        """
+        returns a HistogramBatch with the open interval, if there is one
+        """
+        if self._open_interval is None:
+            return self._batch(np.empty(0, dtype=np.uint64), np.empty((0, self._num_bins), dtype=np.uint32))
+        batch = self._batch(np.array([self._open_interval], dtype=np.uint64), self._open_counts.reshape(1, -1))
+        self._open_interval = None
+        self._open_counts = None
+        return batch
+
+    def _batch(self, intervals, counts):
+        timestamps = self._sample_rate.interval_starts(intervals)
+        return HistogramBatch(self._bin_start, self._bin_size, timestamps.astype(np.uint64),
+                              counts.astype(np.uint32))
@@ -0,0 +1,315 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Bulk import of archived data files into channels.
+
+Files are parsed and encoded to xdr in a pool of processes, so parsing uses every core, and the encoded pieces are
+uploaded from a pool of threads that each keep their connection open.  Supported files:
+
+    .csv        the format of Device.export_csv with unix timestamps: a time column and a column per sensor:channel
+    .npy        a 2 column array of (timestamp, value), or a record array with timestamp and value fields
+    .npz        a timestamps array and an array of values per sensor:channel, or timestamps and values arrays
+    .xdr, .bin  12 byte xdr points, as timeseries_append_blob takes them.  They're uploaded straight from a memory
+                mapped file
+
+.npy, .xdr and .bin files and .npz files with a single values array need a channel.  Without a sample rate the rates
+are detected from the timestamps.  A checkpoint file records the files and the pieces of files that have been
+uploaded, so an import that is stopped can be run again and picks up where it left off.  A raw xdr file is a single
+piece, so one that was partly uploaded is uploaded again in full.
+
+At most a couple of files per upload thread are parsed ahead of the uploads, so the memory an import needs doesn't
+grow with the number of files.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import time
+import threading
+from collections import namedtuple, deque
+
+from point import xdr_records, XDR_POINT_SIZE
+from ratelimit import UploadScheduler, BACKFILL
+from csvdownload import parse_selector
+
+ImportProgress = namedtuple("ImportProgress", ["files_done", "files_total", "points", "bytes", "seconds",
+                                               "points_per_second", "bytes_per_second"])
+
+# an encoded run of points for one channel.  blob is a string of xdr points, or None for a raw xdr file at path
+Piece = namedtuple("Piece", ["sensor", "channel", "sample_rate", "blob", "path", "points"])
+
+RAW_EXTENSIONS = (".xdr", ".bin")
+
+def parse_file(task):
+    """
+    parse a file into a list of Pieces.  task is (path, channel, sample_rate), channel is a selector or None.  This
+    runs in the worker processes.
+    """
+    path, channel, sample_rate = task
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in RAW_EXTENSIONS:
+        if channel is None or sample_rate is None:
+            raise ValueError("%s: raw xdr files need a channel and a sample rate" % path)
+        sensor_name, channel_name = parse_selector(channel)
+        return [Piece(sensor_name, channel_name, sample_rate, None, path, os.path.getsize(path) // XDR_POINT_SIZE)]
+
+    pieces = []
+    for selector, timestamps, values in _columns(path, extension, channel):
+        sensor_name, channel_name = parse_selector(selector)
+        for rate, first, last in _runs(timestamps, sample_rate):
+            pieces.append(Piece(sensor_name, channel_name, rate, xdr_records(timestamps[first:last], values[first:last]),
+                                path, last - first))
+    return pieces
+
+def _columns(path, extension, channel):
+    """
+    yields (selector, timestamps, values) for each channel in a file, without the missing values
+    """
+    import numpy as np
+
+    if extension == ".csv":
+        import csvcolumns
+        with open(path, "rb") as f:
+            columns = csvcolumns.load(f)
+        for selector in columns.selectors:
+            values = columns.column(selector)
+            present = ~np.isnan(values)
+            yield selector, columns.timestamps[present], values[present]
+
+    elif extension == ".npy":
+        data = np.load(path, mmap_mode="r")
+        if data.dtype.names:
+            yield _require(channel, path), data["timestamp"], data["value"]
+        else:
+            yield _require(channel, path), data[:, 0], data[:, 1]
+
+    elif extension == ".npz":
+        data = np.load(path)
+        try:
+            timestamps = data["timestamps"]
+            if "values" in data.files:
+                yield _require(channel, path), timestamps, data["values"]
+            else:
+                for name in data.files:
+                    if name != "timestamps":
+                        yield name, timestamps, data[name]
+        finally:
+            data.close()
+
+    else:
+        raise ValueError("%s: unsupported file type" % path)
+
+def _require(channel, path):
+    if channel is None:
+        raise ValueError("%s: a channel is needed to import this file" % path)
+    return channel
+
+def _runs(timestamps, sample_rate):
+    if len(timestamps) == 0:
+        return []
+    if sample_rate is not None:
+        return [(sample_rate, 0, len(timestamps))]
+    if len(timestamps) == 1:
+        raise ValueError("a sample rate can't be detected from a single point")
+    from ratedetect import detect_runs
+    return detect_runs(timestamps)
+
+class Checkpoint(object):
+    """
+    the files and pieces of files that have been imported, stored as json.  A record only counts if the file's size
+    and modification time haven't changed since, parsing the same file again gives the same pieces.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._files = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                self._files = json.load(f)
+
+    def done(self, path):
+        record = self._record(path)
+        return record is not None and record.get("done", True)
+
+    def pieces_done(self, path):
+        """
+        set of the indexes of the pieces of a partly imported file that were uploaded
+        """
+        record = self._record(path)
+        return set(record.get("pieces", [])) if record is not None else set()
+
+    def mark_done(self, path):
+        with self._lock:
+            self._files[os.path.abspath(path)] = dict(self._stat(path), done=True)
+            self._save()
+
+    def mark_piece(self, path, index):
+        with self._lock:
+            record = self._record(path)
+            if record is None:
+                record = self._files[os.path.abspath(path)] = dict(self._stat(path), done=False, pieces=[])
+            record.setdefault("pieces", []).append(index)
+            self._save()
+
+    def _record(self, path):
+        record = self._files.get(os.path.abspath(path))
+        if record is None:
+            return None
+        stat = self._stat(path)
+        if record["size"] != stat["size"] or record["mtime"] != stat["mtime"]:
+            return None
+        return record
+
+    def _save(self):
+        if self._path:
+            with open(self._path + ".tmp", "wb") as f:
+                json.dump(self._files, f)
+            os.rename(self._path + ".tmp", self._path)
+
+    def _stat(self, path):
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+class BulkImporter(object):
+
+    def __init__(self, device, channel=None, sample_rate=None, jobs=None, uploads=4, checkpoint=None,
+                 progress=None, progress_interval=1.0):
+        """
+        device            - the Device to upload to
+        channel           - selector of the channel for files that only hold one channel
+        sample_rate       - SampleRate of the data, or None to detect the rates
+        jobs              - number of parsing processes, None for one per core, 0 to parse in this process
+        uploads           - number of concurrent uploads
+        checkpoint        - path of the checkpoint file, or None
+        progress          - called with an ImportProgress at most every progress_interval seconds
+        """
+        self._device = device
+        self._channel = channel
+        self._sample_rate = sample_rate
+        self._jobs = jobs
+        self._uploads = uploads
+        self._checkpoint = Checkpoint(checkpoint)
+        self._progress = progress
+        self._progress_interval = progress_interval
+
+        self._lock = threading.Lock()
+        self._points = 0
+        self._bytes = 0
+        self._files_done = 0
+        self._files_total = 0
+        self._start = None
+        self._reported = 0.0
+
+    def progress(self):
+        with self._lock:
+            seconds = time.time() - self._start if self._start else 0.0
+            return ImportProgress(self._files_done, self._files_total, self._points, self._bytes, seconds,
+                                  self._points / seconds if seconds > 0 else 0.0,
+                                  self._bytes / seconds if seconds > 0 else 0.0)
+
+    def run(self, paths):
+        """
+        import the files, skipping the ones the checkpoint has as done.  returns the final ImportProgress
+        """
+        paths = [path for path in paths if not self._checkpoint.done(path)]
+        self._files_total = len(paths)
+        self._start = time.time()
+        tasks = deque((path, self._channel, self._sample_rate) for path in paths)
+
+        pool = None
+        if self._jobs == 0:
+            parse = _Parsed
+        else:
+            import multiprocessing
+            pool = multiprocessing.Pool(self._jobs)
+            parse = lambda task: pool.apply_async(parse_file, (task,))
+
+        # files are only handed to the parsers while there's room in the window, which counts the files being
+        # parsed and the parsed files whose pieces haven't all been uploaded, so the parsed data in memory is bounded
+        window = 2 * self._uploads
+        parsing = deque()
+        outstanding = deque()
+        scheduler = UploadScheduler(self._device.rate_limiter, self._uploads)
+        try:
+            while True:
+                self._finish_done(outstanding)
+                while tasks and len(parsing) + len(outstanding) < window:
+                    task = tasks.popleft()
+                    parsing.append((task[0], parse(task)))
+
+                if parsing and (parsing[0][1].ready() or not outstanding):
+                    path, result = parsing.popleft()
+                    outstanding.append((path, self._submit(scheduler, path, result.get())))
+                elif outstanding:
+                    self._finish(*outstanding.popleft())
+                else:
+                    break
+        finally:
+            scheduler.close(wait=False)
+            if pool is not None:
+                pool.terminate()
+
+        self._report(force=True)
+        return self.progress()
+
+    def _submit(self, scheduler, path, pieces):
+        done = self._checkpoint.pieces_done(path)
+        return [scheduler.submit(self._upload, BACKFILL, path, index, piece)
+                for index, piece in enumerate(pieces) if index not in done]
+
+    def _upload(self, path, index, piece):
+        channel = self._device.sensor(piece.sensor).channel(piece.channel)
+        if piece.blob is None:
+            channel.timeseries_append_file(piece.sample_rate, piece.path)
+        else:
+            channel.timeseries_append_blob(piece.sample_rate, piece.blob)
+        self._checkpoint.mark_piece(path, index)
+        with self._lock:
+            self._points += piece.points
+            self._bytes += piece.points * XDR_POINT_SIZE
+        self._report()
+
+    def _finish(self, path, jobs):
+        for job in jobs:
+            job.wait()
+        self._checkpoint.mark_done(path)
+        with self._lock:
+            self._files_done += 1
+        self._report()
+
+    def _finish_done(self, outstanding):
+        while outstanding and all(job.done for job in outstanding[0][1]):
+            self._finish(*outstanding.popleft())
+
+    def _report(self, force=False):
+        if self._progress is None:
+            return
+        now = time.time()
+        with self._lock:
+            if not force and now - self._reported < self._progress_interval:
+                return
+            self._reported = now
+        self._progress(self.progress())
+
+class _Parsed(object):
+    """
+    a file parsed in this process, with the interface of the pool's AsyncResult
+    """
+
+    def __init__(self, task):
+        self._pieces = parse_file(task)
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self._pieces
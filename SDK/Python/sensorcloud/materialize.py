@@ -0,0 +1,133 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Incremental computation of derived channels.
+
+A Materializer runs a transform over a source channel and appends the result to a target channel.  It keeps a
+checkpoint for each partition of the source in the device's cache file: the last source timestamp it processed and the
+last timestamp it wrote.  Each run only reads the source data after the checkpoint, so a scheduled job takes time in
+proportion to the new data rather than the whole history.  e.g.
+
+    job = Materializer(device, "temperature-delta", "sensor:temperature", "sensor:temperature_delta",
+                       lambda: [Expression(lambda t, x: np.diff(x, prepend=x[0]))], lookback=60 * 10 ** 9)
+    job.run()
+
+Windowed transforms need some data from before the checkpoint, lookback nanoseconds of it are read again on every
+run.  The transform sees that data again but only output after the last output timestamp is appended, so nothing is
+written twice.  The stages are made new for each partition on each run, so stateful stages such as a Biquad start
+from the lookback data.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import namedtuple
+
+from csvdownload import parse_selector
+from error import Error
+
+MaterializeResult = namedtuple("MaterializeResult", ["partitions", "points_read", "points_written"])
+
+class Materializer(object):
+
+    def __init__(self, device, name, source, target, make_stages, lookback=0, sample_rate=None):
+        """
+        device      - the Device, it needs a cache file for the checkpoints
+        name        - name of the job, the checkpoints are kept under it
+        source      - selector of the source channel, see export_csv
+        target      - selector of the channel the output is appended to
+        make_stages - function that returns a list of pipeline stages, see pipeline.Pipeline.pipe
+        lookback    - nanoseconds of source data before the checkpoint that are read again on each run
+        sample_rate - sample rate of the output, by default the sample rate of the source partition
+        """
+        if device.cache is None:
+            raise Error("materializing needs a device with a cache file for the checkpoints")
+        self._device = device
+        self._job = device.cache.job(name)
+        self._source = _channel(device, source)
+        self._target = _channel(device, target)
+        self._make_stages = make_stages
+        self._lookback = lookback
+        self._sample_rate = sample_rate
+
+    @property
+    def name(self):
+        return self._job.name
+
+    def checkpoint(self, sample_rate):
+        """
+        the JobCheckpoint of the source partition with sample_rate
+        """
+        return self._job.checkpoint(sample_rate)
+
+    def reset(self):
+        """
+        forget the checkpoints, the next run reads the whole source again and writes all of its output.  Delete the
+        target's data before running again.
+        """
+        self._job.reset()
+        self._job.save()
+
+    def run(self):
+        """
+        process the source data that's new since the last run.  returns a MaterializeResult
+        """
+        # the partitions are read again so data appended since the last run is seen
+        self._source._timeseries_partitions = None
+        partitions = self._source._get_timeseries_partitions().values()
+
+        result = MaterializeResult(0, 0, 0)
+        for partition in sorted(partitions, key=lambda p: p['end_time']):
+            read, written = self._run_partition(partition['sample_rate'], partition['end_time'])
+            if read:
+                result = MaterializeResult(result.partitions + 1, result.points_read + read,
+                                           result.points_written + written)
+        return result
+
+    def _run_partition(self, sample_rate, end):
+        checkpoint = self._job.checkpoint(sample_rate)
+        done = checkpoint.source_timestamp
+        if done is not None and done >= end:
+            return 0, 0
+
+        start = 0 if done is None else max(0, done + 1 - self._lookback)
+        written_until = checkpoint.output_timestamp
+        output_rate = self._sample_rate or sample_rate
+
+        stages = self._make_stages()
+        read = written = 0
+        for block in self._source.timeseries_data(start, end, samplerate=sample_rate).blocks():
+            read += len(block)
+            output = block
+            for stage in stages:
+                output = stage(sample_rate, output)
+            if written_until is not None:
+                output = output.between(written_until + 1, _MAX_TIMESTAMP)
+            if len(output) > 0:
+                self._target.timeseries_append(output_rate, output)
+                written += len(output)
+                written_until = output.last_timestamp
+                # the output is on the server now, a run that dies after this mustn't append it again
+                checkpoint.output_timestamp = written_until
+                checkpoint.source_timestamp = block.last_timestamp
+                self._job.save()
+            else:
+                checkpoint.source_timestamp = block.last_timestamp
+
+        checkpoint.source_timestamp = end
+        self._job.save()
+        logger.debug("%s: %s read %d points, wrote %d", self.name, sample_rate, read, written)
+        return read, written
+
+_MAX_TIMESTAMP = 0xFFFFFFFFFFFFFFFF
+
+def _channel(device, selector):
+    if hasattr(selector, "sensor") and hasattr(selector, "name"):
+        return selector
+    sensor_name, channel_name = parse_selector(selector)
+    return device.sensor(sensor_name).channel(channel_name)
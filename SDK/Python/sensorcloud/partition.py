@@ -0,0 +1,130 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Typed partition keys and an index over the partitions of a channel.
+
+A timeseries partition is identified by its sample rate, a histogram partition by its sample rate and bin
+configuration.  Keys are immutable and hashable.  The bin start and size are stored as xdr floats, so they're
+normalized once when a key is made and after that keys compare exactly.  The string descriptors are only used for
+the keys in the cache file.
+"""
+
+import struct
+from collections import namedtuple
+
+from samplerate import SampleRate
+
+def normalize_float(value):
+    """
+    round a bin parameter to the float32 it's stored as, at the precision the cache file keeps
+    """
+    value = struct.unpack("f", struct.pack("f", value))[0]
+    return struct.unpack("f", struct.pack("f", float("%6e" % value)))[0]
+
+class TimeSeriesKey(namedtuple("TimeSeriesKey", ["sample_rate"])):
+    __slots__ = ()
+
+    @property
+    def descriptor(self):
+        return str(self.sample_rate)
+
+    @classmethod
+    def from_descriptor(cls, descriptor):
+        return cls(SampleRate.from_string(descriptor))
+
+class HistogramKey(namedtuple("HistogramKey", ["sample_rate", "bin_start", "bin_size", "num_bins"])):
+    __slots__ = ()
+
+    def __new__(cls, sample_rate, bin_start, bin_size, num_bins):
+        return super(HistogramKey, cls).__new__(cls, sample_rate, normalize_float(bin_start), normalize_float(bin_size),
+                                                int(num_bins))
+
+    @property
+    def descriptor(self):
+        return "%s_%6e_%6e_%d" % (str(self.sample_rate), self.bin_start, self.bin_size, self.num_bins)
+
+    @classmethod
+    def from_descriptor(cls, descriptor):
+        sample_rate, bin_start, bin_size, num_bins = descriptor.split("_")
+        return cls(SampleRate.from_string(sample_rate), float(bin_start), float(bin_size), int(num_bins))
+
+# query values are normalized the same way the keys are
+_NORMALIZE = {
+    "bin_start": normalize_float,
+    "bin_size": normalize_float,
+    "num_bins": int,
+}
+
+class PartitionIndex(object):
+    """
+    partitions of a channel, keyed by TimeSeriesKey or HistogramKey.  Every field of the keys is also indexed on its
+    own, so a query that leaves some fields open only looks at the partitions that share the most selective field.
+    """
+
+    def __init__(self, partitions=None):
+        self._partitions = {}
+        self._by_field = {}
+        for key, partition in partitions or []:
+            self[key] = partition
+
+    def find(self, **fields):
+        """
+        list of (key, partition) pairs for the keys that match every field that isn't None.  e.g.
+        find(sample_rate=SampleRate.hertz(10)) or find(bin_start=0.0, bin_size=1.0, num_bins=10)
+        """
+        fields = dict((field, _NORMALIZE.get(field, lambda v: v)(value))
+                      for field, value in fields.items() if value is not None)
+        if not fields:
+            return self._partitions.items()
+
+        candidates = None
+        for field, value in fields.items():
+            keys = self._by_field.get(field, {}).get(value, ())
+            if candidates is None or len(keys) < len(candidates):
+                candidates = keys
+
+        return [(key, self._partitions[key]) for key in candidates
+                if all(getattr(key, field) == value for field, value in fields.items())]
+
+    def get(self, key, default=None):
+        return self._partitions.get(key, default)
+
+    def keys(self):
+        return self._partitions.keys()
+
+    def values(self):
+        return self._partitions.values()
+
+    def items(self):
+        return self._partitions.items()
+
+    def __getitem__(self, key):
+        return self._partitions[key]
+
+    def __setitem__(self, key, partition):
+        if key not in self._partitions:
+            for field, value in zip(key._fields, key):
+                self._by_field.setdefault(field, {}).setdefault(value, set()).add(key)
+        self._partitions[key] = partition
+
+    def __delitem__(self, key):
+        del self._partitions[key]
+        for field, value in zip(key._fields, key):
+            keys = self._by_field[field][value]
+            keys.discard(key)
+            if not keys:
+                del self._by_field[field][value]
+
+    def __contains__(self, key):
+        return key in self._partitions
+
+    def __iter__(self):
+        return iter(self._partitions)
+
+    def __len__(self):
+        return len(self._partitions)
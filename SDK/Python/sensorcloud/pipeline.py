@@ -0,0 +1,242 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Streaming transforms of timeseries data.
+
+    channel.timeseries_data(start, end).pipe(Biquad.notch(60, 1000)).pipe(Scale(9.81)).to_channel(target)
+
+A Pipeline reads a stream a page at a time and passes each page through its stages in order.  A stage gets a whole
+page, a (sample_rate, PointBlock) pair, and returns the transformed PointBlock.  Stages can keep state from one page
+to the next, a Biquad carries its filter state so the output is the same as filtering the whole record at once.  Only a
+page or two is held in memory at a time, however long the record is.
+
+to_channel uploads the output from a separate thread, so the next page downloads while the last one uploads.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import math
+import threading
+import Queue
+
+from point import PointBlock
+from samplerate import HERTZ
+
+class Scale(object):
+    """
+    value * slope + offset
+    """
+
+    def __init__(self, slope=1.0, offset=0.0):
+        self._slope = slope
+        self._offset = offset
+
+    def __call__(self, sample_rate, block):
+        try:
+            _numpy()
+        except ImportError:
+            return PointBlock(block.timestamps, [v * self._slope + self._offset for v in block.values])
+        _, values = block.to_numpy()
+        return PointBlock(block.timestamps, values * self._slope + self._offset)
+
+class Expression(object):
+    """
+    values computed by a function of the page, f(timestamps, values) with numpy arrays, or by a python expression
+    of t and x, e.g. Expression("np.sqrt(np.abs(x))").  The expression can use np for numpy.  Requires numpy.
+    """
+
+    def __init__(self, expression):
+        if callable(expression):
+            self._function = expression
+        else:
+            code = compile(expression, "<expression>", "eval")
+            self._function = lambda t, x: eval(code, {"np": _numpy()}, {"t": t, "x": x})
+
+    def __call__(self, sample_rate, block):
+        timestamps, values = block.to_numpy()
+        values = self._function(timestamps, values)
+        if len(values) != len(block):
+            raise ValueError("an expression must give one value per point")
+        return PointBlock(block.timestamps, values)
+
+def _numpy():
+    import numpy as np
+    return np
+
+class Biquad(object):
+    """
+    second order IIR filter, y[n] = b0 x[n] + b1 x[n-1] + b2 x[n-2] - a1 y[n-1] - a2 y[n-2], in transposed direct form
+    II.  The filter state is carried from one page to the next, unless the sample rate changes or there's a gap of
+    more than a couple of samples between the pages, then the filter starts over.  The data is assumed to be evenly
+    sampled at the rate the coefficients were designed for.  scipy.signal.lfilter is used when it's installed,
+    otherwise each sample is filtered in python.
+    """
+
+    def __init__(self, b0, b1, b2, a1, a2):
+        self._b = (float(b0), float(b1), float(b2))
+        self._a = (1.0, float(a1), float(a2))
+        self.reset()
+
+    @classmethod
+    def notch(cls, frequency, sample_rate, q=30.0):
+        """
+        notch filter that removes frequency, e.g. mains hum.  sample_rate is a SampleRate or the rate in hertz.
+        """
+        w0 = 2 * math.pi * frequency / _hertz(sample_rate)
+        alpha = math.sin(w0) / (2 * q)
+        a0 = 1 + alpha
+        return cls(1 / a0, -2 * math.cos(w0) / a0, 1 / a0, -2 * math.cos(w0) / a0, (1 - alpha) / a0)
+
+    @classmethod
+    def lowpass(cls, frequency, sample_rate, q=1 / math.sqrt(2)):
+        w0 = 2 * math.pi * frequency / _hertz(sample_rate)
+        alpha = math.sin(w0) / (2 * q)
+        a0 = 1 + alpha
+        b1 = (1 - math.cos(w0)) / a0
+        return cls(b1 / 2, b1, b1 / 2, -2 * math.cos(w0) / a0, (1 - alpha) / a0)
+
+    @classmethod
+    def highpass(cls, frequency, sample_rate, q=1 / math.sqrt(2)):
+        w0 = 2 * math.pi * frequency / _hertz(sample_rate)
+        alpha = math.sin(w0) / (2 * q)
+        a0 = 1 + alpha
+        b1 = -(1 + math.cos(w0)) / a0
+        return cls(-b1 / 2, b1, -b1 / 2, -2 * math.cos(w0) / a0, (1 - alpha) / a0)
+
+    def reset(self):
+        self._state = [0.0, 0.0]
+        self._sample_rate = None
+        self._last_timestamp = None
+
+    def __call__(self, sample_rate, block):
+        if len(block) == 0:
+            return block
+        if not self._follows(sample_rate, block.first_timestamp):
+            self._state = [0.0, 0.0]
+        self._sample_rate = sample_rate
+        self._last_timestamp = block.last_timestamp
+
+        try:
+            from scipy.signal import lfilter
+        except ImportError:
+            return PointBlock(block.timestamps, self._filter(block.values))
+
+        _, values = block.to_numpy()
+        filtered, state = lfilter(self._b, self._a, values.astype("float64"), zi=self._state)
+        self._state = list(state)
+        return PointBlock(block.timestamps, filtered)
+
+    def _follows(self, sample_rate, timestamp):
+        """
+        whether a page that starts at timestamp continues the data the state came from
+        """
+        if self._last_timestamp is None or sample_rate != self._sample_rate:
+            return False
+        if hasattr(sample_rate, "sample_offset"):
+            return timestamp - self._last_timestamp <= sample_rate.sample_offset(2)
+        return True
+
+    def _filter(self, values):
+        b0, b1, b2 = self._b
+        _, a1, a2 = self._a
+        s1, s2 = self._state
+        out = []
+        append = out.append
+        for x in values:
+            y = b0 * x + s1
+            s1 = b1 * x - a1 * y + s2
+            s2 = b2 * x - a2 * y
+            append(y)
+        self._state = [s1, s2]
+        return out
+
+def _hertz(sample_rate):
+    if hasattr(sample_rate, "rate_type"):
+        if sample_rate.rate_type == HERTZ:
+            return float(sample_rate.rate)
+        return 1.0 / sample_rate.rate
+    return float(sample_rate)
+
+class Pipeline(object):
+    """
+    a stream of (sample_rate, PointBlock) pages passed through stages.  Made with TimeSeriesStream.pipe
+    """
+
+    def __init__(self, pages, stages=()):
+        """
+        pages - callable that returns an iterator of (sample_rate, PointBlock)
+        """
+        self._pages = pages
+        self._stages = list(stages)
+
+    def pipe(self, stage):
+        """
+        a new Pipeline with stage added to the end.  A stage is a callable stage(sample_rate, block) that returns
+        a PointBlock, like Scale, Biquad and Expression.
+        """
+        return Pipeline(self._pages, self._stages + [stage])
+
+    def pages(self):
+        """
+        iterate over the output a page at a time as (sample_rate, PointBlock)
+        """
+        for sample_rate, block in self._pages():
+            for stage in self._stages:
+                block = stage(sample_rate, block)
+            yield sample_rate, block
+
+    def blocks(self):
+        for _, block in self.pages():
+            yield block
+
+    def to_block(self):
+        return PointBlock.concat(self.blocks())
+
+    def to_channel(self, channel, queue_size=2):
+        """
+        upload the output to channel, with the sample rate each page was downloaded with.  Pages are uploaded from a
+        separate thread while the next pages download, at most queue_size pages wait for the upload.
+
+        returns the number of points uploaded
+        """
+        pages = Queue.Queue(queue_size)
+        failure = []
+        uploaded = [0]
+
+        def upload():
+            while True:
+                page = pages.get()
+                if page is None:
+                    return
+                if failure:
+                    continue
+                sample_rate, block = page
+                try:
+                    channel.timeseries_append(sample_rate, block)
+                    uploaded[0] += len(block)
+                except BaseException as e:
+                    failure.append(e)
+
+        uploader = threading.Thread(target=upload, name="pipeline upload")
+        uploader.daemon = True
+        uploader.start()
+        try:
+            for page in self.pages():
+                if failure:
+                    break
+                if len(page[1]) > 0:
+                    pages.put(page)
+        finally:
+            pages.put(None)
+            uploader.join()
+
+        if failure:
+            raise failure[0]
+        logger.debug("piped %d points to %s", uploaded[0], channel.name)
+        return uploaded[0]
@@ -5,11 +5,34 @@ Distributed under the Simplified BSD License.
 See file license.txt
 """
 
+import sys
+import bisect
+import struct
+from array import array
+from itertools import izip
 from datetime import datetime
 
 NANOSECONDS_PER_SECOND = 1000000000
 UNIX_EPOCH = datetime(1970, 1, 1)
 
+def _timestamp_typecode():
+    for typecode in ('L', 'Q'):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError: # 'Q' is only in python 3
+            pass
+    return None
+
+# array typecodes for the columns of a PointBlock.  'L' is a 64 bit unsigned long on 64 bit posix platforms.  Where
+# the array module has no 64 bit unsigned type, on windows and 32 bit pythons, TIMESTAMP_TYPECODE is None and the
+# timestamps are kept in a TimestampList instead
+TIMESTAMP_TYPECODE = _timestamp_typecode()
+VALUE_TYPECODE = 'f'
+
+# size of a datapoint in xdr, an unsigned hyper timestamp and a float value
+XDR_POINT_SIZE = 12
+
 class Point(object):
     """
     Point represents a datapoint as a timestamp and value in a timeseries dataset.
@@ -54,4 +77,216 @@ class Point(object):
         return self.value == other.value and self.timestamp_nanoseconds == other.timestamp_nanoseconds
 
     def __ne__(self, other):
-        return not self.__eq__(other)
\ No newline at end of file
+        return not self.__eq__(other)
+
+def xdr_records(timestamps, values):
+    """
+    xdr encoding of numpy columns of timestamps and values in one vectorized pass, without making a PointBlock
+    """
+    import numpy as np
+
+    records = np.empty(len(timestamps), dtype=[("timestamp", ">u8"), ("value", ">f4")])
+    records["timestamp"] = timestamps
+    records["value"] = values
+    return records.tostring()
+
+class TimestampList(list):
+    """
+    column of timestamps for platforms whose array module has no 64 bit unsigned type.  It has the parts of the
+    array interface that the columns of a PointBlock are used through.
+    """
+
+    typecode = 'Q'
+    itemsize = 8
+
+    def fromstring(self, data):
+        self.extend(struct.unpack("=%dQ" % (len(data) // 8), data))
+
+    def tostring(self):
+        return struct.pack("=%dQ" % len(self), *self)
+
+    def byteswap(self):
+        self[:] = struct.unpack("<%dQ" % len(self), struct.pack(">%dQ" % len(self), *self))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TimestampList(list.__getitem__(self, index))
+        return list.__getitem__(self, index)
+
+    def __getslice__(self, i, j):
+        return TimestampList(list.__getslice__(self, i, j))
+
+    def __add__(self, other):
+        return TimestampList(list.__add__(self, list(other)))
+
+    def __mul__(self, n):
+        return TimestampList(list.__mul__(self, n))
+
+def timestamp_array(data=()):
+    """
+    new column of unsigned 64 bit timestamps, an array or a TimestampList where there's no 64 bit array type
+    """
+    if TIMESTAMP_TYPECODE is None:
+        return TimestampList(data)
+    return array(TIMESTAMP_TYPECODE, data)
+
+def is_timestamp_array(data):
+    if TIMESTAMP_TYPECODE is None:
+        return isinstance(data, TimestampList)
+    return isinstance(data, array) and data.typecode == TIMESTAMP_TYPECODE
+
+def _to_array(typecode, data):
+    if typecode == TIMESTAMP_TYPECODE and is_timestamp_array(data):
+        return data
+    if isinstance(data, array) and data.typecode == typecode:
+        return data
+    if hasattr(data, "dtype"):
+        # numpy array, convert with numpy rather than element by element
+        column = timestamp_array() if typecode == TIMESTAMP_TYPECODE else array(typecode)
+        column.fromstring(data.astype("=u8" if typecode == TIMESTAMP_TYPECODE else "=f4").tostring())
+        return column
+    if typecode == TIMESTAMP_TYPECODE:
+        return timestamp_array(data)
+    return array(typecode, data)
+
+class PointBlock(object):
+    """
+    PointBlock is a block of datapoints stored as a compact column of timestamps (nanoseconds since 1970) and a
+    column of float values, 12 bytes per point instead of a Point object for every sample.  Iterating over a block
+    creates Point objects one at a time as they are needed.
+    """
+
+    __slots__ = ["_timestamps", "_values"]
+
+    def __init__(self, timestamps=None, values=None):
+        self._timestamps = _to_array(TIMESTAMP_TYPECODE, timestamps if timestamps is not None else [])
+        self._values = _to_array(VALUE_TYPECODE, values if values is not None else [])
+        assert len(self._timestamps) == len(self._values), "timestamps and values must be the same length"
+
+    @classmethod
+    def from_points(cls, points):
+        if isinstance(points, PointBlock):
+            return points
+        return cls([p.timestamp_nanoseconds for p in points], [p.value for p in points])
+
+    @classmethod
+    def from_xdr(cls, data):
+        """
+        decode a list of xdr datapoints.  The columns are split out of the interleaved records with extended slices,
+        so there is no per-point work in python.
+        """
+        count = len(data) // XDR_POINT_SIZE
+        data = bytes(data[:count * XDR_POINT_SIZE])
+
+        timestamp_bytes = bytearray(count * 8)
+        for i in range(8):
+            timestamp_bytes[i::8] = data[i::XDR_POINT_SIZE]
+        value_bytes = bytearray(count * 4)
+        for i in range(4):
+            value_bytes[i::4] = data[8 + i::XDR_POINT_SIZE]
+
+        timestamps = timestamp_array()
+        timestamps.fromstring(bytes(timestamp_bytes))
+        values = array(VALUE_TYPECODE)
+        values.fromstring(bytes(value_bytes))
+
+        #xdr is big endian
+        if sys.byteorder == "little":
+            timestamps.byteswap()
+            values.byteswap()
+
+        return cls(timestamps, values)
+
+    @classmethod
+    def concat(cls, blocks):
+        timestamps = timestamp_array()
+        values = array(VALUE_TYPECODE)
+        for block in blocks:
+            timestamps.extend(block.timestamps)
+            values.extend(block.values)
+        return cls(timestamps, values)
+
+    @property
+    def timestamps(self):
+        """ column of timestamps in nanoseconds since 1970 """
+        return self._timestamps
+
+    @property
+    def values(self):
+        """ column of values """
+        return self._values
+
+    @property
+    def first_timestamp(self):
+        return self._timestamps[0] if self._timestamps else None
+
+    @property
+    def last_timestamp(self):
+        return self._timestamps[-1] if self._timestamps else None
+
+    def to_xdr(self):
+        """
+        encode the block as a list of xdr datapoints, ready to be uploaded
+        """
+        timestamps = self._timestamps[:]
+        values = self._values[:]
+        if sys.byteorder == "little":
+            timestamps.byteswap()
+            values.byteswap()
+        timestamp_bytes = timestamps.tostring()
+        value_bytes = values.tostring()
+
+        data = bytearray(len(self) * XDR_POINT_SIZE)
+        for i in range(8):
+            data[i::XDR_POINT_SIZE] = timestamp_bytes[i::8]
+        for i in range(4):
+            data[8 + i::XDR_POINT_SIZE] = value_bytes[i::4]
+        return bytes(data)
+
+    def to_numpy(self):
+        """
+        get the columns as numpy arrays, (uint64 timestamps, float32 values).  The arrays share memory with the block,
+        except for timestamps kept in a TimestampList.
+        """
+        import numpy as np
+        if isinstance(self._timestamps, TimestampList):
+            timestamps = np.array(self._timestamps, dtype=np.uint64)
+        else:
+            timestamps = np.frombuffer(self._timestamps, dtype=np.uint64)
+        return timestamps, np.frombuffer(self._values, dtype=np.float32)
+
+    def between(self, start, end):
+        """
+        select the points with start <= timestamp <= end
+        """
+        first = bisect.bisect_left(self._timestamps, start)
+        last = bisect.bisect_right(self._timestamps, end, first)
+        return self[first:last]
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def __iter__(self):
+        for timestamp, value in izip(self._timestamps, self._values):
+            yield Point(timestamp, value)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PointBlock(self._timestamps[index], self._values[index])
+        return Point(self._timestamps[index], self._values[index])
+
+    def __add__(self, other):
+        return PointBlock.concat([self, PointBlock.from_points(other)])
+
+    def __eq__(self, other):
+        if not isinstance(other, PointBlock):
+            return NotImplemented
+        return self._timestamps == other._timestamps and self._values == other._values
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        if not self:
+            return "PointBlock()"
+        return "PointBlock(%d points, %s - %s)" % (len(self), self[0].timestamp, self[-1].timestamp)
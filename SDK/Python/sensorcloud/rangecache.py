@@ -0,0 +1,254 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+On disk read-through cache for downloaded timeseries ranges.
+
+Each cached stream (device, sensor, channel, sample rate) is a directory holding an index.json and a set of
+blocks.  A block is one file with a column of timestamps followed by a column of values, which is memory mapped
+when read so only the pages that are touched are loaded.  The index keeps the time range each block covers, so the
+ranges that are already on disk and the gaps that still need to be downloaded can be worked out without touching
+the blocks.
+
+Only data at or before the end_time of a partition should be stored, since that data can't change anymore.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import re
+import sys
+import json
+import mmap
+import bisect
+import struct
+from array import array
+
+from error import Error
+from point import TIMESTAMP_TYPECODE, VALUE_TYPECODE
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 2
+
+def _safe_name(name):
+    return re.sub(r"[^-_.a-zA-Z0-9]", "_", str(name))
+
+class RangeCache(object):
+    """
+    Root of a range cache.  Streams are stored in <path>/<device>/<sensor>/<channel>/<sample rate>/
+    """
+
+    def __init__(self, path):
+        if TIMESTAMP_TYPECODE is None:
+            raise Error("the range cache needs an array type of 64 bit unsigned integers, this platform has none")
+        self._path = path
+        self._entries = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    def entry(self, device_id, sensor_name, channel_name, sample_rate=None):
+        key = (device_id, sensor_name, channel_name, str(sample_rate) if sample_rate else "all")
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = RangeCacheEntry(os.path.join(self._path, *[_safe_name(k) for k in key]))
+            self._entries[key] = entry
+        return entry
+
+class RangeCacheEntry(object):
+    """
+    Cached ranges for a single stream.  All ranges are inclusive on both ends, the same as starttime and endtime
+    for a timeseries download.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._blocks = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def blocks(self):
+        """ sorted list of [start, end, count, filename] """
+        if self._blocks is None:
+            self._blocks = self._load_index()
+        return self._blocks
+
+    def covered(self):
+        """
+        list of (start, end) ranges that are stored in the cache, adjacent blocks are merged
+        """
+        ranges = []
+        for start, end, _, _ in self.blocks:
+            if ranges and ranges[-1][1] + 1 >= start:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def missing(self, start, end):
+        """
+        list of (start, end) ranges inside of [start, end] that still need to be downloaded
+        """
+        gaps = []
+        current = start
+        for s, e in self.covered():
+            if e < current:
+                continue
+            if s > end:
+                break
+            if s > current:
+                gaps.append((current, s - 1))
+            current = e + 1
+            if current > end:
+                break
+        if current <= end:
+            gaps.append((current, end))
+        return gaps
+
+    def segments(self, start, end):
+        """
+        split [start, end] into an ordered list of (start, end, is_cached) ranges
+        """
+        segments = [(max(s, start), min(e, end), True) for s, e in self.covered() if e >= start and s <= end]
+        segments += [(s, e, False) for s, e in self.missing(start, end)]
+        segments.sort()
+        return segments
+
+    def read(self, start, end):
+        """
+        read all cached data in [start, end].  returns a (timestamps, values) pair of arrays
+        """
+        timestamps = array(TIMESTAMP_TYPECODE)
+        values = array(VALUE_TYPECODE)
+        for ts, vals in self.iter_read(start, end):
+            timestamps.extend(ts)
+            values.extend(vals)
+        return timestamps, values
+
+    def iter_read(self, start, end):
+        """
+        read the cached data in [start, end] one block at a time.  yields (timestamps, values) pairs of arrays
+        """
+        for block_start, block_end, count, filename in self.blocks:
+            if block_end < start or block_start > end or count == 0:
+                continue
+            yield self._read_block(filename, count, start, end)
+
+    def store(self, start, end, timestamps, values):
+        """
+        store the data downloaded for [start, end].  The whole range is marked as cached, even if there was no data.
+        """
+        assert len(timestamps) == len(values)
+        assert end >= start
+
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+
+        filename = None
+        if len(timestamps) > 0:
+            filename = "%d-%d.blk" % (start, end)
+            ts = timestamps if isinstance(timestamps, array) and timestamps.typecode == TIMESTAMP_TYPECODE else array(TIMESTAMP_TYPECODE, timestamps)
+            vals = values if isinstance(values, array) and values.typecode == VALUE_TYPECODE else array(VALUE_TYPECODE, values)
+            with open(os.path.join(self._path, filename), 'wb') as f:
+                ts.tofile(f)
+                vals.tofile(f)
+
+        # drop anything the new block overlaps, it was downloaded from the same immutable range
+        blocks = []
+        for block in self.blocks:
+            if block[1] < start or block[0] > end:
+                blocks.append(block)
+            elif block[3] and block[3] != filename:
+                self._unlink(block[3])
+        bisect.insort(blocks, [start, end, len(timestamps), filename])
+        self._blocks = blocks
+        self._save_index()
+
+    def clear(self):
+        for _, _, _, filename in self.blocks:
+            if filename:
+                self._unlink(filename)
+        self._blocks = []
+        self._save_index()
+
+    def _unlink(self, filename):
+        try:
+            os.unlink(os.path.join(self._path, filename))
+        except OSError:
+            pass
+
+    def _read_block(self, filename, count, start, end):
+        ts_size = 8
+        ts_format = "=Q"
+
+        with open(os.path.join(self._path, filename), 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                def timestamp(i):
+                    return struct.unpack_from(ts_format, mm, i * ts_size)[0]
+
+                # binary search the timestamp column so only the rows in range are read
+                lo, hi = 0, count
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if timestamp(mid) < start: lo = mid + 1
+                    else: hi = mid
+                first = lo
+                hi = count
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if timestamp(mid) <= end: lo = mid + 1
+                    else: hi = mid
+                last = lo
+
+                timestamps = array(TIMESTAMP_TYPECODE)
+                timestamps.fromstring(mm[first * ts_size:last * ts_size])
+
+                values_offset = count * ts_size
+                value_size = array(VALUE_TYPECODE).itemsize
+                values = array(VALUE_TYPECODE)
+                values.fromstring(mm[values_offset + first * value_size:values_offset + last * value_size])
+            finally:
+                mm.close()
+
+        return timestamps, values
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self._path, INDEX_FILE), 'rb') as f:
+                index = json.loads(f.read())
+        except (IOError, ValueError): # the stream hasn't been cached yet
+            return []
+
+        if index.get("version") != INDEX_VERSION or index.get("byteorder") != sys.byteorder:
+            logger.info("discarding incompatible range cache %s", self._path)
+            return []
+
+        return sorted([[long(b[0]), long(b[1]), int(b[2]), str(b[3]) if b[3] else None] for b in index["blocks"]])
+
+    def _save_index(self):
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+
+        index = {
+            "version": INDEX_VERSION,
+            "byteorder": sys.byteorder,
+            "blocks": self._blocks,
+        }
+
+        # write to a temp file first so a crash never leaves a partial index behind
+        path = os.path.join(self._path, INDEX_FILE)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(json.dumps(index))
+        if os.path.exists(path):
+            os.unlink(path)
+        os.rename(path + ".tmp", path)
@@ -0,0 +1,62 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Sample rate detection for timestamped data.
+
+The rate of every point is worked out from the spacing to the next point in one vectorized pass.  Sub-second
+spacings become hertz rates and longer spacings become whole second rates.  The data is then split into runs where
+the rate changes.  A point in front of a gap or a rate change has an odd spacing, so runs shorter than min_run are
+folded into the run before them, which keeps a gap in the middle of a run from splitting it.
+"""
+
+import numpy as np
+
+from samplerate import SampleRate
+from point import NANOSECONDS_PER_SECOND
+
+DEFAULT_MIN_RUN = 8
+
+def detect_runs(timestamps, min_run=DEFAULT_MIN_RUN):
+    """
+    split a column of timestamps into runs with a constant sample rate.  returns a list of (SampleRate, first, last)
+    where first and last are the index of the first point in the run and one past the last point.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.uint64)
+    count = len(timestamps)
+    if count == 0:
+        return []
+    if count == 1:
+        raise ValueError("at least two points are needed to detect a sample rate")
+
+    # each point gets the rate of the spacing to the next point, the last point continues the rate before it
+    deltas = np.maximum(np.diff(timestamps).astype(np.int64), 1)
+    codes = np.where(deltas <= NANOSECONDS_PER_SECOND,
+                     np.rint(float(NANOSECONDS_PER_SECOND) / deltas),
+                     -np.rint(deltas / float(NANOSECONDS_PER_SECOND))).astype(np.int64)
+    codes = np.append(codes, codes[-1])
+
+    starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+    ends = np.append(starts[1:], count)
+
+    runs = []
+    for first, last in zip(starts.tolist(), ends.tolist()):
+        code = int(codes[first])
+        if runs and (last - first < min_run or runs[-1][0] == code):
+            runs[-1][2] = last
+        elif runs and runs[-1][2] - runs[-1][1] < min_run:
+            # a short run at the very start takes on the rate of the run after it
+            runs[-1] = [code, runs[-1][1], last]
+        else:
+            runs.append([code, first, last])
+
+    return [(_sample_rate(code), first, last) for code, first, last in runs]
+
+def _sample_rate(code):
+    if code > 0:
+        return SampleRate.hertz(code)
+    return SampleRate.seconds(-code)
@@ -0,0 +1,304 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Client side rate limiting and upload scheduling.
+
+A RateLimiter keeps a device under its quota.  It uses a token bucket for requests and another for request bytes,
+so the device is throttled before the server starts rejecting requests.  Requests that are waiting for tokens are
+served in priority order, so live data goes out before historical backfill.  When the server answers with a quota
+error or a 503 anyway, the limiter pauses with exponential backoff and lowers its rates.  The rates then recover a
+step at a time as requests succeed.
+
+An UploadScheduler runs upload jobs on a few worker threads, highest priority first.  It tags each job's requests
+with the job's priority.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import heapq
+import threading
+import itertools
+from contextlib import contextmanager
+
+# priorities, lower is served first
+LIVE = 0
+BACKFILL = 10
+
+_waited = threading.local()
+
+def wait_seconds():
+    """
+    total seconds the calling thread has spent waiting in RateLimiter.acquire, including the pauses after throttled
+    requests.  The difference across a request is the time it was held back rather than on the network.
+    """
+    return getattr(_waited, "seconds", 0.0)
+
+class TokenBucket(object):
+    """
+    token bucket that refills at rate tokens per second up to capacity.  A rate of None is unlimited.  A request for
+    more than the capacity is let through once the bucket is full, and the bucket goes into debt for the rest.
+    """
+
+    def __init__(self, rate, capacity=None, now=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.time() if now is None else now
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def set_rate(self, rate, now):
+        self._refill(now)
+        self.rate = rate
+
+    def wait_time(self, amount, now):
+        """
+        seconds until amount tokens can be taken
+        """
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity) - self._tokens
+        if needed <= 0:
+            return 0.0
+        return needed / float(self.rate)
+
+    def take(self, amount, now):
+        if self.rate is None:
+            return
+        self._refill(now)
+        self._tokens -= amount
+
+    def _refill(self, now):
+        if self.rate is not None and now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = max(self._updated, now)
+
+class RateLimiter(object):
+
+    def __init__(self, requests_per_second=None, bytes_per_second=None, burst_seconds=1.0, initial_backoff=1.0,
+                 max_backoff=60.0, decrease=0.5, recover=0.1, min_scale=0.1, max_retries=5):
+        """
+        requests_per_second, bytes_per_second - sustained rates, None for no limit
+        burst_seconds                         - the buckets hold this many seconds worth of tokens
+        initial_backoff, max_backoff          - pause after a throttled request, doubled for each one in a row
+        decrease, recover                     - the rates are multiplied by decrease when a request is throttled, and
+                                                go back up by recover (a fraction of the configured rate) per success
+        min_scale                             - the rates never drop below this fraction of the configured rates
+        max_retries                           - times a throttled request is resent before its error is returned
+        """
+        now = time.time()
+        self._rates = (requests_per_second, bytes_per_second)
+        self._requests = TokenBucket(requests_per_second,
+                                     None if requests_per_second is None else max(1, requests_per_second * burst_seconds),
+                                     now)
+        self._bytes = TokenBucket(bytes_per_second,
+                                  None if bytes_per_second is None else bytes_per_second * burst_seconds,
+                                  now)
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._decrease = decrease
+        self._recover = recover
+        self._min_scale = min_scale
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._local = threading.local()
+        self._scale = 1.0
+        self._throttled = 0
+        self._paused_until = 0.0
+
+    @property
+    def scale(self):
+        """ fraction of the configured rates that is currently allowed """
+        return self._scale
+
+    @property
+    def paused_until(self):
+        return self._paused_until
+
+    @contextmanager
+    def priority(self, priority):
+        """
+        requests made by this thread inside the with block wait for tokens with the given priority
+        """
+        previous = self.current_priority()
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self):
+        return getattr(self._local, "priority", LIVE)
+
+    def acquire(self, nbytes=0):
+        """
+        block until a request of nbytes can be sent.  Waiting requests are let through in priority order.
+        """
+        begin = time.time()
+        with self._cond:
+            ticket = (self.current_priority(), next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.time()
+                    if self._waiting[0] == ticket:
+                        wait = max(self._paused_until - now,
+                                   self._requests.wait_time(1, now),
+                                   self._bytes.wait_time(nbytes, now))
+                        if wait <= 0:
+                            self._requests.take(1, now)
+                            self._bytes.take(nbytes, now)
+                            return
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                _waited.seconds = wait_seconds() + time.time() - begin
+
+    def throttled(self, retry_after=None):
+        """
+        record a request that the server rejected with a quota error or a 503.  returns the seconds until requests
+        are let through again.
+        """
+        with self._cond:
+            now = time.time()
+            self._throttled += 1
+            pause = min(self._max_backoff, self._initial_backoff * 2 ** (self._throttled - 1))
+            if retry_after is not None:
+                pause = max(pause, retry_after)
+            self._paused_until = max(self._paused_until, now + pause)
+            self._set_scale(max(self._min_scale, self._scale * self._decrease), now)
+            self._cond.notify_all()
+        logger.info("request throttled, pausing for %0.1fs at %d%% of the rate limit", pause, self._scale * 100)
+        return pause
+
+    def success(self):
+        """
+        record a request that went through
+        """
+        with self._cond:
+            self._throttled = 0
+            if self._scale < 1.0:
+                self._set_scale(min(1.0, self._scale + self._recover), time.time())
+
+    def _set_scale(self, scale, now):
+        self._scale = scale
+        for bucket, rate in zip((self._requests, self._bytes), self._rates):
+            if rate is not None:
+                bucket.set_rate(rate * scale, now)
+
+class UploadJob(object):
+
+    def __init__(self, fn, args, kwargs):
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        wait for the job to finish and return its result.  If the job raised, the exception is raised here.
+        """
+        self._done.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _run(self):
+        try:
+            self._result = self._fn(*self._args, **self._kwargs)
+        except Exception as e:
+            logger.debug("upload job failed", exc_info=True)
+            self._error = e
+        finally:
+            self._done.set()
+
+class UploadScheduler(object):
+    """
+    runs upload jobs on worker threads, lowest priority value first and in submission order within a priority.
+    e.g.
+        scheduler = device.upload_scheduler()
+        scheduler.submit(channel.timeseries_append, BACKFILL, rate, history)
+        scheduler.submit(channel.timeseries_append, LIVE, rate, latest)
+    """
+
+    def __init__(self, limiter=None, workers=2, start=True):
+        self._limiter = limiter
+        self._cond = threading.Condition()
+        self._jobs = []
+        self._seq = itertools.count()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._worker) for _ in range(workers)]
+        for worker in self._workers:
+            worker.daemon = True
+        if start:
+            self.start()
+
+    def start(self):
+        for worker in self._workers:
+            if not worker.is_alive():
+                worker.start()
+
+    def submit(self, fn, priority=BACKFILL, *args, **kwargs):
+        """
+        queue fn(*args, **kwargs) to run with the given priority, returns an UploadJob
+        """
+        job = UploadJob(fn, args, kwargs)
+        with self._cond:
+            assert not self._closed, "scheduler is closed"
+            heapq.heappush(self._jobs, (priority, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def pending(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def close(self, wait=True):
+        """
+        stop accepting jobs.  The workers exit once the queued jobs are done.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                if worker.is_alive():
+                    worker.join()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                priority, _, job = heapq.heappop(self._jobs)
+
+            if self._limiter:
+                with self._limiter.priority(priority):
+                    job._run()
+            else:
+                job._run()
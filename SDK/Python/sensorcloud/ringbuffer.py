@@ -0,0 +1,211 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Fixed size buffers of the most recent points of each channel.
+
+A RingBuffer holds the last n points of a channel in two arrays that are allocated once, in the same typecodes as a
+PointBlock, so pushing points never allocates.  The buffers of a device are kept in a RingBufferPool that caps the
+points held by all of them together; once the cap is reached the buffer of the channel that was used least recently
+is dropped to make room.
+
+The buffers are filled from the points this process uploads and from downloads that reach the end of a channel's
+data, so they only know about points from other sources once those have been downloaded.  Values are held as they
+are stored on SensorCloud, without unit conversion.
+"""
+
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+
+from point import Point, PointBlock, TIMESTAMP_TYPECODE, VALUE_TYPECODE, XDR_POINT_SIZE, timestamp_array, is_timestamp_array
+
+class RingBuffer(object):
+
+    def __init__(self, capacity):
+        assert capacity > 0
+        self._capacity = int(capacity)
+        self._timestamps = timestamp_array([0]) * self._capacity
+        self._values = array(VALUE_TYPECODE, [0.0]) * self._capacity
+        # index of the oldest point and the number of points held
+        self._start = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def latest(self):
+        """
+        timestamp of the newest point, or None if the buffer is empty
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._timestamps[(self._start + self._count - 1) % self._capacity]
+
+    def __len__(self):
+        return self._count
+
+    def extend(self, data):
+        """
+        add a PointBlock or list of Points, in time order.  Points that aren't newer than the newest point in the buffer
+        are skipped.
+        """
+        block = PointBlock.from_points(data)
+        self.push(block.timestamps, block.values)
+
+    def push(self, timestamps, values):
+        """
+        add columns of timestamps and values, in time order
+        """
+        with self._lock:
+            first = 0
+            if self._count:
+                latest = self._timestamps[(self._start + self._count - 1) % self._capacity]
+                first = bisect.bisect_right(timestamps, latest)
+            # only the newest capacity points can stay in the buffer
+            first = max(first, len(timestamps) - self._capacity)
+            self._write(timestamps[first:], values[first:])
+
+    def reset(self, data):
+        """
+        replace the contents of the buffer with the newest points of a PointBlock or list of Points
+        """
+        block = PointBlock.from_points(data)
+        with self._lock:
+            self._start = 0
+            self._count = 0
+            first = max(0, len(block) - self._capacity)
+            self._write(block.timestamps[first:], block.values[first:])
+
+    def clear(self):
+        with self._lock:
+            self._start = 0
+            self._count = 0
+
+    def _write(self, timestamps, values):
+        count = len(timestamps)
+        if count == 0:
+            return
+        end = (self._start + self._count) % self._capacity
+        # at most two slices, up to the end of the arrays and then from the start
+        head = min(count, self._capacity - end)
+        self._timestamps[end:end + head] = _column(TIMESTAMP_TYPECODE, timestamps[:head])
+        self._values[end:end + head] = _column(VALUE_TYPECODE, values[:head])
+        if head < count:
+            self._timestamps[:count - head] = _column(TIMESTAMP_TYPECODE, timestamps[head:])
+            self._values[:count - head] = _column(VALUE_TYPECODE, values[head:])
+
+        overflow = max(0, self._count + count - self._capacity)
+        self._start = (self._start + overflow) % self._capacity
+        self._count = min(self._capacity, self._count + count)
+
+    def peek(self, n=1):
+        """
+        the nth newest Point, peek() is the newest.  None if the buffer doesn't hold that many points
+        """
+        with self._lock:
+            if n < 1 or n > self._count:
+                return None
+            i = (self._start + self._count - n) % self._capacity
+            return Point(self._timestamps[i], self._values[i])
+
+    def tail(self, n=None):
+        """
+        PointBlock of the newest n points, or of every point in the buffer if n is None.  If the buffer holds fewer
+        than n points the block has all of them.
+        """
+        with self._lock:
+            n = self._count if n is None else max(0, min(n, self._count))
+            first = (self._start + self._count - n) % self._capacity
+            if first + n <= self._capacity:
+                return PointBlock(self._timestamps[first:first + n], self._values[first:first + n])
+            wrap = first + n - self._capacity
+            return PointBlock(self._timestamps[first:] + self._timestamps[:wrap],
+                              self._values[first:] + self._values[:wrap])
+
+def _column(typecode, data):
+    if typecode == TIMESTAMP_TYPECODE:
+        return data if is_timestamp_array(data) else timestamp_array(data)
+    if isinstance(data, array) and data.typecode == typecode:
+        return data
+    return array(typecode, data)
+
+class RingBufferPool(object):
+    """
+    the RingBuffers of a device.  e.g.
+        device = Device(device_id, key, ring_buffers=RingBufferPool(points_per_channel=10000))
+        channel.timeseries_append(rate, block)
+        recent = channel.tail(100)
+    """
+
+    def __init__(self, points_per_channel=10000, max_points=1000000):
+        """
+        points_per_channel - size of the buffer of each channel
+        max_points         - cap on the points held by every buffer together
+        """
+        if points_per_channel > max_points:
+            raise ValueError("points_per_channel can't be more than max_points")
+        self._points_per_channel = int(points_per_channel)
+        self._max_points = int(max_points)
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def points_per_channel(self):
+        return self._points_per_channel
+
+    @property
+    def max_points(self):
+        return self._max_points
+
+    @property
+    def allocated_points(self):
+        with self._lock:
+            return len(self._buffers) * self._points_per_channel
+
+    @property
+    def allocated_bytes(self):
+        return self.allocated_points * XDR_POINT_SIZE
+
+    def get(self, key):
+        """
+        the buffer for key, or None if there isn't one
+        """
+        with self._lock:
+            ring = self._buffers.pop(key, None)
+            if ring is not None:
+                self._buffers[key] = ring
+            return ring
+
+    def buffer(self, key):
+        """
+        the buffer for key, allocating it if there isn't one.  The least recently used buffers are dropped if the new
+        buffer would go over max_points.
+        """
+        with self._lock:
+            ring = self._buffers.pop(key, None)
+            if ring is None:
+                while (len(self._buffers) + 1) * self._points_per_channel > self._max_points:
+                    self._buffers.popitem(last=False)
+                ring = RingBuffer(self._points_per_channel)
+            self._buffers[key] = ring
+            return ring
+
+    def discard(self, key):
+        with self._lock:
+            self._buffers.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._buffers
+
+    def __len__(self):
+        return len(self._buffers)
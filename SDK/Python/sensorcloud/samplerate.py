@@ -8,6 +8,10 @@ See file license.txt
 from datetime import timedelta
 import xdrlib
 
+from point import timestamp_array
+
+NANOSECONDS_PER_SECOND = 1000000000
+
 #samplerate types
 HERTZ = 1
 SECONDS = 0
@@ -15,24 +19,59 @@ SECONDS = 0
 SAMPLERATE_NAMES = {HERTZ:"hertz", SECONDS:"seconds"}
 
 class SampleRate(object):
+    """
+    SampleRates are immutable and interned, there is only ever one object for each rate.  They can be used as dict
+    keys, and the xdr encoding is only built once.
+    """
+
+    __slots__ = ["_rate_type", "_rate", "_xdr"]
+
+    _interned = {}
 
+    def __new__(cls, rate_type, rate):
+        key = (rate_type, int(rate))
+        instance = cls._interned.get(key)
+        if instance is None:
+            assert(rate_type in (HERTZ, SECONDS))
+            assert(rate >= 0)
 
-    def __init__(self, rate_type, rate):
-        assert(rate_type in (HERTZ, SECONDS))
-        assert(rate >= 0)
+            instance = object.__new__(cls)
+            instance._rate_type = rate_type
+            instance._rate = int(rate)
 
-        self._rate_type = rate_type
-        self._rate = rate
+            packer = xdrlib.Packer()
+            packer.pack_enum(rate_type)
+            packer.pack_int(instance._rate)
+            instance._xdr = packer.get_buffer()
 
+            cls._interned[key] = instance
+        return instance
+
+    def __reduce__(self):
+        return (SampleRate, (self._rate_type, self._rate))
+
+    @property
+    def rate_type(self):
+        return self._rate_type
+
+    @property
+    def rate(self):
+        return self._rate
 
     def __str__(self):
         return "%d %s"%(self._rate, SAMPLERATE_NAMES[self._rate_type])
 
+    def __repr__(self):
+        return "SampleRate.%s(%d)" % (SAMPLERATE_NAMES[self._rate_type], self._rate)
+
     def __eq__(self, other):
         if isinstance(other, SampleRate):
             return self._rate_type == other._rate_type and self._rate == other._rate
         return NotImplemented
 
+    def __hash__(self):
+        return hash((self._rate_type, self._rate))
+
     def __ne__(self, other):
         return not self == other
 
@@ -43,6 +82,75 @@ class SampleRate(object):
         else:
             return timedelta(seconds=self._rate)
 
+    def sample_offset(self, index):
+        """
+        exact offset in nanoseconds of sample number index from the first sample.  Offsets are always computed from
+        the first sample, so rounding never accumulates over a long run of samples.
+        """
+        if self._rate_type == HERTZ:
+            return index * NANOSECONDS_PER_SECOND // self._rate
+        return index * self._rate * NANOSECONDS_PER_SECOND
+
+    def timestamps(self, start, first, count):
+        """
+        timestamps in nanoseconds of samples first through first + count - 1 of a run that starts at start.  Returns
+        an array of unsigned 64 bit timestamps.  numpy is used to generate the column when it is available.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            return timestamp_array((start + self.sample_offset(i) for i in xrange(first, first + count)))
+
+        index = np.arange(first, first + count, dtype=np.uint64)
+        if self._rate_type == HERTZ:
+            # index * 1e9 could overflow 64 bits on very long runs, so split the index into whole seconds and the
+            # remaining samples.  Both parts are exact integers
+            seconds, remainder = np.divmod(index, np.uint64(self._rate))
+            offsets = seconds * np.uint64(NANOSECONDS_PER_SECOND) + \
+                      remainder * np.uint64(NANOSECONDS_PER_SECOND) // np.uint64(self._rate)
+        else:
+            offsets = index * np.uint64(self._rate * NANOSECONDS_PER_SECOND)
+
+        timestamps = timestamp_array()
+        timestamps.fromstring((offsets + np.uint64(start)).astype("=u8").tostring())
+        return timestamps
+
+    def interval_index(self, timestamp):
+        """
+        number of the sample interval that timestamp falls in, counting from the unix epoch.  Interval k starts at
+        sample_offset(k), so the intervals line up with the timestamps of a run that starts at 0.
+        """
+        if self._rate_type == HERTZ:
+            return ((timestamp + 1) * self._rate + NANOSECONDS_PER_SECOND - 1) // NANOSECONDS_PER_SECOND - 1
+        return timestamp // (self._rate * NANOSECONDS_PER_SECOND)
+
+    def interval_indexes(self, timestamps):
+        """
+        interval_index of each timestamp in a numpy array of unsigned 64 bit timestamps, without overflowing 64 bits
+        """
+        import numpy as np
+
+        timestamps = np.asarray(timestamps, dtype=np.uint64)
+        if self._rate_type == HERTZ:
+            rate = np.uint64(self._rate)
+            second = np.uint64(NANOSECONDS_PER_SECOND)
+            seconds, nanoseconds = np.divmod(timestamps + np.uint64(1), second)
+            return seconds * rate + (nanoseconds * rate + second - np.uint64(1)) // second - np.uint64(1)
+        return timestamps // np.uint64(self._rate * NANOSECONDS_PER_SECOND)
+
+    def interval_starts(self, indexes):
+        """
+        start timestamps of a numpy array of interval numbers, the inverse of interval_indexes
+        """
+        import numpy as np
+
+        indexes = np.asarray(indexes, dtype=np.uint64)
+        if self._rate_type == HERTZ:
+            seconds, remainder = np.divmod(indexes, np.uint64(self._rate))
+            return seconds * np.uint64(NANOSECONDS_PER_SECOND) + \
+                   remainder * np.uint64(NANOSECONDS_PER_SECOND) // np.uint64(self._rate)
+        return indexes * np.uint64(self._rate * NANOSECONDS_PER_SECOND)
+
     @classmethod
     def hertz(cls, rate):
         return SampleRate(HERTZ, rate)
@@ -51,8 +159,18 @@ class SampleRate(object):
     def seconds(cls, rate):
         return SampleRate(SECONDS, rate)
 
+    def to_param(self):
+        """ sample rate in the form used by url parameters, e.g. hertz-23 or seconds-100 """
+        return "%s-%d" % (SAMPLERATE_NAMES[self._rate_type], self._rate)
+
+    @classmethod
+    def from_string(cls, text):
+        """ parse the str() form of a sample rate, e.g. "10 hertz" """
+        rate, name = text.split()
+        for rate_type, rate_name in SAMPLERATE_NAMES.items():
+            if rate_name == name:
+                return SampleRate(rate_type, int(rate))
+        raise ValueError("unknown sample rate type: %s" % name)
+
     def to_xdr(self):
-        packer = xdrlib.Packer()
-        packer.pack_enum(self._rate_type)
-        packer.pack_int(self._rate)
-        return packer.get_buffer()
+        return self._xdr
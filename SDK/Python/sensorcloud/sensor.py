@@ -12,7 +12,7 @@ import xdrlib
 import httplib
 import json
 
-from channel import Channel
+from channel import Channel, unpack_channel_info
 from error import *
 
 
@@ -48,9 +48,12 @@ class Sensor(object):
         self._channels = {}
         self._cache = cache
 
-        if cache:
-            for channelCache in cache.channels:
-                self._channels[channelCache.name] = Channel(self, channelCache.name, channelCache)
+        self._type = None
+        self._label = None
+        self._description = None
+
+        #True if the sensor is known to exist, False if it's known not to, None if it hasn't been checked
+        self._exists = None
 
     def url(self, url_path):
         """
@@ -81,32 +84,112 @@ class Sensor(object):
         return self._sensor_id
 
 
+    @property
+    def type(self):
+        """ type of the sensor, None until it's been read by Device.all_sensors """
+        return self._type
+
+    @property
+    def label(self):
+        """ label of the sensor, None until it's been read by Device.all_sensors """
+        return self._label
+
+    @property
+    def description(self):
+        """ description of the sensor, None until it's been read by Device.all_sensors """
+        return self._description
+
     def channels(self):
         """
-        return all channels
+        return all channels.  The channel list is downloaded in a single request and the stream info for each
+        channel is kept, so it doesn't need to be requested for each channel.
+        """
+
+        response = self.url_without_create("/channels/")\
+                       .param("version", "1")\
+                       .accept("application/xdr")\
+                       .header("Accept-Encoding", "gzip")\
+                       .get()
+
+        if response.status_code != httplib.OK:
+            raise error(response, "get channels")
+
+        unpacker = xdrlib.Unpacker(response.raw)
+
+        datastructure_version = unpacker.unpack_int()
+        assert datastructure_version == 1, "structure version should always be 1"
+
+        return self._prime_channels([unpack_channel_info(unpacker) for _ in range(unpacker.unpack_uint())])
+
+    def _prime(self, sensor_type, label, description, channel_infos):
+        """
+        called internally with the info from a sensor listing
         """
-        pass
+        self._type = sensor_type
+        self._label = label
+        self._description = description
+        return self._prime_channels(channel_infos)
+
+    def _prime_channels(self, channel_infos):
+        self._mark_exists()
+
+        channels = []
+        for info in channel_infos:
+            channel = self.channel(info.name)
+            channel._prime(info)
+            channels.append(channel)
+
+        #the listing is complete, so any other channel we know about doesn't exist anymore
+        listed = set(info.name for info in channel_infos)
+        for name, channel in self._channels.items():
+            if name not in listed:
+                channel._exists = False
+
+        return channels
+
+    def _known_to_exist(self):
+        return bool(self._exists or (self._exists is None and self._cache and self._cache.known))
+
+    def _mark_exists(self):
+        self._exists = True
+        if self._cache:
+            self._cache.mark_known()
 
     def __contains__(self, channel_name):
         """
-        check if a channel exits for this device on SensorCloud
+        check if a channel exits for this device on SensorCloud.  Channels that are already known to exist, from
+        an earlier check, a listing or the cache, aren't checked again.
         """
 
+        channel = self.channel(channel_name)
+        if channel._known_to_exist():
+            return True
+
         response = self.url("/channels/%s/attributes/"%channel_name)\
                                 .param("version", "1")\
                                 .accept("application/xdr").get()
 
-        if response.status_code == httplib.OK: return True
+        if response.status_code == httplib.OK:
+            channel._mark_exists()
+            return True
         if response.status_code == httplib.NOT_FOUND: return False
 
         raise error(response, "channel contains")
 
 
     def channel(self, channel_name):
-        cache = None
-        if self._cache:
-            cache = self._cache.channel(channel_name)
-        return Channel(self, channel_name, cache)
+        channel = self._channels.get(channel_name)
+        if not channel:
+            cache = None
+            if self._cache:
+                cache = self._cache.channel(channel_name)
+            channel = Channel(self, channel_name, cache)
+            self._channels[channel_name] = channel
+        return channel
+
+    def __iter__(self):
+        for channel in self.channels():
+            yield channel
 
     def __getitem__(self, channel_name):
         return self.channel(channel_name)
@@ -131,7 +214,9 @@ class Sensor(object):
         if response.status_code != httplib.CREATED:
             raise error(response, "add channel")
 
-        return self.channel(channel_name)
+        channel = self.channel(channel_name)
+        channel._mark_exists()
+        return channel
 
     def delete(self):
         raise NotImplemented()
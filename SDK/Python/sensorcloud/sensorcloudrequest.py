@@ -14,6 +14,22 @@ import xdrlib
 
 from error import *
 
+def _throttled(response):
+    """
+    True if the server rejected the request because the device is over its quota or the server is overloaded
+    """
+    if response.status_code == httplib.SERVICE_UNAVAILABLE:
+        return True
+    if response.status_code in (httplib.UNAUTHORIZED, httplib.FORBIDDEN) and response.scerror:
+        return response.scerror.code in ("401-005", "403-004")
+    return False
+
+def _retry_after(response):
+    try:
+        return float(response.response_headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
 class SensorCloudRequests:
     """
     SensorCloudRequest allows a user to make http request to a SensorCloud Server.
@@ -22,17 +38,26 @@ class SensorCloudRequests:
 
     @property
     def authToken(self):
+        #the token from the cache isn't read until it's needed, so creating a device doesn't load the cache
+        if self._authToken is None and self._cache:
+            self._authToken = self._cache.token
         return self._authToken
 
     @property
     def apiServer(self):
+        if self._apiServer is None and self._cache:
+            self._apiServer = self._cache.server
         return self._apiServer
 
     @property
     def deviceId(self):
         return self._deviceId
 
-    def __init__(self, deviceId, deviceKey, authServer, requests = None, cache = None):
+    @property
+    def limiter(self):
+        return self._limiter
+
+    def __init__(self, deviceId, deviceKey, authServer, requests = None, cache = None, limiter = None):
 
         assert authServer.startswith("http://") or authServer.startswith("https://")
 
@@ -50,6 +75,7 @@ class SensorCloudRequests:
         self._apiServer = None
 
         self._cache = cache
+        self._limiter = limiter
 
     def authenticate(self, os_version=None, local_ip=None):
         from sensorcloud import UserAgent
@@ -93,7 +119,6 @@ class SensorCloudRequests:
             self.scerror = None
 
         def doRequest(self, method, url, options):
-            from sensorcloud import UserAgent
             from sensorcloud import Reauthenticate
 
             requests = self._requests
@@ -102,29 +127,53 @@ class SensorCloudRequests:
             if not requests.authToken:
                 requests.authenticate()
 
-            full_url = requests.apiServer + "/SensorCloud/devices/" + requests.deviceId + url
-
-            options.addParam("auth_token", requests.authToken)
-            options.addHeader("User-Agent", UserAgent)
-
-            response = webrequest.Requests.RequestBuilder.doRequest(self, method, full_url, options)
-            response = SensorCloudRequests.Request(response)
+            response = self._send(method, url, options)
 
             #if we get an authentication error, reatuheticate, update the authToken and try to make the request again
-            if response.status_code == httplib.UNAUTHORIZED:
+            if response.status_code == httplib.UNAUTHORIZED and not _throttled(response):
                 if Reauthenticate:
                     logger.info("Authentication Error, reathenticating...")
                     requests.authenticate()
+                    response = self._send(method, url, options)
 
-                    full_url = requests.apiServer + "/SensorCloud/devices/" + requests.deviceId + url
-
-                    options.addParam("auth_token", requests.authToken)
-                    options.addHeader("User-Agent", UserAgent)
+            return response
 
-                    response = webrequest.Requests.RequestBuilder.doRequest(self, method, full_url, options)
-                    response = SensorCloudRequests.Request(response)
+        def _send(self, method, url, options):
+            """
+            send the request, waiting on the device's rate limiter first if it has one.  Requests that are rejected
+            for quota or with a 503 are resent after the limiter's backoff, up to its max_retries.
+            """
+            from sensorcloud import UserAgent
 
-            return response
+            requests = self._requests
+            limiter = requests.limiter
+
+            attempt = 0
+            while True:
+                if limiter:
+                    limiter.acquire(options.bodySize)
+
+                full_url = requests.apiServer + "/SensorCloud/devices/" + requests.deviceId + url
+
+                options.addParam("auth_token", requests.authToken)
+                options.addHeader("User-Agent", UserAgent)
+
+                response = webrequest.Requests.RequestBuilder.doRequest(self, method, full_url, options)
+                response = SensorCloudRequests.Request(response)
+
+                if not limiter:
+                    return response
+                if not _throttled(response):
+                    if response.status_code < 400:
+                        limiter.success()
+                    return response
+                if attempt >= limiter.max_retries:
+                    limiter.throttled(_retry_after(response))
+                    return response
+
+                attempt += 1
+                pause = limiter.throttled(_retry_after(response))
+                logger.info("%s %s throttled (%s), retrying in %0.1fs", method, url, response.status_code, pause)
 
         def _process(self, request, processors):
             if not isinstance(request, SensorCloudRequests.Request):
@@ -0,0 +1,217 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Compact on disk spool for timeseries data that's waiting to be uploaded.
+
+A spooled block stores its timestamps as delta-of-deltas and its values as the xor of each float32 with the one
+before it, the same ideas as Facebook's Gorilla format.  Gorilla packs those into a variable number of bits, which
+needs a loop over the points.  Here the columns are split into byte planes instead, all the first bytes then all the
+second bytes and so on, and the planes are zlib compressed.  Regular timestamps have a delta-of-delta of 0 and a
+slowly changing value only changes its low bytes, so most planes are runs of zeros that compress to almost nothing.
+Every step is a vectorized numpy operation, and a block decodes straight to the xdr records of an upload.
+
+Block layout, xdr encoded:
+    string  magic "SCSP"
+    int     version
+    string  sensor name
+    string  channel name
+    opaque  sample rate[8]
+    uint    point count
+    uhyper  first timestamp
+    opaque  compressed timestamp planes<>
+    opaque  compressed value planes<>
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import zlib
+import xdrlib
+from collections import namedtuple
+
+import numpy as np
+
+from point import PointBlock, xdr_records
+from samplerate import SampleRate
+
+MAGIC = "SCSP"
+VERSION = 1
+EXTENSION = ".scsp"
+
+SpooledBlock = namedtuple("SpooledBlock", ["sensor", "channel", "sample_rate", "block"])
+
+def _planes(column, width):
+    """
+    bytes of a column of little endian integers, grouped by byte position
+    """
+    return column.view(np.uint8).reshape(len(column), width).T.tostring()
+
+def _from_planes(data, dtype, count):
+    width = np.dtype(dtype).itemsize
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(width, count)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(count)
+
+def encode_timestamps(timestamps):
+    """
+    byte planes of the zigzag encoded delta-of-deltas of a column of timestamps, after the first timestamp
+    """
+    timestamps = np.asarray(timestamps, dtype=np.uint64)
+    deltas = np.diff(timestamps).view(np.int64)
+    dod = np.diff(deltas, prepend=0)
+    zigzag = (dod << 1) ^ (dod >> 63)
+    return _planes(zigzag.astype("<i8").view("<u8"), 8)
+
+def decode_timestamps(first, data, count):
+    if count == 0:
+        return np.empty(0, dtype=np.uint64)
+    zigzag = _from_planes(data, "<u8", count - 1).astype(np.uint64)
+    dod = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+    deltas = np.cumsum(dod)
+    offsets = np.concatenate(([0], np.cumsum(deltas))).view(np.uint64)
+    return offsets + np.uint64(first)
+
+def encode_values(values):
+    """
+    byte planes of each float32 value xor'd with the value before it
+    """
+    bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+    xor = bits ^ np.concatenate(([0], bits[:-1])).astype(np.uint32)
+    return _planes(xor.astype("<u4"), 4)
+
+def decode_values(data, count):
+    xor = _from_planes(data, "<u4", count).astype(np.uint32)
+    return np.bitwise_xor.accumulate(xor).view(np.float32)
+
+def encode_block(sensor, channel, sample_rate, block, level=6):
+    """
+    encode a PointBlock, or a list of Points, for the spool
+    """
+    timestamps, values = PointBlock.from_points(block).to_numpy()
+
+    packer = xdrlib.Packer()
+    packer.pack_string(MAGIC)
+    packer.pack_int(VERSION)
+    packer.pack_string(sensor)
+    packer.pack_string(channel)
+    packer.pack_fopaque(8, sample_rate.to_xdr())
+    packer.pack_uint(len(timestamps))
+    packer.pack_uhyper(int(timestamps[0]) if len(timestamps) else 0)
+    packer.pack_opaque(zlib.compress(encode_timestamps(timestamps), level))
+    packer.pack_opaque(zlib.compress(encode_values(values), level))
+    return packer.get_buffer()
+
+def _decode_columns(data):
+    unpacker = xdrlib.Unpacker(data)
+    if unpacker.unpack_string() != MAGIC:
+        raise ValueError("not a spooled block")
+    version = unpacker.unpack_int()
+    if version != VERSION:
+        raise ValueError("unsupported spool version %d" % version)
+    sensor = unpacker.unpack_string()
+    channel = unpacker.unpack_string()
+    sample_rate_unpacker = xdrlib.Unpacker(unpacker.unpack_fopaque(8))
+    sample_rate = SampleRate(sample_rate_unpacker.unpack_enum(), sample_rate_unpacker.unpack_int())
+    count = unpacker.unpack_uint()
+    first = unpacker.unpack_uhyper()
+    timestamps = decode_timestamps(first, zlib.decompress(unpacker.unpack_opaque()), count)
+    values = decode_values(zlib.decompress(unpacker.unpack_opaque()), count)
+    return sensor, channel, sample_rate, timestamps, values
+
+def decode_block(data):
+    """
+    decode a spooled block into a SpooledBlock
+    """
+    sensor, channel, sample_rate, timestamps, values = _decode_columns(data)
+    return SpooledBlock(sensor, channel, sample_rate, PointBlock(timestamps, values))
+
+def transcode_to_xdr(data):
+    """
+    decode a spooled block straight to the xdr records of an upload.  returns a SpooledBlock with the xdr blob as
+    the block, ready for Channel.timeseries_append_blob
+    """
+    sensor, channel, sample_rate, timestamps, values = _decode_columns(data)
+    return SpooledBlock(sensor, channel, sample_rate, xdr_records(timestamps, values))
+
+class Spool(object):
+    """
+    a directory of spooled blocks.  Blocks are drained in the order they were added.  e.g.
+        spool = Spool("/var/spool/sensorcloud")
+        spool.append("sensor", "channel", SampleRate.hertz(100), block)
+        ...
+        spool.drain(device)
+    """
+
+    def __init__(self, directory, level=6):
+        self._directory = directory
+        self._level = level
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._next = max([self._sequence(name) for name in self._names()] + [0]) + 1
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def append(self, sensor, channel, sample_rate, block):
+        """
+        spool a block of points.  The block is written to a temporary file first, so a crash never leaves a
+        partial block behind.
+        """
+        if len(block) == 0:
+            return None
+        data = encode_block(sensor, channel, sample_rate, block, self._level)
+        path = os.path.join(self._directory, "%012d%s" % (self._next, EXTENSION))
+        self._next += 1
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.rename(path + ".tmp", path)
+        return path
+
+    def pending(self):
+        """
+        paths of the spooled blocks, oldest first
+        """
+        return [os.path.join(self._directory, name) for name in self._names()]
+
+    def size(self):
+        """
+        bytes used by the spooled blocks
+        """
+        return sum(os.path.getsize(path) for path in self.pending())
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return decode_block(f.read())
+
+    def drain(self, device, limit=None):
+        """
+        upload the spooled blocks to device, oldest first, and delete each one once it's uploaded.  If an upload fails
+        the error is raised and that block and the ones after it stay in the spool.  returns the number of blocks that
+        were uploaded.
+        """
+        drained = 0
+        for path in self.pending():
+            if limit is not None and drained >= limit:
+                break
+            with open(path, "rb") as f:
+                sensor, channel, sample_rate, blob = transcode_to_xdr(f.read())
+            device.sensor(sensor).channel(channel).timeseries_append_blob(sample_rate, blob)
+            os.remove(path)
+            drained += 1
+            logger.debug("drained %s, %d points", path, len(blob) // 12)
+        return drained
+
+    def _names(self):
+        return sorted(name for name in os.listdir(self._directory) if name.endswith(EXTENSION))
+
+    def _sequence(self, name):
+        try:
+            return int(name[:-len(EXTENSION)])
+        except ValueError:
+            return 0
@@ -3,16 +3,176 @@ import logging
 logger = logging.getLogger(__name__)
 
 from datetime import datetime
+from collections import namedtuple
 import httplib
 import xdrlib
+import bisect
+from array import array
 import warnings
 
 from util import nanosecond_to_timestamp, timestamp_to_nanosecond
-from point import Point
+from point import PointBlock, XDR_POINT_SIZE, VALUE_TYPECODE
+from samplerate import SampleRate
+from partition import TimeSeriesKey
+from pipeline import Pipeline
 from error import *
 
+# with showSampleRateBoundary a boundary record is a zero timestamp followed by the sample rate type and rate
+BOUNDARY_RECORD_SIZE = 16
+BOUNDARY_MARKER = "\0" * 8
+
 def descriptor(sample_rate):
-    return str(sample_rate)
+    """ cache file descriptor of a timeseries partition, see partition.TimeSeriesKey """
+    return TimeSeriesKey(sample_rate).descriptor
+
+class Segment(namedtuple("Segment", ["sample_rate", "start", "values"])):
+    """
+    evenly spaced run of data.  Value i was sampled at start + sample_rate.sample_offset(i), so the timestamps
+    don't need to be stored.
+    """
+
+    @property
+    def end(self):
+        return self.start + self.sample_rate.sample_offset(len(self.values) - 1)
+
+    @property
+    def timestamps(self):
+        return self.sample_rate.timestamps(self.start, 0, len(self.values))
+
+    def follows(self, other):
+        """ true if this segment continues right where other leaves off """
+        return self.sample_rate == other.sample_rate and \
+               self.start == other.start + self.sample_rate.sample_offset(len(other.values))
+
+    def to_block(self):
+        return PointBlock(self.timestamps, self.values)
+
+class UnitConversion(object):
+    """
+    converts values from the stored unit to the preferred unit with each unit's slope and offset.  A unit applies from
+    its timestamp up to the timestamp of the next unit, values before the first unit aren't converted.
+    """
+
+    def __init__(self, units):
+        units = sorted(units, key=lambda u: u.timestamp)
+        self._timestamps = [u.timestamp for u in units]
+        self._slopes = [u.slope for u in units]
+        self._offsets = [u.ofset for u in units]
+        self._columns = None
+
+    @property
+    def identity(self):
+        """ true if the conversion doesn't change any values """
+        return all(slope == 1.0 and offset == 0.0 for slope, offset in zip(self._slopes, self._offsets))
+
+    def convert(self, block):
+        """
+        convert the values of a PointBlock.  The timestamps are shared with the original block.
+        """
+        if self.identity or len(block) == 0:
+            return block
+
+        try:
+            import numpy as np
+        except ImportError:
+            return self._convertSlices(block)
+
+        if self._columns is None:
+            #the extra identity entry at the end is picked up by index -1, for timestamps before the first unit
+            self._columns = (np.array(self._timestamps, dtype=np.uint64),
+                             np.array(self._slopes + [1.0], dtype=np.float32),
+                             np.array(self._offsets + [0.0], dtype=np.float32))
+        unitTimestamps, slopes, offsets = self._columns
+
+        timestamps, values = block.to_numpy()
+        index = np.searchsorted(unitTimestamps, timestamps, side="right") - 1
+        return PointBlock(block.timestamps, values * slopes[index] + offsets[index])
+
+    def _convertSlices(self, block):
+        #without numpy the block is split where the unit changes and each slice is converted on its own
+        values = array(VALUE_TYPECODE)
+        bounds = [bisect.bisect_left(block.timestamps, t) for t in self._timestamps] + [len(block)]
+        values.extend(block.values[:bounds[0]])
+        for i in range(len(self._timestamps)):
+            slope, offset = self._slopes[i], self._offsets[i]
+            values.extend(v * slope + offset for v in block.values[bounds[i]:bounds[i + 1]])
+        return PointBlock(block.timestamps, values)
+
+def split_boundaries(data, sample_rate=None):
+    """
+    split data downloaded with showSampleRateBoundary into a list of (sample_rate, PointBlock) runs.  sample_rate is
+    the rate in effect at the start of the data, for when a page of data doesn't start with a boundary.
+    """
+    runs = []
+    pos = 0
+    while pos < len(data):
+        if data[pos:pos + 8] == BOUNDARY_MARKER:
+            unpacker = xdrlib.Unpacker(data[pos + 8:pos + BOUNDARY_RECORD_SIZE])
+            sample_rate = SampleRate(unpacker.unpack_enum(), unpacker.unpack_int())
+            pos += BOUNDARY_RECORD_SIZE
+            continue
+
+        end = _next_boundary(data, pos)
+        runs.append((sample_rate, PointBlock.from_xdr(data[pos:end])))
+        pos = end
+    return runs
+
+def _next_boundary(data, pos):
+    """
+    offset of the first boundary record after the run of points that starts at pos, or the end of the data
+    """
+    search = pos
+    while True:
+        found = data.find(BOUNDARY_MARKER, search)
+        if found < 0:
+            return len(data)
+        #zero bytes inside of a point don't count, a boundary has to line up with the start of a point
+        if (found - pos) % XDR_POINT_SIZE == 0:
+            return found
+        search = found + 1
+
+def regular_segments(sample_rate, block):
+    """
+    split a block of points into Segments where the timestamps are exactly on the grid defined by the sample rate
+    """
+    segments = []
+    timestamps = block.timestamps
+    first = 0
+    while first < len(block):
+        last = first + _regular_length(sample_rate, timestamps, first)
+        segments.append(Segment(sample_rate, timestamps[first], block.values[first:last]))
+        first = last
+    return segments
+
+def _regular_length(sample_rate, timestamps, first):
+    """
+    number of points starting at first that are evenly spaced.  The timestamps are compared a window at a time and
+    the window grows while the points are regular, so long runs are checked with a few large array comparisons.
+    """
+    start = timestamps[first]
+    if first + 1 < len(timestamps) and timestamps[first + 1] != start + sample_rate.sample_offset(1):
+        #irregular data, checked point by point without building arrays
+        return 1
+
+    length = 1
+    window = 16
+    while first + length < len(timestamps):
+        count = min(window, len(timestamps) - first - length)
+        expected = sample_rate.timestamps(start, length, count)
+        actual = timestamps[first + length:first + length + count]
+        if expected == actual:
+            length += count
+            window *= 2
+            continue
+
+        #binary search for the first point that is off the grid
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if expected[:mid] == actual[:mid]: lo = mid
+            else: hi = mid - 1
+        return length + lo
+    return length
 
 class TimeSeriesStream(object):
 
@@ -69,26 +229,196 @@ class TimeSeriesStream(object):
         return self.endTimestamp
 
     def  __iter__(self):
-
-        currentTimestamp = self._startTimestampNanoseconds
-        while currentTimestamp <= self._endTimestampNanoseconds:
-
-            data = self._downloadData(currentTimestamp, self._endTimestampNanoseconds)
-            for p in data:
+        for block in self.blocks():
+            for p in block:
                 yield p
 
-            #data is empty, then we,ve exaughstestd all the data in the range, if it's not
+    def blocks(self):
+        """
+        iterate over the range a page at a time.  Each page is a PointBlock, so no per-point objects are created.
+        """
+
+        rangeCache = self._channel._range_cache(self._sampleRate)
+        if rangeCache is not None:
+            #the cache always holds the values as they're stored on SensorCloud, conversion happens on the way out
+            blocks = self._iterCached(rangeCache)
+        else:
+            blocks = self._iterRange(self._startTimestampNanoseconds, self._endTimestampNanoseconds)
+
+        #only a download of every sample rate has the channel's newest points at its end
+        ring = self._channel._ring_buffer(create=True) if self._sampleRate is None else None
+        if ring is not None:
+            blocks = self._fillRing(ring, blocks)
+
+        conversion = self._unitConversion()
+        if conversion is not None:
+            return (conversion.convert(block) for block in blocks)
+        return blocks
+
+    def to_block(self):
+        """
+        download the whole range into a single PointBlock
+        """
+        return PointBlock.concat(self.blocks())
+
+    def _fillRing(self, ring, blocks):
+        """
+        pass the blocks through, and once they run out put the last points in the ring buffer if the range reached the
+        end of the channel's data
+        """
+        recent = []
+        held = 0
+        for block in blocks:
+            yield block
+            recent.append(block)
+            held += len(block)
+            while held - len(recent[0]) >= ring.capacity:
+                held -= len(recent.pop(0))
+
+        if held and self._endTimestampNanoseconds >= self._channel.last_timeseries_timestamp():
+            tail = PointBlock.concat(recent)
+            latest = ring.latest
+            if latest is None or tail.last_timestamp >= latest:
+                ring.reset(tail)
+
+    def _iterRange(self, start, end):
+
+        currentTimestamp = start
+        while currentTimestamp <= end:
+
+            block = self._downloadBlock(currentTimestamp, end)
+
+            #block is empty, then we,ve exaughstestd all the data in the range, if it's not
             # then update the current timestamp
-            if len(data) > 0:
-                currentTimestamp = data[-1].timestamp_nanoseconds + 1
+            if len(block) == 0:
+                break
+
+            yield block
+            currentTimestamp = block.last_timestamp + 1
+
+    def _iterCached(self, rangeCache):
+        """
+        iterate over the range using the range cache.  Only the gaps that aren't in the cache are downloaded.
+        """
+
+        start = self._startTimestampNanoseconds
+        end = self._endTimestampNanoseconds
+
+        #only the immutable part of the range can be cached
+        immutableEnd = min(end, self._immutableEnd())
+        if immutableEnd >= start:
+            for segmentStart, segmentEnd, cached in rangeCache.segments(start, immutableEnd):
+                if cached:
+                    for timestamps, values in rangeCache.iter_read(segmentStart, segmentEnd):
+                        yield PointBlock(timestamps, values)
+                    continue
+
+                currentTimestamp = segmentStart
+                while currentTimestamp <= segmentEnd:
+                    block = self._downloadBlock(currentTimestamp, segmentEnd)
+
+                    #an empty page means there is no more data in the segment
+                    pageEnd = block.last_timestamp if len(block) > 0 else segmentEnd
+                    rangeCache.store(currentTimestamp, pageEnd, block.timestamps, block.values)
+
+                    if len(block) == 0:
+                        break
+
+                    yield block
+                    currentTimestamp = pageEnd + 1
+
+            start = immutableEnd + 1
+
+        for block in self._iterRange(start, end):
+            yield block
+
+    def segments(self):
+        """
+        iterate over the range as Segments of evenly spaced data, (sample_rate, start, values).  A new segment starts
+        wherever the sample rate changes or the spacing of the points doesn't match the sample rate, e.g. after a gap
+        in the data.  Regular data is held as a start time and a column of values, without a timestamp for every point.
+        """
+        pending = None
+        for sample_rate, block in self._rateBlocks():
+            for segment in regular_segments(sample_rate, block):
+                if pending is not None and segment.follows(pending):
+                    pending.values.extend(segment.values)
+                    continue
+                if pending is not None:
+                    yield pending
+                pending = segment
+
+        if pending is not None:
+            yield pending
+
+    def pipe(self, stage):
+        """
+        a Pipeline that passes the range through stage a page at a time, e.g.
+            channel.timeseries_data(start, end).pipe(Biquad.notch(60, 1000)).to_channel(filtered)
+        see pipeline.Pipeline
+        """
+        return Pipeline(self._rateBlocks, [stage])
+
+    def _rateBlocks(self):
+        """
+        iterate over the range as (sample_rate, PointBlock) pairs
+        """
+        if self._sampleRate is not None:
+            #the server only sends data for the one sample rate, so the blocks can come from the range cache
+            for block in self.blocks():
+                yield self._sampleRate, block
+            return
+
+        conversion = self._unitConversion()
+        sampleRate = None
+        currentTimestamp = self._startTimestampNanoseconds
+        end = self._endTimestampNanoseconds
+        while currentTimestamp <= end:
 
-            else:
+            runs = split_boundaries(self._download(currentTimestamp, end, showSampleRateBoundary=True), sampleRate)
+            runs = [(rate, block) for rate, block in runs if len(block) > 0]
+            if not runs:
                 break
 
-    def range(self, start, end):
-        return TimeSeriesStream(self._channel, start, end, self._samplerate, self._convertToUnits)
+            for sampleRate, block in runs:
+                if sampleRate is None:
+                    raise Error("timeseries data is missing a sample rate boundary")
+                yield sampleRate, conversion.convert(block) if conversion is not None else block
+            currentTimestamp = runs[-1][1].last_timestamp + 1
+
+    def _unitConversion(self):
+        """
+        the conversion for the channel's units, or None if the values don't need to be converted
+        """
+        if not self._convertToUnits:
+            return None
+        conversion = UnitConversion(self._channel.units)
+        return None if conversion.identity else conversion
 
-    def _downloadData(self, start, end):
+    def range(self, start, end):
+        return TimeSeriesStream(self._channel, start, end, self._sampleRate, self._convertToUnits)
+
+    def _immutableEnd(self):
+        """
+        timestamp that the data of the stream can't change at or before.  Data at or before the end of a partition is
+        immutable.  A stream of every sample rate holds the data of all the partitions, and an upload to any of them
+        adds data after its end, so only the data before the end of every partition is immutable.  -1 if there's none
+        """
+        if self._sampleRate is None:
+            ends = [p['end_time'] for _, p in self._channel._get_timeseries_partitions().find()]
+            return min(ends) if ends else -1
+        return self._channel.last_timeseries_timestamp(self._sampleRate)
+
+    def _downloadBlock(self, start, end):
+        """
+        download a single page of data as a PointBlock with the values as they are stored on SensorCloud
+        """
+        return PointBlock.from_xdr(self._download(start, end))
+
+    def _download(self, start, end, showSampleRateBoundary=False):
+        """
+        download a single page of raw xdr data
+        """
         start = int(start)
         end = int(end)
 
@@ -99,49 +429,27 @@ class TimeSeriesStream(object):
         #        showSampleRateBoundary (oiptional)
         #        samplerate (oiptional)
 
-        response = self._channel.url_without_create("/streams/timeseries/data/")\
-                                  .param("version", "1")\
-                                  .param("starttime", start)\
-                                  .param("endtime", end)\
-                                  .accept("application/xdr")\
-                                  .get()
+        request = self._channel.url_without_create("/streams/timeseries/data/")\
+                                 .param("version", "1")\
+                                 .param("starttime", start)\
+                                 .param("endtime", end)\
+                                 .accept("application/xdr")
+
+        if self._sampleRate is not None:
+            request = request.param("specificsamplerate", self._sampleRate.to_param())
+        if showSampleRateBoundary:
+            request = request.param("showSampleRateBoundary", "true")
+
+        response = request.get()
 
         # check the response code for success
         if response.status_code == httplib.NOT_FOUND:
             #404 is an empty list
-            return []
+            return ""
 
         elif response.status_code != httplib.OK:
             #all other errors are exceptions
             raise error(response, "download timeseris data")
 
-
-        #packer for the units xdr format
-        xdrdata = xdrlib.Unpacker(response.raw)
-
-        datapoints = []
-        try:
-            # timeseries/data always returns a relativly small chunk of data less than 50,000 points so we can proccess it all at once.  We won't be given an infinite stream
-            # however a future enhancement could be to stat proccessing this stream as soon as we have any bytes avialable to the user, so they could be
-            # iterating over the data while it is still being downloaded.
-            while True:
-                timestamp = xdrdata.unpack_uhyper()
-                value = self._convert(xdrdata.unpack_float(), timestamp)
-                datapoints.append(Point(timestamp, value))
-
-        except EOFError:
-            pass
-
-        return datapoints
-
-
-
-    def _convert(self, value, timestamp):
-        return value
-        if not self._convertToUnits:
-            return value
-
-        units = self._channel.GetTimeSeriresUnits()
-        return units.Convert(timestamp, value)
-
-
+        # timeseries/data always returns a relativly small chunk of data less than 100,000 points so we can proccess it all at once.
+        return response.raw
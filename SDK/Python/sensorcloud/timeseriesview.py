@@ -0,0 +1,260 @@
+"""
+Copyright 2013 LORD MicroStrain All Rights Reserved.
+
+Distributed under the Simplified BSD License.
+See file license.txt
+"""
+
+"""
+Random access to a channel's timeseries data by time.
+
+A TimeSeriesStream can only be read from its start.  A TimeSeriesView is indexed by time instead, view[t0:t1] is
+the PointBlock of the points with t0 <= timestamp < t1 and view.at(t) is the last point at or before t, and only the
+pages of data that cover the requested times are downloaded.
+
+SensorCloud returns data a page at a time, a page starting at a given time always ends at the same point, so the
+downloaded pages are remembered in a PageCache.  The cache keeps a sparse index of the time range each page covers,
+learned from the pages fetched so far, and finds the page holding a time with a binary search of the index.  The
+points of the most recently used pages are kept in memory up to a limit in bytes, a page that has been dropped is
+downloaded again from its start when it's needed.  The index is kept for pages that were dropped, it's a couple of
+numbers per page.
+
+Appended data always comes after the end of a partition, so a page that ends at or before the partition's end_time
+never changes.  Only that part of a page is cached.  A view of every sample rate only caches the data before the end
+of the partition that ends first, an upload to that partition could add points after it.
+"""
+
+import threading
+import bisect
+from collections import OrderedDict
+from datetime import datetime
+
+from util import timestamp_to_nanosecond
+from point import PointBlock, XDR_POINT_SIZE
+from timeseries import TimeSeriesStream, UnitConversion
+
+DEFAULT_PAGE_CACHE_BYTES = 64 * 1024 * 1024
+
+class PageCache(object):
+    """
+    LRU cache of downloaded pages of timeseries data, bounded by bytes, and the index of the pages' time ranges.
+    Pages are keyed by stream, e.g. (sensor, channel, sample rate), and the time the page starts.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_PAGE_CACHE_BYTES):
+        self._max_bytes = max_bytes
+        self._pages = OrderedDict()
+        self._bytes = 0
+        # stream -> ([page start], [page end]), sorted by start
+        self._index = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def get(self, stream, start):
+        """
+        the PointBlock of the page of stream that starts at start, or None if it isn't in memory
+        """
+        with self._lock:
+            block = self._pages.pop((stream, start), None)
+            if block is None:
+                self.misses += 1
+                return None
+            self._pages[(stream, start)] = block
+            self.hits += 1
+            return block
+
+    def put(self, stream, start, end, block):
+        """
+        add a page that holds every point of stream from start to end
+        """
+        with self._lock:
+            starts, ends = self._index.setdefault(stream, ([], []))
+            i = bisect.bisect_left(starts, start)
+            if i < len(starts) and starts[i] == start:
+                ends[i] = end
+            else:
+                starts.insert(i, start)
+                ends.insert(i, end)
+
+            size = len(block) * XDR_POINT_SIZE
+            if size > self._max_bytes:
+                return
+            old = self._pages.pop((stream, start), None)
+            if old is not None:
+                self._bytes -= len(old) * XDR_POINT_SIZE
+            self._pages[(stream, start)] = block
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                _, dropped = self._pages.popitem(last=False)
+                self._bytes -= len(dropped) * XDR_POINT_SIZE
+
+    def page(self, stream, timestamp):
+        """
+        (start, end) of the known page of stream that covers timestamp, or None
+        """
+        with self._lock:
+            starts, ends = self._index.get(stream, ((), ()))
+            i = bisect.bisect_right(starts, timestamp) - 1
+            if i >= 0 and ends[i] >= timestamp:
+                return starts[i], ends[i]
+            return None
+
+    def next_start(self, stream, timestamp):
+        """
+        start of the first known page of stream that starts after timestamp, or None
+        """
+        with self._lock:
+            starts, _ = self._index.get(stream, ((), ()))
+            i = bisect.bisect_right(starts, timestamp)
+            return starts[i] if i < len(starts) else None
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._index.clear()
+            self._bytes = 0
+
+def _nanoseconds(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp_to_nanosecond(timestamp)
+    return int(timestamp)
+
+class TimeSeriesView(object):
+    """
+    lazy view of a channel's timeseries data, indexed by time.  e.g.
+        view = channel.view()
+        block = view[start:start + 60 * 10 ** 9]
+        point = view.at(datetime(2014, 1, 1))
+    Times are nanoseconds since 1970 or datetimes.
+    """
+
+    def __init__(self, channel, sample_rate=None, convertToUnits=True, cache=None):
+        """
+        channel        - the channel to view
+        sample_rate    - only view the data uploaded with this sample rate, or None for all of the data
+        convertToUnits - convert the values to the preferred unit of the channel's units
+        cache          - PageCache for the downloaded pages, the device's page cache by default
+        """
+        self._channel = channel
+        self._sample_rate = sample_rate
+        self._convertToUnits = convertToUnits
+        self._cache = cache if cache is not None else channel.sensor.device.page_cache
+        self._stream = TimeSeriesStream(channel, samplerate=sample_rate, convertToUnits=False)
+        self._key = (channel.sensor.name, channel.name, sample_rate.to_param() if sample_rate else None)
+        self._conversion = None
+
+    @property
+    def first_timestamp(self):
+        """
+        timestamp of the first point, from the channel's partitions
+        """
+        return self._channel.first_timeseries_timestamp(self._sample_rate) or 0
+
+    @property
+    def last_timestamp(self):
+        """
+        timestamp of the last point, from the channel's partitions
+        """
+        return self._channel.last_timeseries_timestamp(self._sample_rate)
+
+    def __getitem__(self, index):
+        """
+        view[start:end] is a PointBlock of the points with start <= timestamp < end, either end can be left out
+        """
+        if not isinstance(index, slice):
+            raise TypeError("a view is indexed by a time range, view[start:end], use at() for a single point")
+        if index.step is not None:
+            raise ValueError("a view can't be indexed with a step")
+
+        start = _nanoseconds(index.start) if index.start is not None else 0
+        end = _nanoseconds(index.stop) - 1 if index.stop is not None else self.last_timestamp
+        return PointBlock.concat(self.blocks(start, end))
+
+    def blocks(self, start, end):
+        """
+        iterate over the points with start <= timestamp <= end a page at a time
+        """
+        conversion = self._unitConversion()
+        for block in self._blocks(_nanoseconds(start), _nanoseconds(end)):
+            yield conversion.convert(block) if conversion is not None else block
+
+    def at(self, timestamp, lookback=10 ** 9):
+        """
+        the last Point at or before timestamp, or None if there isn't one.  The data before timestamp is searched
+        lookback nanoseconds at a time, doubling each time nothing is found.
+        """
+        timestamp = min(_nanoseconds(timestamp), self.last_timestamp)
+        first = self.first_timestamp
+        if timestamp < first:
+            return None
+
+        end = timestamp
+        while True:
+            start = max(first, end - lookback + 1)
+            blocks = list(self.blocks(start, end))
+            if blocks:
+                return blocks[-1][-1]
+            if start == first:
+                return None
+            end = start - 1
+            lookback *= 2
+
+    def _blocks(self, start, end):
+        last = self.last_timestamp
+        if last == 0:
+            # there isn't any data
+            return
+        start = max(start, self.first_timestamp)
+        end = min(end, last)
+        position = start
+        while position <= end:
+            pageEnd, block = self._page(position)
+            part = block.between(position, end)
+            if len(part) > 0:
+                yield part
+            position = pageEnd + 1
+
+    def _page(self, timestamp):
+        """
+        (end, PointBlock) of the page that covers timestamp, from the cache or downloaded
+        """
+        known = self._cache.page(self._key, timestamp)
+        if known is not None:
+            block = self._cache.get(self._key, known[0])
+            if block is not None:
+                return known[1], block
+            start = known[0]
+        else:
+            start = timestamp
+
+        last = self.last_timestamp
+        block = self._stream._downloadBlock(start, last)
+        end = block.last_timestamp if len(block) > 0 else last
+
+        # a page downloaded from a new start can run into a page that's already known, it stops where that one starts
+        nextStart = self._cache.next_start(self._key, start)
+        if nextStart is not None and end >= nextStart:
+            end = nextStart - 1
+            block = block.between(start, end)
+
+        # data that's still open to uploads isn't cached, the page is downloaded again the next time it's needed
+        immutableEnd = self._stream._immutableEnd()
+        if start <= immutableEnd:
+            self._cache.put(self._key, start, min(end, immutableEnd), block.between(start, immutableEnd))
+        return end, block
+
+    def _unitConversion(self):
+        if not self._convertToUnits:
+            return None
+        if self._conversion is None:
+            self._conversion = UnitConversion(self._channel.units)
+        return None if self._conversion.identity else self._conversion
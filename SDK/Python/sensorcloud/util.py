@@ -5,6 +5,8 @@ Distributed under the Simplified BSD License.
 See file license.txt
 """
 
+import threading
+from collections import deque
 from datetime import datetime
 
 NANOSECONDS_PER_SECOND = 1000000000
@@ -15,4 +17,37 @@ def nanosecond_to_timestamp(nanoseconds):
 
 
 def timestamp_to_nanosecond(dt):
-    int((dt - UNIX_EPOCH).total_seconds() * NANOSECONDS_PER_SECOND)
+    return int((dt - UNIX_EPOCH).total_seconds() * NANOSECONDS_PER_SECOND)
+
+def run_parallel(fn, items, parallel):
+    """
+    call fn for each item using up to parallel threads.  returns the results in the same order as items.  If any
+    call raises, the remaining items are skipped and the first exception is raised.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    pending = deque(enumerate(items))
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        while not errors:
+            with lock:
+                if not pending:
+                    return
+                i, item = pending.popleft()
+            try:
+                results[i] = fn(item)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(max(1, parallel), len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
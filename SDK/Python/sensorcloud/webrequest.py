@@ -19,13 +19,212 @@ log = logging.getLogger(__name__)
 
 #from urllib import urlencode
 #import httplib
+import os
 import time
 import zlib
+import mmap
+import socket
+import select
+import threading
+
+# methods that are safe to send again when a response was lost
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+def _send_streamed(conn, method, url, headers, body):
+    """
+    send a request with a streamed body.  The body is sent with a Content-Length when its size is known and with
+    chunked transfer encoding when it isn't.
+    """
+    names = set(name.lower() for name in headers)
+    conn.putrequest(method, url, skip_host="host" in names, skip_accept_encoding="accept-encoding" in names)
+    for name, value in headers.items():
+        conn.putheader(name, value)
+
+    size = body.size
+    if size is None:
+        conn.putheader("Transfer-Encoding", "chunked")
+    else:
+        conn.putheader("Content-Length", str(size))
+    conn.endheaders()
+
+    for block in body:
+        if not len(block):
+            continue
+        if size is None:
+            conn.send("%x\r\n" % len(block))
+            conn.send(block)
+            conn.send("\r\n")
+        else:
+            conn.send(block)
+    if size is None:
+        conn.send("0\r\n\r\n")
+
+class ConnectionPool(object):
+    """
+    keeps an open connection to each server for every thread, so requests reuse connections (http keep-alive)
+    instead of making a new connection, and a new TLS handshake, for every request.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection(self, protocol, server):
+        """
+        returns (connection, reused), reused is True if the connection was used for an earlier request
+        """
+        connections = self._connections()
+        conn = connections.get((protocol, server))
+        if conn is not None and _closed(conn):
+            # the server closed the connection while it was idle
+            conn.close()
+            conn = None
+        if conn is not None:
+            return conn, True
+        conn = _connect(protocol, server)
+        connections[(protocol, server)] = conn
+        return conn, False
+
+    def discard(self, protocol, server):
+        conn = self._connections().pop((protocol, server), None)
+        if conn is not None:
+            conn.close()
+
+    def _connections(self):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        return connections
+
+def _closed(conn):
+    """
+    True if an idle connection was closed by the server, its socket is readable with nothing to read
+    """
+    if conn.sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (select.error, socket.error, ValueError):
+        return True
+    return bool(readable)
+
+def _connect(protocol, server):
+    import httplib
+
+    if protocol == "https":
+        return httplib.HTTPSConnection(server, context=ssl._create_unverified_context())
+    return httplib.HTTPConnection(server)
 
 class Requests(object):
 
     compression = "gzip"
 
+    # connections are reused through this pool, set it to None to make a new connection for every request
+    connection_pool = ConnectionPool()
+
+    # size of the blocks a streamed response is read in and a streamed request body is sent in
+    chunk_size = 64 * 1024
+
+    class RequestBody(object):
+        """
+        a request body that is sent in parts, without joining the parts into one string first.  A part can be a
+        string, a buffer, memoryview, bytearray or mmap, a file object, which is sent from its current position to the
+        end, or an iterable of strings.  Iterating the body gives blocks of at most Requests.chunk_size bytes and
+        buffer parts are sliced without copying them.  The body can be iterated again when a request is resent, except
+        for parts that are generators.
+        """
+
+        def __init__(self, *parts):
+            self._parts = []
+            for part in parts:
+                if isinstance(part, (str, buffer, bytearray, memoryview, mmap.mmap)):
+                    self._parts.append(("buffer", part, 0))
+                elif hasattr(part, "read"):
+                    self._parts.append(("file", part, part.tell()))
+                else:
+                    self._parts.append(("iterable", part, 0))
+
+        @property
+        def size(self):
+            """
+            number of bytes in the body, or None if it isn't known before the body is sent
+            """
+            size = 0
+            for kind, part, offset in self._parts:
+                if kind == "buffer":
+                    size += len(part)
+                elif kind == "file":
+                    try:
+                        size += os.fstat(part.fileno()).st_size - offset
+                    except (AttributeError, IOError, OSError):
+                        return None
+                elif isinstance(part, (list, tuple)):
+                    size += sum(len(block) for block in part)
+                else:
+                    return None
+            return size
+
+        @property
+        def raw_size(self):
+            """ size of the body before it's encoded """
+            return self.size
+
+        def compressed(self):
+            return Requests.CompressedBody(self)
+
+        def __iter__(self):
+            chunk_size = Requests.chunk_size
+            for kind, part, offset in self._parts:
+                if kind == "buffer":
+                    for start in xrange(0, len(part), chunk_size):
+                        if isinstance(part, memoryview):
+                            yield part[start:start + chunk_size].tobytes()
+                        else:
+                            yield buffer(part, start, chunk_size)
+                elif kind == "file":
+                    part.seek(offset)
+                    while True:
+                        block = part.read(chunk_size)
+                        if not block:
+                            break
+                        yield block
+                else:
+                    for block in part:
+                        yield block
+
+        def getvalue(self):
+            """
+            the whole body as one string
+            """
+            return "".join(str(block) for block in self)
+
+    class CompressedBody(object):
+        """
+        a RequestBody that is compressed as it's sent.  The compressed size isn't known up front, so the body is sent
+        with chunked transfer encoding.
+        """
+
+        def __init__(self, body):
+            self._body = body
+
+        @property
+        def size(self):
+            return None
+
+        @property
+        def raw_size(self):
+            return self._body.size
+
+        def __iter__(self):
+            compressor = zlib.compressobj()
+            for block in self._body:
+                block = compressor.compress(block)
+                if block:
+                    yield block
+            yield compressor.flush()
+
+        def getvalue(self):
+            return "".join(self)
+
     class RequestOptions(object):
         """
         RequestOptions stores all the possible variables required to make an http request
@@ -35,6 +234,7 @@ class Requests(object):
             self._queryParams = {}
             self._headers = {}
             self._requestBody = None
+            self._responseSink = None
             self._cachedQueryString = None
 
         @property
@@ -51,13 +251,42 @@ class Requests(object):
 
         @requestBody.setter
         def requestBody(self, body):
+            if not isinstance(body, str):
+                # anything that isn't a string is streamed, and compressed as it's sent
+                if not isinstance(body, Requests.RequestBody):
+                    body = Requests.RequestBody(body)
+                if Requests.compression == "gzip":
+                    self.addHeader('content-encoding', "gzip")
+                    body = body.compressed()
+                self._requestBody = body
+                return
+
+            self._requestBody = body
             if Requests.compression == "gzip":
                 compressedBody = zlib.compress(body)
                 if len(compressedBody) < len(body):
                     self.addHeader('content-encoding', "gzip")
                     self._requestBody = compressedBody
-                else:
-                    self._requestBody = body
+
+        @property
+        def bodySize(self):
+            """
+            size of the request body before compression.  0 if there isn't a body or its size isn't known.
+            """
+            body = self._requestBody
+            if body is None:
+                return 0
+            if isinstance(body, str):
+                return len(body)
+            return body.raw_size or 0
+
+        @property
+        def responseSink(self):
+            return self._responseSink
+
+        @responseSink.setter
+        def responseSink(self, sink):
+            self._responseSink = sink
 
         def addParam(self , name, value):
             """
@@ -128,6 +357,14 @@ class Requests(object):
             self._options.setRequestBody(requestBody)
             return self
 
+        def stream_to(self, sink):
+            """
+            Stream a successful response body to sink instead of holding it in memory.  sink is called with
+            each decompressed block of the body as it is read.
+            """
+            self._options.responseSink = sink
+            return self.header("Accept-Encoding", "gzip")
+
         def add_processor(self, processor):
             """
             Add a processor to be executed after the request is complete, but before it is returned to the caller.
@@ -223,6 +460,13 @@ class Requests(object):
         def raw(self):
             return self._response_data
 
+        @property
+        def bytes_received(self):
+            """
+            number of (decompressed) bytes in the response body, including bytes that were streamed to a sink
+            """
+            return self._bytes_received
+
         def __init__(self, method, url, options):
             self._method = method;
             self._url = url;
@@ -232,6 +476,7 @@ class Requests(object):
             self._reason = None;
             self._response_data = None;
             self._response_headers = None;
+            self._bytes_received = 0
             self._duration = None
 
             self.doRequest()
@@ -255,25 +500,92 @@ class Requests(object):
 
             protocol = protocol.lower()
             assert protocol in ("http", "https")
-            if protocol == "https":
-                conn = httplib.HTTPSConnection(server, context=ssl._create_unverified_context())
-            else:
-                conn = httplib.HTTPConnection(server)
 
             start = time.time()
 
-            conn.request(self._method, url=url, headers=self._options.headers, body=self._options.requestBody)
-            response = conn.getresponse()
+            pool = Requests.connection_pool
+            if pool is None:
+                conn = _connect(protocol, server)
+                response = self._exchange(conn, url)
+            else:
+                conn, reused = pool.connection(protocol, server)
+                sent = False
+                try:
+                    self._send(conn, url)
+                    sent = True
+                    response = conn.getresponse()
+                except (httplib.HTTPException, socket.error):
+                    pool.discard(protocol, server)
+                    # a request that was sent may have been acted on even though its response was lost, so only a
+                    # request that failed to go out or that's safe to repeat is sent again
+                    if not reused or (sent and self._method not in IDEMPOTENT_METHODS):
+                        raise
+                    log.debug("reused connection to %s failed, reconnecting", server)
+                    conn, reused = pool.connection(protocol, server)
+                    response = self._exchange(conn, url)
+
+            self._status_code = response.status
+            self._reason = response.reason
+
+            self._response_headers = dict(response.getheaders())
 
-            self._response_data = response.read()
+            if self._options.responseSink and 200 <= response.status < 300:
+                self._stream_response(response)
+            else:
+                self._response_data = self._decompress(response.read())
+                self._bytes_received = len(self._response_data)
 
             #once the response has been read, the request is complete
             self._duration = time.time() - start
 
-            self._status_code = response.status
-            self._reason = response.reason
+            if pool is not None and response.will_close:
+                pool.discard(protocol, server)
 
-            self._response_headers = dict(response.getheaders())
+        def _exchange(self, conn, url):
+            """
+            send the request on conn and return the response
+            """
+            self._send(conn, url)
+            return conn.getresponse()
+
+        def _send(self, conn, url):
+            body = self._options.requestBody
+            if body is None or isinstance(body, str):
+                conn.request(self._method, url=url, headers=self._options.headers, body=body)
+            else:
+                _send_streamed(conn, self._method, url, self._options.headers, body)
+
+        def _decompressor(self):
+            encoding = self._response_headers.get("content-encoding", "").lower()
+            if encoding == "gzip":
+                return zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if encoding == "deflate":
+                return zlib.decompressobj()
+            return None
+
+        def _decompress(self, data):
+            decompressor = self._decompressor()
+            if decompressor is None:
+                return data
+            return decompressor.decompress(data) + decompressor.flush()
+
+        def _stream_response(self, response):
+            sink = self._options.responseSink
+            decompressor = self._decompressor()
+            while True:
+                block = response.read(Requests.chunk_size)
+                if not block:
+                    break
+                if decompressor:
+                    block = decompressor.decompress(block)
+                if block:
+                    self._bytes_received += len(block)
+                    sink(block)
+            if decompressor:
+                block = decompressor.flush()
+                if block:
+                    self._bytes_received += len(block)
+                    sink(block)
 
     def url(self, url):
         """
@@ -11,4 +11,5 @@ setup(name="SensorCloud API",
 	version=sensorcloud.__version__,
 	description="Python Programming Interface for SensorCloud",
 	packages=["sensorcloud"],
+	scripts=["scripts/sensorcloud"],
 	)
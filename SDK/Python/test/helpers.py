@@ -28,3 +28,126 @@ def mockCallArg(call, i, name):
     if len(call[1]) > i:
         return call[1][i]
     return call[2][name]
+
+def requestBody(options):
+    """
+    the decompressed body of a request
+    """
+    import zlib
+    body = options.requestBody
+    if not isinstance(body, str):
+        body = body.getvalue()
+    if options.headers.get("content-encoding") == "gzip":
+        body = zlib.decompress(body)
+    return body
+
+def timeseriesInfo(*units):
+    import xdrlib
+    packer = xdrlib.Packer()
+    packer.pack_int(1)
+    packer.pack_uhyper(0)
+    packer.pack_uhyper(0)
+    packer.pack_uint(len(units))
+    for stored, preferred, timestamp, slope, offset in units:
+        packer.pack_string(stored)
+        packer.pack_string(preferred)
+        packer.pack_uhyper(timestamp)
+        packer.pack_float(slope)
+        packer.pack_float(offset)
+
+    response = ok()
+    response.raw = packer.get_buffer()
+    return response
+
+class FakeTimeseriesServer(object):
+    """
+    fake SensorCloud that serves the timeseries data of some channels and records the uploads.
+
+    data maps a channel name to a list of (timestamp, value) pairs.  A download gets at most page_size of the points
+    between starttime and endtime, or a 404 when there are none, and data/latest/ gets the last point.  rates maps a
+    channel name to the SampleRate of its one partition, channels that aren't in it have no partitions.
+    """
+
+    def __init__(self, data=None, page_size=None, rates=None):
+        import threading
+        self.lock = threading.Lock()
+        self.data = dict((channel, list(points)) for channel, points in (data or {}).items())
+        self.page_size = page_size
+        self.rates = dict(rates or {})
+        # (channel, starttime) of each download, starttime is "latest" for data/latest/
+        self.downloads = []
+        # (channel, PointBlock, name of the thread that uploaded it) of each upload
+        self.uploads = []
+
+    def add(self, channel, points):
+        with self.lock:
+            self.data.setdefault(channel, []).extend(points)
+
+    def starts(self, channel=None):
+        """ starttime of each download, of one channel or all of them """
+        return [start for name, start in self.downloads if channel is None or name == channel]
+
+    def uploaded(self, channel):
+        """ the points uploaded to a channel, in the order they were uploaded """
+        import sensorcloud
+        return sensorcloud.PointBlock.concat(block for name, block, _ in self.uploads if name == channel)
+
+    def __call__(self, method, url, options):
+        import threading
+        import sensorcloud
+
+        if url.endswith("/authenticate/"):
+            return authRequest()
+        if url.endswith("/streams/timeseries/"):
+            return timeseriesInfo()
+
+        channel = url.split("/channels/")[1].split("/")[0]
+        if url.endswith("/partitions/"):
+            return self.partitions(channel if "/timeseries/" in url else None)
+        if method == "POST":
+            block = sensorcloud.PointBlock.from_xdr(requestBody(options)[16:])
+            with self.lock:
+                self.uploads.append((channel, block, threading.current_thread().name))
+            return created()
+
+        with self.lock:
+            points = list(self.data.get(channel, []))
+            if url.endswith("/data/latest/"):
+                self.downloads.append((channel, "latest"))
+                points = points[-1:]
+            else:
+                start = int(options.queryParams["starttime"])
+                end = int(options.queryParams["endtime"])
+                self.downloads.append((channel, start))
+                points = [p for p in points if start <= p[0] <= end][:self.page_size]
+
+        if not points:
+            response = Mock()
+            response.status_code = 404
+            return response
+        response = ok()
+        response.raw = sensorcloud.PointBlock([p[0] for p in points], [p[1] for p in points]).to_xdr()
+        return response
+
+    def partitions(self, channel):
+        import xdrlib
+        from sensorcloud.samplerate import HERTZ
+
+        packer = xdrlib.Packer()
+        packer.pack_int(1)
+        rate = self.rates.get(channel)
+        points = self.data.get(channel)
+        if rate is None or not points:
+            packer.pack_uint(0)
+        else:
+            packer.pack_uint(1)
+            packer.pack_uhyper(points[0][0])
+            packer.pack_uhyper(points[-1][0])
+            packer.pack_int(0)
+            packer.pack_int(0)
+            packer.pack_uint(1 if rate.rate_type == HERTZ else 0)
+            packer.pack_uint(rate.rate)
+            packer.pack_uint(0)
+        response = ok()
+        response.raw = packer.get_buffer()
+        return response
@@ -0,0 +1,83 @@
+import unittest
+import xdrlib
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.aggregate import WindowAggregator
+from sensorcloud.partition import PartitionIndex
+
+from helpers import *
+
+SECOND = 1000000000
+
+class TestWindowAggregator(unittest.TestCase):
+
+    def test_summaries(self):
+        aggregator = WindowAggregator(sensorcloud.SampleRate.seconds(10))
+        summaries = aggregator.push([0, 5 * SECOND, 12 * SECOND], [1.0, -3.0, 2.0])
+        self.assertEqual(len(summaries), 1)
+        summary = summaries[0]
+        self.assertEqual((summary.timestamp, summary.count, summary.min, summary.max, summary.mean),
+                         (0, 2, -3.0, 1.0, -1.0))
+        self.assertAlmostEqual(summary.rms, (5.0) ** 0.5)
+        self.assertEqual(aggregator.open_windows, 1)
+
+        summaries = aggregator.flush()
+        self.assertEqual([(s.timestamp, s.count) for s in summaries], [(10 * SECOND, 1)])
+        self.assertEqual(aggregator.open_windows, 0)
+
+    def test_lateness(self):
+        aggregator = WindowAggregator(sensorcloud.SampleRate.seconds(10), lateness=5 * SECOND)
+        self.assertEqual(aggregator.push([2 * SECOND, 12 * SECOND], [1.0, 1.0]), [])
+
+        # within the lateness the first window is still open
+        self.assertEqual(aggregator.push([9 * SECOND], [3.0]), [])
+        summaries = aggregator.push([16 * SECOND], [1.0])
+        self.assertEqual([(s.timestamp, s.count, s.max) for s in summaries], [(0, 2, 3.0)])
+
+        # too late
+        self.assertEqual(aggregator.push([8 * SECOND], [100.0]), [])
+        self.assertEqual(aggregator.late_samples, 1)
+        self.assertEqual([s.max for s in aggregator.flush()], [1.0])
+
+    def test_unsortedBlock(self):
+        aggregator = WindowAggregator(sensorcloud.SampleRate.hertz(2))
+        summaries = aggregator.push([SECOND, 0, SECOND // 2 + 1, 1], [4.0, 1.0, 3.0, 2.0]) + aggregator.flush()
+        self.assertEqual([(s.timestamp, s.count, s.min, s.max) for s in summaries],
+                         [(0, 2, 1.0, 2.0), (SECOND // 2, 1, 3.0, 3.0), (SECOND, 1, 4.0, 4.0)])
+
+class TestChannelAggregator(unittest.TestCase):
+
+    def test_derivedChannels(self):
+        uploads = []
+        def upload(method, url, options):
+            if url.endswith("/authenticate/"):
+                return authRequest()
+            unpacker = xdrlib.Unpacker(requestBody(options))
+            unpacker.unpack_int()
+            rate = unpacker.unpack_enum(), unpacker.unpack_int()
+            points = [(unpacker.unpack_uhyper(), unpacker.unpack_float()) for _ in range(unpacker.unpack_int())]
+            uploads.append((url.split("/")[-5], rate, points))
+            return created()
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=upload)
+
+        device = sensorcloud.Device("FAKE", "fake")
+        sensor = device.sensor("sensor")
+        for name in ["accel", "accel_max", "accel_count"]:
+            sensor.channel(name)._timeseries_partitions = PartitionIndex()
+            sensor.channel(name)._histogram_partitions = PartitionIndex()
+
+        aggregator = sensor.channel("accel").aggregator(sensorcloud.SampleRate.seconds(1), statistics=["max", "count"],
+                                                        raw=2)
+        rate = sensorcloud.SampleRate.hertz(4)
+        aggregator.timeseries_append(rate, sensorcloud.PointBlock(rate.timestamps(0, 0, 5), [1, 2, 3, 4, 5]))
+        aggregator.flush()
+
+        self.assertEqual(uploads, [
+            ("accel", (1, 2), [(0, 1.0), (SECOND // 2, 3.0), (SECOND, 5.0)]),
+            ("accel_max", (0, 1), [(0, 4.0)]),
+            ("accel_count", (0, 1), [(0, 4.0)]),
+            ("accel_max", (0, 1), [(SECOND, 5.0)]),
+            ("accel_count", (0, 1), [(SECOND, 1.0)]),
+        ])
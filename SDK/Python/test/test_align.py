@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.align import align_column
+
+from helpers import *
+
+class TestAlignColumn(unittest.TestCase):
+
+    def setUp(self):
+        self.timestamps = np.array([10, 20, 40], dtype=np.uint64)
+        self.values = np.array([1.0, 2.0, 4.0], dtype=np.float32)
+        self.grid = np.array([5, 10, 14, 16, 30, 45], dtype=np.uint64)
+
+    def align(self, method, tolerance=None):
+        return align_column(self.timestamps, self.values, self.grid, method, tolerance).tolist()
+
+    def assertColumn(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            if e is None:
+                self.assertTrue(np.isnan(a), (actual, expected))
+            else:
+                self.assertAlmostEqual(a, e, places=5)
+
+    def test_methods(self):
+        self.assertColumn(self.align("nearest"), [1.0, 1.0, 1.0, 2.0, 2.0, 4.0])
+        self.assertColumn(self.align("linear"), [None, 1.0, 1.4, 1.6, 3.0, None])
+        self.assertColumn(self.align("ffill"), [None, 1.0, 1.0, 1.0, 2.0, 4.0])
+
+    def test_tolerance(self):
+        self.assertColumn(self.align("nearest", tolerance=4), [None, 1.0, 1.0, 2.0, None, None])
+        self.assertColumn(self.align("ffill", tolerance=5), [None, 1.0, 1.0, None, None, 4.0])
+        self.assertRaises(ValueError, align_column, self.timestamps, self.values, self.grid, "cubic")
+
+class TestAligned(unittest.TestCase):
+
+    def setUp(self):
+        # each channel is served a page of 2 points at a time
+        self.server = FakeTimeseriesServer({"a": [(0, 0.0), (10, 1.0), (20, 2.0), (30, 3.0), (40, 4.0), (50, 5.0)],
+                                            "b": [(5, 10.0), (25, 30.0), (45, 50.0)]}, page_size=2)
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=self.server)
+        self.device = sensorcloud.Device("FAKE", "fake")
+
+    def test_rateGrid(self):
+        rate = sensorcloud.SampleRate.hertz(100000000)
+        aligned = self.device.aligned(["sensor:a", ("sensor", "b")], 0, 50, rate, "linear", block_size=2)
+        blocks = list(aligned)
+        self.assertTrue(all(len(block.timestamps) <= 2 for block in blocks))
+
+        block = aligned.to_block()
+        self.assertEqual(block.timestamps.tolist(), [0, 10, 20, 30, 40, 50])
+        self.assertEqual(block.values.shape, (6, 2))
+        self.assertEqual(block.values[:, 0].tolist(), [0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertTrue(np.isnan(block.values[0, 1]) and np.isnan(block.values[5, 1]))
+        self.assertEqual(block.values[1:5, 1].tolist(), [15.0, 25.0, 35.0, 45.0])
+
+    def test_unionGrid(self):
+        block = self.device.aligned(["sensor:a", "sensor:b"], 5, 40, method="ffill").to_block()
+        self.assertEqual(block.timestamps.tolist(), [5, 10, 20, 25, 30, 40])
+        self.assertEqual(block.values[1:, 0].tolist(), [1.0, 2.0, 2.0, 3.0, 4.0])
+        self.assertTrue(np.isnan(block.values[0, 0]))
+        self.assertEqual(block.values[:, 1].tolist(), [10.0, 10.0, 10.0, 30.0, 30.0, 30.0])
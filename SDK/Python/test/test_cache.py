@@ -0,0 +1,106 @@
+import unittest
+import tempfile
+import json
+import os
+
+import mock
+from mock import Mock
+
+import sensorcloud
+
+from helpers import *
+
+class TestLazyCache(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        with open(self.path, 'wb') as f:
+            f.write(json.dumps({
+                "token": "cached_token",
+                "server": "https://cached.sensorcloud.microstrain.com",
+                "sensors": {"sensor": {"channel": {"timeseries_partitions": {"10 hertz": {"last_timestamp": 12345}}}}}
+            }))
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_notLoadedOnStartup(self):
+        device = sensorcloud.Device("FAKE", "fake", cache_file=self.path)
+        self.assertTrue(device._cache._loaded is None)
+
+        channel = device.sensor("sensor").channel("channel")
+        self.assertEqual(channel.last_timeseries_timestamp(), 12345)
+        self.assertEqual(channel._cache.timeseries_partitions[0].descriptor, "10 hertz")
+
+    def test_cachedTokenUsed(self):
+        request = Mock()
+        request.side_effect = [ok()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake", cache_file=self.path)
+        device.url("/fake/").get()
+
+        request.assert_called_once_with('GET', 'https://cached.sensorcloud.microstrain.com/SensorCloud/devices/FAKE/fake/', mock.ANY)
+        self.assertTrue(isinstance(device._requests.authToken, str))
+
+class TestPartitionIndex(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_partialMatch(self):
+        from sensorcloud.partition import HistogramKey, PartitionIndex
+
+        hz10 = sensorcloud.SampleRate.hertz(10)
+        index = PartitionIndex()
+        index[HistogramKey(hz10, 0.1, 1.0, 10)] = "a"
+        index[HistogramKey(hz10, 0.0, 1.0, 20)] = "b"
+        index[HistogramKey(sensorcloud.SampleRate.seconds(1), 0.1, 1.0, 10)] = "c"
+
+        self.assertEqual(sorted(p for _, p in index.find(sample_rate=hz10)), ["a", "b"])
+        self.assertEqual(sorted(p for _, p in index.find(bin_start=0.1, bin_size=1.0)), ["a", "c"])
+        self.assertEqual([p for _, p in index.find(sample_rate=sensorcloud.SampleRate.hertz(10), num_bins=10)], ["a"])
+        self.assertEqual(index.find(sample_rate=sensorcloud.SampleRate.hertz(5)), [])
+        self.assertEqual(len(index.find()), 3)
+
+        del index[HistogramKey(hz10, 0.1, 1.0, 10)]
+        self.assertEqual([p for _, p in index.find(num_bins=10)], ["c"])
+
+    def test_histogramDescriptorRoundTrip(self):
+        from sensorcloud.partition import HistogramKey
+
+        key = HistogramKey(sensorcloud.SampleRate.hertz(10), 0.1, 2.5, 10)
+        self.assertEqual(key.descriptor, "10 hertz_1.000000e-01_2.500000e+00_10")
+        self.assertEqual(HistogramKey.from_descriptor(key.descriptor), key)
+        self.assertTrue(HistogramKey.from_descriptor(key.descriptor).sample_rate is sensorcloud.SampleRate.hertz(10))
+
+    def test_descriptorFunctions(self):
+        from sensorcloud import histogram, timeseries
+
+        hz10 = sensorcloud.SampleRate.hertz(10)
+        self.assertEqual(timeseries.descriptor(hz10), "10 hertz")
+        descriptor = histogram.descriptor(hz10, 0.1, 2.5, 10)
+        self.assertEqual(descriptor, "10 hertz_1.000000e-01_2.500000e+00_10")
+        self.assertEqual(sensorcloud.Histogram(0, 0.1, 2.5, [0] * 10).descriptor(hz10), descriptor)
+
+        self.assertTrue(histogram.descriptor_match(descriptor, sample_rate=hz10, bin_start=0.1, num_bins=10))
+        self.assertTrue(histogram.descriptor_match(descriptor, bin_size=2.5))
+        self.assertFalse(histogram.descriptor_match(descriptor, num_bins=20))
+        self.assertFalse(histogram.descriptor_match("10 hertz", num_bins=10))
+
+    def test_cachedHistogramPartitions(self):
+        with open(self.path, 'wb') as f:
+            f.write(json.dumps({"sensors": {"sensor": {"channel": {"histogram_partitions": {
+                "10 hertz_1.000000e-01_2.500000e+00_10": {"last_timestamp": 100},
+                "10 hertz_0.000000e+00_1.000000e+00_10": {"last_timestamp": 200}}}}}}))
+
+        device = sensorcloud.Device("FAKE", "fake", cache_file=self.path)
+        channel = device.sensor("sensor").channel("channel")
+        self.assertEqual(channel.last_histogram_timestamp(bin_start=0.1), 100)
+        self.assertEqual(channel.last_histogram_timestamp(sample_rate=sensorcloud.SampleRate.hertz(10)), 200)
+        self.assertEqual(channel.last_histogram_timestamp(num_bins=5), 0)
@@ -7,6 +7,7 @@ import mock
 from mock import Mock
 
 import sensorcloud
+from sensorcloud.partition import PartitionIndex
 
 from helpers import *
 
@@ -156,6 +157,113 @@ class TestUpload(unittest.TestCase):
         channel.timeseries_append(sensorcloud.SampleRate.hertz(10), [sensorcloud.Point(12345, 10.5)])
         self.assertEqual(channel.last_timestamp_nanoseconds, 12345)
 
+    def test_uploadPointBlock(self):
+        packer = xdrlib.Packer()
+        packer.pack_int(1)
+        packer.pack_int(0)
+        noPartitions = Mock()
+        noPartitions.status_code = 200
+        noPartitions.raw = packer.get_buffer()
+
+        request = Mock()
+        request.side_effect = [authRequest(), created(), noPartitions]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        channel = device.sensor("sensor").channel("channel")
+        channel.timeseries_append(sensorcloud.SampleRate.hertz(10), sensorcloud.PointBlock([100, 200], [1.5, 2.5]))
+        self.assertEqual(channel.last_timestamp_nanoseconds, 200)
+
+        unpacker = xdrlib.Unpacker(requestBody(mockCallArg(request.mock_calls[1], 2, "options")))
+        self.assertEqual(unpacker.unpack_int(), 1)
+        unpacker.unpack_int()
+        unpacker.unpack_int()
+        self.assertEqual(unpacker.unpack_int(), 2)
+        self.assertEqual([unpacker.unpack_uhyper(), unpacker.unpack_float(), unpacker.unpack_uhyper(), unpacker.unpack_float()],
+                         [100, 1.5, 200, 2.5])
+
+    def test_uploadRegular(self):
+        request = Mock()
+        request.side_effect = [authRequest(), created(), created()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        channel = device.sensor("sensor").channel("channel")
+        channel._timeseries_partitions = PartitionIndex()
+        channel._histogram_partitions = PartitionIndex()
+        values = [float(i) for i in range(20003)]
+        channel.timeseries_append_regular(sensorcloud.SampleRate.hertz(3), 1000, values)
+
+        self.assertEqual(len(request.mock_calls), 3)
+        unpacker = xdrlib.Unpacker(requestBody(mockCallArg(request.mock_calls[2], 2, "options")))
+        unpacker.unpack_int()
+        unpacker.unpack_int()
+        unpacker.unpack_int()
+        self.assertEqual(unpacker.unpack_int(), 3)
+        self.assertEqual(unpacker.unpack_uhyper(), 1000 + 20000 * 1000000000 // 3)
+        self.assertEqual(unpacker.unpack_float(), 20000.0)
+        self.assertEqual(channel.last_timestamp_nanoseconds, 1000 + 20002 * 1000000000 // 3)
+
+    def test_detectRatesOnUpload(self):
+        from sensorcloud.ratedetect import detect_runs
+
+        slow = [i * 100000000 for i in range(20)]
+        # a burst at 7 hertz, the spacing alternates between 142857142 and 142857143 ns
+        fast = [slow[-1] + 50000000 + i * 1000000000 // 7 for i in range(30)]
+        # back to 10 hertz after a gap
+        slow2 = [fast[-1] + 10000000000 + i * 100000000 for i in range(20)]
+        timestamps = slow + fast + slow2
+
+        self.assertEqual(detect_runs(timestamps), [(sensorcloud.SampleRate.hertz(10), 0, 20),
+                                                   (sensorcloud.SampleRate.hertz(7), 20, 50),
+                                                   (sensorcloud.SampleRate.hertz(10), 50, 70)])
+
+        request = Mock()
+        request.side_effect = [authRequest(), created(), created(), created()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        channel = device.sensor("sensor").channel("channel")
+        channel._timeseries_partitions = PartitionIndex()
+        channel._histogram_partitions = PartitionIndex()
+        channel.timeseries_append_detect(sensorcloud.PointBlock(timestamps, [1.0] * len(timestamps)))
+
+        self.assertEqual(len(request.mock_calls), 4)
+        self.assertEqual(channel.last_timeseries_timestamp(sensorcloud.SampleRate.hertz(7)), fast[-1])
+        self.assertEqual(channel.last_timeseries_timestamp(sensorcloud.SampleRate.hertz(10)), slow2[-1])
+        self.assertEqual(channel.last_timestamp_nanoseconds, slow2[-1])
+
+    def test_uploadFile(self):
+        # the bodies are slices of the mapped file, so they're read while the file is still mapped
+        bodies = []
+        def upload(method, url, options):
+            if not url.endswith("/authenticate/"):
+                bodies.append(requestBody(options))
+                return created()
+            return authRequest()
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=upload)
+
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(sensorcloud.PointBlock(range(0, 30000), [1.0] * 30000).to_xdr())
+        try:
+            device = sensorcloud.Device("FAKE", "fake")
+            channel = device.sensor("sensor").channel("channel")
+            channel._timeseries_partitions = PartitionIndex()
+            channel._histogram_partitions = PartitionIndex()
+            channel.timeseries_append_file(sensorcloud.SampleRate.hertz(10), path)
+        finally:
+            os.unlink(path)
+
+        self.assertEqual(len(bodies), 2)
+        unpacker = xdrlib.Unpacker(bodies[1])
+        unpacker.unpack_int()
+        unpacker.unpack_int()
+        unpacker.unpack_int()
+        self.assertEqual(unpacker.unpack_int(), 10000)
+        self.assertEqual(unpacker.unpack_uhyper(), 20000)
+        self.assertEqual(channel.last_timestamp_nanoseconds, 29999)
+
     def test_uploadHistogram(self):
         packer = xdrlib.Packer()
         packer.pack_int(1)
@@ -0,0 +1,86 @@
+import unittest
+
+import mock
+
+import sensorcloud
+from sensorcloud.chunker import AdaptiveChunker
+from sensorcloud.ratelimit import RateLimiter
+from sensorcloud.error import ServerError
+
+def serverError(status):
+    return ServerError(mock.Mock(status_code=status, reason="", text="", scerror=None), "upload")
+
+class TestAdaptiveChunker(unittest.TestCase):
+
+    def test_growsOnFastUploads(self):
+        chunker = AdaptiveChunker(initial_bytes=12000, increase_bytes=1200, target_seconds=1.0)
+        self.assertEqual(chunker.chunk_points(12), 1000)
+
+        chunker.success(1000, 12000, 0.1)
+        self.assertEqual(chunker.chunk_points(12), 1100)
+
+        # a short final chunk doesn't grow the size
+        chunker.success(10, 120, 0.1)
+        self.assertEqual(chunker.chunk_points(12), 1100)
+
+    def test_shrinksOnSlowUploads(self):
+        chunker = AdaptiveChunker(initial_bytes=12000, target_seconds=1.0)
+        chunker.success(1000, 12000, 2.0)
+        self.assertEqual(chunker.chunk_points(12), 500)
+
+    def test_bounds(self):
+        chunker = AdaptiveChunker(initial_bytes=10 ** 9, max_points=1000)
+        self.assertEqual(chunker.chunk_points(12), 1000)
+        self.assertEqual(chunker.chunk_bytes, 100000 * 12)
+
+        chunker = AdaptiveChunker(initial_bytes=1, min_points=10)
+        self.assertEqual(chunker.chunk_points(12), 4096 // 12)
+        self.assertEqual(chunker.chunk_points(4096), 10)
+
+    def test_retrySmallerOnGatewayTimeout(self):
+        chunker = AdaptiveChunker(initial_bytes=12000, min_points=1, min_bytes=12)
+        sent = []
+
+        def send(start, end):
+            if end - start > 250:
+                raise serverError(504)
+            sent.append((start, end))
+
+        chunker.run(600, 12, send)
+        self.assertEqual(sent[0], (0, 150))
+        self.assertEqual(sent[-1][1], 600)
+        self.assertEqual(sum(e - s for s, e in sent), 600)
+
+        metrics = chunker.metrics()
+        self.assertEqual(metrics.retries, 3)
+        self.assertEqual(metrics.points, 600)
+        self.assertEqual(metrics.bytes, 600 * 12)
+        self.assertEqual(metrics.uploads, len(sent))
+
+    def test_limiterWaitNotCounted(self):
+        chunker = AdaptiveChunker(initial_bytes=12000, increase_bytes=1200, target_seconds=0.1)
+        limiter = RateLimiter(initial_backoff=0.3)
+        limiter.throttled()
+
+        # the upload is held back by the limiter for longer than the target, but the network part is fast
+        chunker.run(1000, 12, lambda start, end: limiter.acquire())
+        self.assertEqual(chunker.chunk_points(12), 1100)
+        self.assertTrue(chunker.metrics().seconds < 0.1)
+
+    def test_otherErrorsNotRetried(self):
+        chunker = AdaptiveChunker()
+        send = mock.Mock(side_effect=serverError(500))
+        self.assertRaises(ServerError, chunker.run, 100, 12, send)
+        self.assertEqual(send.call_count, 1)
+
+    def test_deviceMetrics(self):
+        chunker = AdaptiveChunker(initial_bytes=1200, min_bytes=12)
+        device = sensorcloud.Device("FAKE", "fake", chunker=chunker)
+        self.assertTrue(device.upload_chunker is chunker)
+
+        chunker.run(250, 12, lambda s, e: None)
+        metrics = device.upload_metrics()
+        self.assertEqual(metrics.points, 250)
+        self.assertEqual(metrics.uploads, 2)
+        self.assertEqual(metrics.last_chunk_points, 150)
+        self.assertTrue(metrics.chunk_bytes > 1200)
@@ -0,0 +1,99 @@
+import unittest
+import tempfile
+import os
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.csvdownload import selector_ts, time_slices
+
+from helpers import *
+
+class TestSelectors(unittest.TestCase):
+
+    def test_selectorTs(self):
+        self.assertEqual(selector_ts([("sensor_1", "ch1"), "sensor_1:ch2", "sensor_2(ch1)", "sensor_1:ch1"]),
+                         "sensor_1(ch1,ch2),sensor_2(ch1)")
+
+    def test_timeSlices(self):
+        self.assertEqual(time_slices(0, 25, 10), [(0, 9), (10, 19), (20, 25)])
+        self.assertEqual(time_slices(5, 5, 10), [(5, 5)])
+
+class TestExportCsv(unittest.TestCase):
+
+    def test_exportSlicesJoinedInOrder(self):
+        def fakeRequest(method, url, options):
+            if "/authenticate/" in url:
+                return authRequest()
+            start = int(options.queryParams["startTime"])
+            self.assertEqual(options.queryParams["selector_ts"], "sensor(ch1,ch2)")
+            options.responseSink("Timestamp,sensor:ch1,sensor:ch2\n")
+            options.responseSink("%d,1.0," % start)
+            options.responseSink("2.0\n")
+            return ok()
+
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=fakeRequest)
+
+        progress = []
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            device = sensorcloud.Device("FAKE", "fake")
+            result = device.export_csv(["sensor:ch1", "sensor:ch2"], 0, 29, path, slice_nanoseconds=10, parallel=3,
+                                       progress=progress.append)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), "Timestamp,sensor:ch1,sensor:ch2\n0,1.0,2.0\n10,1.0,2.0\n20,1.0,2.0\n")
+        finally:
+            os.unlink(path)
+
+        self.assertEqual(result.slices_total, 3)
+        self.assertEqual(result.slices_done, 3)
+        self.assertEqual(result.bytes, 3 * len("Timestamp,sensor:ch1,sensor:ch2\n") + len("0,1.0,2.0\n10,1.0,2.0\n20,1.0,2.0\n"))
+        self.assertTrue(progress)
+
+class TestCsvColumns(unittest.TestCase):
+
+    def test_parseBlocks(self):
+        import numpy as np
+        from sensorcloud.csvcolumns import CsvColumnParser, join_blocks
+
+        parser = CsvColumnParser(nan="excel", block_size=16)
+        blocks = []
+        for data in ["Timestamp, s:a, s:b\r\n1388534400000000001,1.5,", "#N/A\r\n13885344000", "00000002,,2.5\r\n", "3,4,5"]:
+            blocks.extend(parser.feed(data))
+        blocks.extend(parser.close())
+        columns = join_blocks(parser.selectors, blocks)
+
+        self.assertEqual(columns.selectors, ["s:a", "s:b"])
+        self.assertEqual(list(columns.timestamps), [1388534400000000001, 1388534400000000002, 3])
+        self.assertEqual(columns.column("s:a")[0], 1.5)
+        self.assertTrue(np.isnan(columns.column("s:a")[1]))
+        self.assertTrue(np.isnan(columns.column("s:b")[0]))
+        self.assertEqual(list(columns.column("s:b")[1:]), [2.5, 5.0])
+
+    def test_unevenRows(self):
+        from StringIO import StringIO
+        from sensorcloud import csvcolumns
+
+        # a short line next to a long one has the right number of fields in total, but isn't valid
+        self.assertRaises(sensorcloud.Error, csvcolumns.load, StringIO("time,s:a,s:b\n1,10\n2,20,30,40\n"))
+
+        # blank lines are skipped
+        columns = csvcolumns.load(StringIO("time,s:a,s:b\n1,10,20\n\n2,30,40\n\n"))
+        self.assertEqual(list(columns.timestamps), [1, 2])
+        self.assertEqual(columns.values.tolist(), [[10, 20], [30, 40]])
+
+    def test_csvColumnsFromDevice(self):
+        def fakeRequest(method, url, options):
+            if "/authenticate/" in url:
+                return authRequest()
+            start = int(options.queryParams["startTime"])
+            options.responseSink("Timestamp,sensor:ch1\n%d,1.0\n" % start)
+            return ok()
+
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=fakeRequest)
+
+        device = sensorcloud.Device("FAKE", "fake")
+        columns = device.csv_columns(["sensor:ch1"], 10, 20)
+        self.assertEqual(list(columns.timestamps), [10])
+        self.assertEqual(list(columns.column("sensor:ch1")), [1.0])
@@ -0,0 +1,118 @@
+import unittest
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.follow import Follower, follow
+
+from helpers import *
+
+def timeseries(*timestamps):
+    return [(t, float(t)) for t in timestamps]
+
+class TestFollower(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTimeseriesServer()
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=self.server)
+        self.device = sensorcloud.Device("FAKE", "fake")
+        self.channel = self.device.sensor("sensor").channel("ch1")
+
+    def test_latestPoint(self):
+        self.assertEqual(self.channel.latest_point(), None)
+        self.server.add("ch1", timeseries(10, 20))
+        self.assertEqual(self.channel.latest_point(), sensorcloud.Point(20, 20.0))
+
+    def test_pollBacksOff(self):
+        self.server.add("ch1", timeseries(10, 20))
+        follower = Follower(self.channel, min_interval=1.0, max_interval=5.0)
+
+        # the points that were already there aren't new
+        self.assertEqual(len(follower.poll()), 0)
+        self.assertEqual(follower.last_seen, 20)
+        self.assertEqual(len(follower.poll()), 0)
+        self.assertEqual(len(follower.poll()), 0)
+        self.assertEqual(follower.interval, 5.0)
+
+        self.server.add("ch1", timeseries(30, 40))
+        self.assertEqual(follower.poll(), sensorcloud.PointBlock([30, 40], [30.0, 40.0]))
+        self.assertEqual(follower.interval, 1.0)
+        # only the range after the last seen point is downloaded
+        self.assertEqual(self.server.downloads[-1], ("ch1", 21))
+
+    def test_followSince(self):
+        self.server.add("ch1", timeseries(10, 20, 30))
+        sleeps = []
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                self.server.add("ch1", timeseries(40))
+
+        points = follow(Follower(self.channel, since=15, min_interval=0.5), sleep)
+        self.assertEqual([next(points) for _ in range(3)],
+                         [sensorcloud.Point(20, 20.0), sensorcloud.Point(30, 30.0), sensorcloud.Point(40, 40.0)])
+        self.assertEqual(sleeps, [0.5, 1.0])
+
+class TestFollowMany(unittest.TestCase):
+
+    def test_followMany(self):
+        server = FakeTimeseriesServer()
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=server)
+        device = sensorcloud.Device("FAKE", "fake")
+        for name in ["a", "b", "c"]:
+            server.add(name, timeseries(10))
+
+        scheduler = device.follow_many(["sensor:a", "sensor:b", "sensor:c"], since=5, workers=2,
+                                       min_interval=0.001, max_interval=0.01)
+        seen = {}
+        for channel, block in scheduler:
+            seen.setdefault(channel.name, []).extend(block.timestamps)
+            if channel.name == "a" and seen["a"] == [10]:
+                server.add("a", timeseries(20))
+            if len(seen) == 3 and seen["a"] == [10, 20]:
+                scheduler.close()
+
+        self.assertEqual(seen, {"a": [10, 20], "b": [10], "c": [10]})
+
+    def test_failedPollRetried(self):
+        server = FakeTimeseriesServer()
+        failures = []
+        def flaky(method, url, options):
+            # the first poll of channel a fails
+            if "/a/" in url and not failures:
+                failures.append(url)
+                response = Mock()
+                response.status_code = 500
+                return response
+            return server(method, url, options)
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=flaky)
+        device = sensorcloud.Device("FAKE", "fake")
+        for name in ["a", "b"]:
+            server.add(name, timeseries(10))
+
+        scheduler = device.follow_many(["sensor:a", "sensor:b"], since=5, workers=1, min_interval=0.001,
+                                       max_interval=0.2)
+        self.assertEqual(scheduler.followers[0].channel.name, "a")
+        seen = []
+        for channel, block in scheduler:
+            seen.append(channel.name)
+            if channel.name == "b":
+                # b is delivered while a waits to be polled again
+                self.assertEqual(scheduler.followers[0].interval, 0.2)
+            if len(seen) == 2:
+                scheduler.close()
+
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(seen, ["b", "a"])
+
+    def test_errorStopsFollowing(self):
+        def unauthorized(method, url, options):
+            if url.endswith("/authenticate/"):
+                return authRequest()
+            response = Mock()
+            response.status_code = 401
+            return response
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=unauthorized)
+        device = sensorcloud.Device("FAKE", "fake")
+
+        self.assertRaises(sensorcloud.UnauthorizedError, list, device.follow_many(["sensor:a"], workers=1))
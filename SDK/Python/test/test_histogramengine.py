@@ -0,0 +1,80 @@
+import unittest
+import xdrlib
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.partition import PartitionIndex
+
+from helpers import *
+
+SECOND = 1000000000
+
+class TestHistogramEngine(unittest.TestCase):
+
+    def engine(self, **kwargs):
+        from sensorcloud.histogramengine import HistogramEngine
+        return HistogramEngine(sensorcloud.SampleRate.hertz(1), 0.0, 1.0, 4, **kwargs)
+
+    def test_binning(self):
+        engine = self.engine()
+        batch = engine.push([0, SECOND // 2, SECOND, SECOND + 1, 3 * SECOND], [0.5, 3.9, 1.0, 7.0, 2.0])
+
+        # the last interval stays open
+        self.assertEqual(batch.timestamps.tolist(), [0, SECOND])
+        self.assertEqual(batch.counts.tolist(), [[1, 0, 0, 1], [0, 1, 0, 0]])
+
+        batch = engine.push([3 * SECOND + 5, 4 * SECOND], [2.5, 0.0])
+        self.assertEqual(batch.timestamps.tolist(), [3 * SECOND])
+        self.assertEqual(batch.counts.tolist(), [[0, 0, 2, 0]])
+
+        batch = engine.flush()
+        self.assertEqual(batch.timestamps.tolist(), [4 * SECOND])
+        self.assertEqual(len(engine.flush().timestamps), 0)
+
+    def test_clip(self):
+        engine = self.engine(clip=True)
+        engine.push([0, 1, 2], [-5.0, 7.0, 1.5])
+        self.assertEqual(engine.flush().counts.tolist(), [[1, 1, 0, 1]])
+
+    def test_outOfOrder(self):
+        engine = self.engine()
+        engine.push([5 * SECOND], [1.0])
+        self.assertRaises(ValueError, engine.push, [SECOND], [1.0])
+
+    def test_intervalsAtNonIntegerRate(self):
+        from sensorcloud.histogramengine import HistogramEngine
+        rate = sensorcloud.SampleRate.hertz(3)
+        engine = HistogramEngine(rate, 0.0, 1.0, 1)
+        timestamps = rate.timestamps(10 * SECOND, 0, 7)
+        starts = engine.push(timestamps, [0.5] * 7).timestamps.tolist() + engine.flush().timestamps.tolist()
+        # every sample falls at the start of its own interval
+        self.assertEqual(starts, list(timestamps))
+
+    def test_uploadArrays(self):
+        request = Mock()
+        request.side_effect = [authRequest(), created()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        channel = device.sensor("sensor").channel("channel")
+        channel._timeseries_partitions = PartitionIndex()
+        channel._histogram_partitions = PartitionIndex()
+
+        engine = self.engine()
+        batch = engine.push([0, SECOND, 2 * SECOND], [0.5, 1.5, 1.5])
+        channel.histogram_append_arrays(sensorcloud.SampleRate.hertz(1), *batch)
+
+        unpacker = xdrlib.Unpacker(requestBody(mockCallArg(request.mock_calls[1], 2, "options")))
+        unpacker.unpack_int()
+        unpacker.unpack_int()
+        unpacker.unpack_int()
+        self.assertEqual(unpacker.unpack_float(), 0.0)
+        self.assertEqual(unpacker.unpack_float(), 1.0)
+        self.assertEqual(unpacker.unpack_uint(), 4)
+        self.assertEqual(unpacker.unpack_int(), 2)
+        self.assertEqual([unpacker.unpack_uhyper()] + [unpacker.unpack_uint() for _ in range(4)], [0, 1, 0, 0, 0])
+        self.assertEqual([unpacker.unpack_uhyper()] + [unpacker.unpack_uint() for _ in range(4)], [SECOND, 0, 1, 0, 0])
+
+        self.assertEqual(channel.last_histogram_timestamp(), SECOND)
+        self.assertEqual(channel.last_histogram.bins, [0, 1, 0, 0])
@@ -0,0 +1,193 @@
+import unittest
+import tempfile
+import shutil
+import threading
+import os
+
+import mock
+import numpy as np
+
+import sensorcloud
+from sensorcloud.partition import PartitionIndex
+
+from helpers import *
+
+class TestImporter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lock = threading.Lock()
+        self.uploads = []
+
+        def upload(method, url, options):
+            if url.endswith("/authenticate/"):
+                return authRequest()
+            with self.lock:
+                self.uploads.append((url.split("/")[-5], requestBody(options)))
+            return created()
+        sensorcloud.webrequest.Requests.Request = mock.Mock(side_effect=upload)
+
+        self.device = sensorcloud.Device("FAKE", "fake")
+        for name in ["ch1", "ch2", "raw", "values"]:
+            self.device.sensor("sensor").channel(name)._timeseries_partitions = PartitionIndex()
+            self.device.sensor("sensor").channel(name)._histogram_partitions = PartitionIndex()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def uploaded(self, channel):
+        # the points of each upload, after the version, sample rate and count
+        return "".join(body[16:] for name, body in sorted(self.uploads) if name == channel)
+
+    def test_importFiles(self):
+        from sensorcloud.importer import BulkImporter
+
+        rate = sensorcloud.SampleRate.hertz(10)
+        timestamps = rate.timestamps(1400000000 * 10 ** 9, 0, 5)
+
+        with open(self.path("data.csv"), "wb") as f:
+            f.write("Timestamp,sensor:ch1,sensor:ch2\n")
+            for i, timestamp in enumerate(timestamps):
+                f.write("%d,%d,%s\n" % (timestamp, i, "" if i == 2 else "2.5"))
+
+        np.savez(self.path("data.npz"), timestamps=np.array(timestamps, dtype=np.uint64),
+                 values=np.arange(5, dtype=np.float32))
+
+        raw = sensorcloud.PointBlock(timestamps, [1.0] * 5).to_xdr()
+        with open(self.path("data.xdr"), "wb") as f:
+            f.write(raw)
+
+        reports = []
+        importer = BulkImporter(self.device, jobs=0, uploads=2, progress=reports.append)
+        importer.run([self.path("data.csv")])
+
+        importer = BulkImporter(self.device, channel="sensor:values", sample_rate=rate, jobs=0, uploads=2)
+        importer.run([self.path("data.npz")])
+
+        importer = BulkImporter(self.device, channel="sensor:raw", sample_rate=rate, jobs=0, uploads=2)
+        progress = importer.run([self.path("data.xdr")])
+
+        self.assertEqual(self.uploaded("ch1"), sensorcloud.PointBlock(timestamps, [0.0, 1.0, 2.0, 3.0, 4.0]).to_xdr())
+        # the missing value isn't uploaded
+        self.assertEqual(self.uploaded("ch2"),
+                         sensorcloud.PointBlock(timestamps[:2] + timestamps[3:], [2.5] * 4).to_xdr())
+        self.assertEqual(self.uploaded("values"), sensorcloud.PointBlock(timestamps, range(5)).to_xdr())
+        self.assertEqual(self.uploaded("raw"), raw)
+
+        self.assertEqual(reports[-1].files_done, 1)
+        self.assertEqual(reports[-1].points, 9)
+        self.assertEqual(progress.files_done, 1)
+        self.assertEqual(progress.bytes, len(raw))
+
+    def test_checkpoint(self):
+        from sensorcloud.importer import BulkImporter
+
+        rate = sensorcloud.SampleRate.hertz(10)
+        for i in range(3):
+            np.save(self.path("%d.npy" % i), np.array([[i * 10 ** 9, 1.0], [i * 10 ** 9 + 10 ** 8, 2.0]]))
+        paths = [self.path("%d.npy" % i) for i in range(3)]
+        checkpoint = self.path("checkpoint.json")
+
+        BulkImporter(self.device, "sensor:values", rate, jobs=0, checkpoint=checkpoint).run(paths[:2])
+        self.assertEqual(len(self.uploads), 2)
+
+        # the files that were imported are skipped, unless they've changed
+        np.save(paths[0], np.array([[5 * 10 ** 9, 3.0]]))
+        progress = BulkImporter(self.device, "sensor:values", rate, jobs=0, checkpoint=checkpoint).run(paths)
+        self.assertEqual(progress.files_total, 2)
+        self.assertEqual(len(self.uploads), 4)
+
+    def test_resumePieces(self):
+        from sensorcloud.importer import BulkImporter
+
+        # two runs at different rates, so the file is parsed into two pieces
+        timestamps = [i * 10 ** 8 for i in range(10)] + [i * 10 ** 9 for i in range(2, 12)]
+        np.save(self.path("data.npy"), np.array([timestamps, range(len(timestamps))], dtype=np.float64).T)
+        checkpoint = self.path("checkpoint.json")
+
+        upload = sensorcloud.webrequest.Requests.Request.side_effect
+        def failSecond(method, url, options):
+            if method == "POST" and len(self.uploads) == 1:
+                response = mock.Mock()
+                response.status_code = 500
+                return response
+            return upload(method, url, options)
+        sensorcloud.webrequest.Requests.Request = mock.Mock(side_effect=failSecond)
+
+        importer = BulkImporter(self.device, "sensor:values", jobs=0, uploads=1, checkpoint=checkpoint)
+        self.assertRaises(sensorcloud.ServerError, importer.run, [self.path("data.npy")])
+        self.assertEqual(len(self.uploads), 1)
+
+        # only the piece that failed is uploaded again
+        sensorcloud.webrequest.Requests.Request = mock.Mock(side_effect=upload)
+        BulkImporter(self.device, "sensor:values", jobs=0, uploads=1, checkpoint=checkpoint).run([self.path("data.npy")])
+        self.assertEqual(len(self.uploads), 2)
+        self.assertEqual([body[16:] for _, body in self.uploads],
+                         [sensorcloud.PointBlock(timestamps[:10], range(10)).to_xdr(),
+                          sensorcloud.PointBlock(timestamps[10:], range(10, 20)).to_xdr()])
+
+    def test_parseWindow(self):
+        from sensorcloud import importer
+
+        rate = sensorcloud.SampleRate.hertz(10)
+        paths = []
+        for i in range(6):
+            paths.append(self.path("%d.npy" % i))
+            np.save(paths[-1], np.array([[i * 10 ** 9, 1.0]]))
+
+        # the uploads that had finished when each file was parsed
+        finished = []
+        parse_file = importer.parse_file
+        def parse(task):
+            with self.lock:
+                finished.append(len(self.uploads))
+            return parse_file(task)
+
+        with mock.patch.object(importer, "parse_file", parse):
+            importer.BulkImporter(self.device, "sensor:values", rate, jobs=0, uploads=1).run(paths)
+
+        # at most two files, one per slot of the window, are parsed ahead of the uploads
+        self.assertEqual(len(finished), 6)
+        for i, uploads in enumerate(finished):
+            self.assertTrue(uploads >= i - 2, finished)
+
+    def test_missingChannel(self):
+        from sensorcloud.importer import parse_file
+
+        np.save(self.path("data.npy"), np.zeros((2, 2)))
+        self.assertRaises(ValueError, parse_file, (self.path("data.npy"), None, None))
+        self.assertRaises(ValueError, parse_file, (self.path("data.xdr"), "sensor:raw", None))
+
+    def test_detectRates(self):
+        from sensorcloud.importer import parse_file
+
+        timestamps = [i * 10 ** 8 for i in range(10)] + [i * 10 ** 9 for i in range(2, 12)]
+        np.save(self.path("data.npy"), np.array([timestamps, range(len(timestamps))], dtype=np.float64).T)
+        pieces = parse_file((self.path("data.npy"), "sensor:values", None))
+        self.assertEqual([(piece.sample_rate, piece.points) for piece in pieces],
+                         [(sensorcloud.SampleRate.hertz(10), 10), (sensorcloud.SampleRate.hertz(1), 10)])
+
+class TestCli(unittest.TestCase):
+
+    def test_sampleRate(self):
+        from sensorcloud.cli import _sample_rate
+        import argparse
+
+        self.assertEqual(_sample_rate("10 hertz"), sensorcloud.SampleRate.hertz(10))
+        self.assertEqual(_sample_rate("30-seconds"), sensorcloud.SampleRate.seconds(30))
+        self.assertEqual(_sample_rate("detect"), None)
+        self.assertRaises(argparse.ArgumentTypeError, _sample_rate, "often")
+
+    def test_import(self):
+        from sensorcloud import cli
+
+        with mock.patch.object(cli, "BulkImporter") as importer:
+            cli.main(["import", "--device", "FAKE", "--key", "fake", "--channel", "s:c", "--sample-rate", "5 hertz",
+                      "--jobs", "2", "--quiet", "a.npy", "b.npy"])
+        self.assertEqual(importer.call_args[1]["channel"], "s:c")
+        self.assertEqual(importer.call_args[1]["sample_rate"], sensorcloud.SampleRate.hertz(5))
+        self.assertEqual(importer.call_args[1]["jobs"], 2)
+        importer.return_value.run.assert_called_with(["a.npy", "b.npy"])
@@ -0,0 +1,93 @@
+import unittest
+import tempfile
+import os
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.partition import PartitionIndex
+
+from helpers import *
+
+class TestMaterializer(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        os.unlink(self.path)
+
+        self.server = FakeTimeseriesServer({"value": [(t, float(t)) for t in range(10, 60, 10)]}, page_size=10,
+                                           rates={"value": sensorcloud.SampleRate.hertz(10)})
+        self.fail_upload = None
+
+        def serve(method, url, options):
+            # the upload after fail_upload uploads have gone through fails once
+            if method == "POST" and self.fail_upload == len(self.server.uploads):
+                self.fail_upload = None
+                response = Mock()
+                response.status_code = 500
+                return response
+            return self.server(method, url, options)
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=serve)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def materializer(self):
+        device = sensorcloud.Device("FAKE", "fake", cache_file=self.path)
+        target = device.sensor("sensor").channel("delta")
+        target._timeseries_partitions = PartitionIndex()
+        target._histogram_partitions = PartitionIndex()
+
+        def delta():
+            # the change from the point before, the first point of each run has nothing before it
+            previous = []
+            def stage(sample_rate, block):
+                timestamps, values = block.to_numpy()
+                before = previous + list(values[:-1])
+                del previous[:]
+                previous.append(values[-1])
+                return sensorcloud.PointBlock(block.timestamps[-len(before):],
+                                              [v - b for v, b in zip(values[-len(before):], before)])
+            return [stage]
+
+        return sensorcloud.Materializer(device, "delta", "sensor:value", target, delta, lookback=10)
+
+    def test_incrementalRuns(self):
+        result = self.materializer().run()
+        self.assertEqual(result, (1, 5, 4))
+        self.assertEqual(self.server.uploaded("delta"), sensorcloud.PointBlock([20, 30, 40, 50], [10.0] * 4))
+
+        # nothing new, nothing is read
+        del self.server.uploads[:]
+        del self.server.downloads[:]
+        self.assertEqual(self.materializer().run(), (0, 0, 0))
+        self.assertEqual(self.server.starts(), [])
+
+        # only the new data and the lookback are read, and only new output is written
+        self.server.add("value", [(60, 70.0), (70, 70.0)])
+        result = self.materializer().run()
+        self.assertEqual(self.server.starts("value")[0], 41)
+        self.assertEqual(result, (1, 3, 2))
+        self.assertEqual(self.server.uploaded("delta"), sensorcloud.PointBlock([60, 70], [20.0, 0.0]))
+
+        checkpoint = self.materializer().checkpoint(sensorcloud.SampleRate.hertz(10))
+        self.assertEqual((checkpoint.source_timestamp, checkpoint.output_timestamp), (70, 70))
+
+    def test_resumeAfterFailedUpload(self):
+        self.server.data["value"] = [(t, float(t)) for t in range(10, 260, 10)]
+        self.fail_upload = 1
+        self.assertRaises(sensorcloud.ServerError, self.materializer().run)
+        self.assertEqual(len(self.server.uploads), 1)
+        checkpoint = self.materializer().checkpoint(sensorcloud.SampleRate.hertz(10))
+        self.assertEqual((checkpoint.source_timestamp, checkpoint.output_timestamp), (100, 100))
+
+        # the first page was saved in the checkpoint, it isn't written again
+        self.materializer().run()
+        timestamps = list(self.server.uploaded("delta").timestamps)
+        self.assertEqual(timestamps, range(20, 260, 10))
+
+    def test_needsCache(self):
+        device = sensorcloud.Device("FAKE", "fake")
+        self.assertRaises(sensorcloud.Error, sensorcloud.Materializer, device, "job", "s:a", "s:b", list)
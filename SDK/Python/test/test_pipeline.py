@@ -0,0 +1,91 @@
+import unittest
+import math
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.pipeline import Pipeline, Scale, Biquad, Expression
+from sensorcloud.partition import PartitionIndex
+
+from helpers import *
+
+def pages(*blocks):
+    rate = sensorcloud.SampleRate.hertz(1000)
+    return lambda: ((rate, block) for block in blocks)
+
+class TestStages(unittest.TestCase):
+
+    def test_scaleAndExpression(self):
+        block = sensorcloud.PointBlock([1, 2, 3], [1.0, -2.0, 4.0])
+        pipeline = Pipeline(pages(block)).pipe(Scale(2.0, 1.0)).pipe(Expression("np.abs(x) + t"))
+        self.assertEqual(pipeline.to_block(), sensorcloud.PointBlock([1, 2, 3], [4.0, 5.0, 12.0]))
+
+        pipeline = Pipeline(pages(block)).pipe(Expression(lambda t, x: x[:-1]))
+        self.assertRaises(ValueError, pipeline.to_block)
+
+    def test_biquadStateCarriesAcrossPages(self):
+        values = [math.sin(2 * math.pi * 60 * i / 1000.0) + math.sin(2 * math.pi * 5 * i / 1000.0) for i in range(2000)]
+        block = sensorcloud.PointBlock(range(2000), values)
+
+        whole = Pipeline(pages(block)).pipe(Biquad.notch(60, sensorcloud.SampleRate.hertz(1000))).to_block()
+        split = Pipeline(pages(block[:333], block[333:1000], block[1000:])).pipe(Biquad.notch(60, 1000)).to_block()
+        self.assertEqual(list(whole.values), list(split.values))
+
+        # once the filter settles the 60 Hz tone is gone and the 5 Hz tone is left
+        for i in range(1500, 2000):
+            self.assertAlmostEqual(split.values[i], math.sin(2 * math.pi * 5 * i / 1000.0), places=1)
+
+    def test_biquadResetsAcrossRatesAndGaps(self):
+        hz1000 = sensorcloud.SampleRate.hertz(1000)
+        hz500 = sensorcloud.SampleRate.hertz(500)
+        first = sensorcloud.PointBlock([i * 10 ** 6 for i in range(100)], [1.0] * 100)
+        second = sensorcloud.PointBlock([10 ** 9 + i * 2 * 10 ** 6 for i in range(100)], [1.0] * 100)
+
+        def filtered(*pages):
+            return list(Pipeline(lambda: iter(pages)).pipe(Biquad.lowpass(10, 1000)).blocks())[-1]
+
+        # a new rate starts the filter over
+        self.assertEqual(filtered((hz1000, first), (hz500, second)), filtered((hz500, second)))
+        # so does a gap in the data
+        self.assertEqual(filtered((hz1000, first), (hz1000, second)), filtered((hz1000, second)))
+        # a page that follows on keeps the state
+        third = sensorcloud.PointBlock([10 ** 8 + i * 10 ** 6 for i in range(100)], [1.0] * 100)
+        self.assertNotEqual(filtered((hz1000, first), (hz1000, third)), filtered((hz1000, third)))
+
+class TestToChannel(unittest.TestCase):
+
+    def test_pipeToChannel(self):
+        rate = sensorcloud.SampleRate.hertz(10)
+        server = FakeTimeseriesServer({"raw": [(t, float(t)) for t in range(1, 7)]}, page_size=2)
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=server)
+
+        device = sensorcloud.Device("FAKE", "fake")
+        target = device.sensor("sensor").channel("scaled")
+        target._timeseries_partitions = PartitionIndex()
+        target._histogram_partitions = PartitionIndex()
+
+        source = device.sensor("sensor").channel("raw")
+        count = source.timeseries_data(start=1, end=6, samplerate=rate).pipe(Scale(10.0)).to_channel(target)
+
+        self.assertEqual(count, 6)
+        self.assertEqual([name for name, _, _ in server.uploads], ["scaled"] * 3)
+        self.assertTrue(all(thread == "pipeline upload" for _, _, thread in server.uploads))
+        self.assertEqual(server.uploaded("scaled"), sensorcloud.PointBlock(range(1, 7), [t * 10.0 for t in range(1, 7)]))
+        self.assertEqual(target.last_timestamp_nanoseconds, 6)
+
+    def test_uploadFailure(self):
+        def serve(method, url, options):
+            if url.endswith("/authenticate/"):
+                return authRequest()
+            response = Mock()
+            response.status_code = 500
+            return response
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=serve)
+
+        device = sensorcloud.Device("FAKE", "fake")
+        target = device.sensor("sensor").channel("out")
+        target._timeseries_partitions = PartitionIndex()
+        target._histogram_partitions = PartitionIndex()
+
+        pipeline = Pipeline(pages(sensorcloud.PointBlock([1], [1.0]), sensorcloud.PointBlock([2], [2.0])))
+        self.assertRaises(sensorcloud.ServerError, pipeline.to_channel, target)
@@ -0,0 +1,63 @@
+import unittest
+import xdrlib
+
+import sensorcloud
+from sensorcloud import Point, PointBlock
+
+class TestPointBlock(unittest.TestCase):
+
+    def test_xdrMatchesPacker(self):
+        points = [Point(1388534400000000000 + i, i * 0.5) for i in range(100)]
+        packer = xdrlib.Packer()
+        for point in points:
+            packer.pack_uhyper(point.timestamp_nanoseconds)
+            packer.pack_float(point.value)
+
+        block = PointBlock.from_points(points)
+        self.assertEqual(block.to_xdr(), packer.get_buffer())
+        self.assertEqual(PointBlock.from_xdr(packer.get_buffer()), block)
+        self.assertEqual(list(block), points)
+
+    def test_slicing(self):
+        block = PointBlock([10, 20, 30, 40], [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(len(block), 4)
+        self.assertEqual(block[-1], Point(40, 4.0))
+        self.assertEqual(block[1:3], PointBlock([20, 30], [2.0, 3.0]))
+        self.assertEqual(block.between(15, 30), PointBlock([20, 30], [2.0, 3.0]))
+        self.assertEqual(block.first_timestamp, 10)
+        self.assertEqual(block.last_timestamp, 40)
+        self.assertEqual(PointBlock.concat([block[:1], block[1:]]), block)
+        self.assertEqual(len(PointBlock.from_xdr("")), 0)
+
+class TestSampleRateTimestamps(unittest.TestCase):
+
+    def test_noDrift(self):
+        rate = sensorcloud.SampleRate.hertz(3)
+        self.assertEqual(list(rate.timestamps(5, 0, 4)), [5, 333333338, 666666671, 1000000005])
+        self.assertEqual(list(rate.timestamps(0, 3000000000, 1)), [1000000000000000000])
+        self.assertEqual(list(sensorcloud.SampleRate.seconds(2).timestamps(0, 1, 2)), [2000000000, 4000000000])
+
+    def test_withoutLongArrays(self):
+        # platforms without a 64 bit array type keep the timestamps in a TimestampList
+        import mock
+        import numpy as np
+        from sensorcloud import point
+
+        timestamps = [1388534400000000000 + i for i in range(10)]
+        xdr = PointBlock(timestamps, range(10)).to_xdr()
+        with mock.patch.object(point, "TIMESTAMP_TYPECODE", None):
+            block = PointBlock.from_xdr(xdr)
+            self.assertTrue(isinstance(block.timestamps, point.TimestampList))
+            self.assertEqual(list(block.timestamps), timestamps)
+            self.assertEqual(block.to_xdr(), xdr)
+            self.assertEqual(list(block[2:4].timestamps), timestamps[2:4])
+            self.assertTrue(isinstance(block[2:4].timestamps, point.TimestampList))
+            self.assertEqual(len(PointBlock.concat([block, block])), 20)
+            self.assertEqual(list(block.to_numpy()[0]), timestamps)
+            self.assertEqual(list(PointBlock(np.array(timestamps, dtype=np.uint64), range(10)).timestamps), timestamps)
+            self.assertEqual(list(sensorcloud.SampleRate.hertz(1).timestamps(0, 0, 3)), [0, 10 ** 9, 2 * 10 ** 9])
+
+            from sensorcloud.ringbuffer import RingBuffer
+            ring = RingBuffer(4)
+            ring.extend(block)
+            self.assertEqual(list(ring.tail().timestamps), timestamps[-4:])
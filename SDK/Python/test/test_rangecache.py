@@ -0,0 +1,129 @@
+import unittest
+import xdrlib
+import tempfile
+import shutil
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.rangecache import RangeCacheEntry
+
+from helpers import *
+
+def tsPartitions(end_time):
+    packer = xdrlib.Packer()
+    packer.pack_int(1)
+    packer.pack_int(1)
+    packer.pack_uhyper(0)
+    packer.pack_uhyper(end_time)
+    packer.pack_int(15)
+    packer.pack_int(5000)
+    packer.pack_int(1)
+    packer.pack_int(10)
+    packer.pack_int(1)
+    packer.pack_int(1)
+    packer.pack_uhyper(end_time)
+    packer.pack_float(10.5)
+    response = ok()
+    response.raw = packer.get_buffer()
+    return response
+
+def points(*data):
+    packer = xdrlib.Packer()
+    for timestamp, value in data:
+        packer.pack_uhyper(timestamp)
+        packer.pack_float(value)
+    response = ok()
+    response.raw = packer.get_buffer()
+    return response
+
+class TestRangeCacheEntry(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_missing(self):
+        entry = RangeCacheEntry(self.path)
+        self.assertEqual(entry.missing(0, 100), [(0, 100)])
+
+        entry.store(10, 19, [10, 15], [1.0, 2.0])
+        entry.store(20, 29, [], [])
+        entry.store(50, 59, [55], [3.0])
+        self.assertEqual(entry.covered(), [(10, 29), (50, 59)])
+        self.assertEqual(entry.missing(0, 100), [(0, 9), (30, 49), (60, 100)])
+        self.assertEqual(entry.missing(12, 52), [(30, 49)])
+        self.assertEqual(entry.missing(20, 25), [])
+        self.assertEqual(entry.segments(15, 55), [(15, 29, True), (30, 49, False), (50, 55, True)])
+
+    def test_storeAndRead(self):
+        entry = RangeCacheEntry(self.path)
+        entry.store(10, 100, [10, 20, 30, 40], [1.0, 2.0, 3.0, 4.0])
+        entry.store(101, 200, [150], [5.0])
+
+        # reload from disk
+        entry = RangeCacheEntry(self.path)
+        timestamps, values = entry.read(20, 150)
+        self.assertEqual(list(timestamps), [20, 30, 40, 150])
+        self.assertEqual(list(values), [2.0, 3.0, 4.0, 5.0])
+
+class TestRangeCachedStream(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_onlyGapsDownloaded(self):
+        request = Mock()
+        request.side_effect = [authRequest(), timeseriesInfo(), tsPartitions(3000), points((1000, 1.5), (2000, 2.5)), points()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake", range_cache_dir=self.path)
+        channel = device.sensor("sensor").channel("channel")
+        data = list(channel.timeseries_data(start=0, end=2500))
+        self.assertEqual(data, [sensorcloud.Point(1000, 1.5), sensorcloud.Point(2000, 2.5)])
+        self.assertEqual(len(request.mock_calls), 5)
+
+        # the range is cached, so only [2501, 3000] needs to be downloaded
+        request.side_effect = [points((3000, 3.5))]
+        data = list(channel.timeseries_data(start=1500, end=3000))
+        self.assertEqual(data, [sensorcloud.Point(2000, 2.5), sensorcloud.Point(3000, 3.5)])
+        self.assertEqual(len(request.mock_calls), 6)
+        self.assertEqual(mockCallArg(request.mock_calls[5], 2, "options").queryParams["starttime"], "2501")
+
+    def test_allRatesCachedToEarliestPartitionEnd(self):
+        from sensorcloud.partition import PartitionIndex, TimeSeriesKey
+
+        request = Mock()
+        request.side_effect = [authRequest(), timeseriesInfo(), points((1000, 1.5)), points(),
+                               points((2000, 2.5)), points()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake", range_cache_dir=self.path)
+        channel = device.sensor("sensor").channel("channel")
+        hz10, hz1 = sensorcloud.SampleRate.hertz(10), sensorcloud.SampleRate.hertz(1)
+        channel._timeseries_partitions = PartitionIndex([
+            (TimeSeriesKey(hz10), {"sample_rate": hz10, "start_time": 0, "end_time": 1500}),
+            (TimeSeriesKey(hz1), {"sample_rate": hz1, "start_time": 0, "end_time": 3000})])
+        self.assertEqual(len(list(channel.timeseries_data(start=0, end=2500))), 2)
+
+        # the 10 hertz partition can still get data after 1500, so only [0, 1500] was cached
+        request.side_effect = [points((1600, 2.0), (2000, 2.5)), points()]
+        data = list(channel.timeseries_data(start=0, end=2500))
+        self.assertEqual([p.timestamp_nanoseconds for p in data], [1000, 1600, 2000])
+        self.assertEqual(mockCallArg(request.mock_calls[6], 2, "options").queryParams["starttime"], "1501")
+
+    def test_cacheHoldsRawValues(self):
+        request = Mock()
+        request.side_effect = [authRequest(), timeseriesInfo(("C", "F", 0, 1.8, 32.0)), tsPartitions(3000),
+                               points((1000, 10.0)), points()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake", range_cache_dir=self.path)
+        channel = device.sensor("sensor").channel("channel")
+        self.assertEqual(list(channel.timeseries_data(start=0, end=2000)), [sensorcloud.Point(1000, 50.0)])
+        self.assertEqual(list(channel.timeseries_data(start=0, end=2000, convertToUnits=False)), [sensorcloud.Point(1000, 10.0)])
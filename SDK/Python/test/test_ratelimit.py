@@ -0,0 +1,131 @@
+import unittest
+import threading
+
+import mock
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.ratelimit import TokenBucket, RateLimiter, UploadScheduler, LIVE, BACKFILL
+
+from helpers import *
+
+def throttled(status=503, code=None):
+    response = Mock()
+    response.status_code = status
+    response.text = '{"errorcode": "%s", "message": ""}' % code
+    response.response_headers = {}
+    return response
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_refill(self):
+        bucket = TokenBucket(10, 20, now=0.0)
+        self.assertEqual(bucket.wait_time(20, 0.0), 0.0)
+        bucket.take(20, 0.0)
+        self.assertAlmostEqual(bucket.wait_time(5, 0.0), 0.5)
+        self.assertEqual(bucket.wait_time(5, 0.5), 0.0)
+
+        # the bucket never holds more than its capacity
+        self.assertAlmostEqual(bucket.wait_time(20, 100.0), 0.0)
+        self.assertEqual(bucket.tokens, 20)
+
+    def test_oversizedRequestGoesIntoDebt(self):
+        bucket = TokenBucket(10, 20, now=0.0)
+        self.assertEqual(bucket.wait_time(50, 0.0), 0.0)
+        bucket.take(50, 0.0)
+        self.assertAlmostEqual(bucket.wait_time(1, 0.0), 3.1)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(None)
+        bucket.take(10 ** 9, 0.0)
+        self.assertEqual(bucket.wait_time(10 ** 9, 0.0), 0.0)
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_backoffAndRecover(self):
+        limiter = RateLimiter(requests_per_second=100, initial_backoff=1.0, max_backoff=3.0, recover=0.25)
+        self.assertEqual(limiter.throttled(), 1.0)
+        self.assertEqual(limiter.throttled(), 2.0)
+        self.assertEqual(limiter.throttled(), 3.0)
+        self.assertEqual(limiter.throttled(retry_after=10), 10)
+        self.assertEqual(limiter.scale, 0.1)
+
+        limiter.success()
+        self.assertAlmostEqual(limiter.scale, 0.35)
+        self.assertEqual(limiter.throttled(), 1.0)
+
+    def test_priorityOrder(self):
+        limiter = RateLimiter()
+        order = []
+        # tokens are taken under the limiter's lock, so that's the order the requests are let through
+        take = limiter._requests.take
+        limiter._requests.take = lambda amount, now: (order.append(threading.current_thread().name), take(amount, now))
+
+        # hold the limiter while the waiters queue up, then let them all through at once
+        limiter._paused_until = float("inf")
+
+        def request(priority):
+            with limiter.priority(priority):
+                limiter.acquire()
+
+        threads = [threading.Thread(target=request, name=name, args=(priority,))
+                   for name, priority in [("backfill1", BACKFILL), ("live", LIVE), ("backfill2", BACKFILL)]]
+        for thread in threads:
+            thread.start()
+        while len(limiter._waiting) < 3:
+            threading.Event().wait(0.001)
+        with limiter._cond:
+            limiter._paused_until = 0.0
+            limiter._cond.notify_all()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order[0], "live")
+        self.assertEqual(sorted(order[1:]), ["backfill1", "backfill2"])
+
+    def test_retryThrottledRequests(self):
+        request = Mock()
+        request.side_effect = [authRequest(), throttled(503), throttled(403, "403-004"), ok()]
+        sensorcloud.webrequest.Requests.Request = request
+
+        limiter = RateLimiter(initial_backoff=0.001)
+        device = sensorcloud.Device("FAKE", "fake", rate_limiter=limiter)
+        self.assertTrue(device.rate_limiter is limiter)
+        response = device.url("/fake/").get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(request.call_count, 4)
+        self.assertEqual(limiter.scale, 0.35)
+
+    def test_quotaErrorNotReauthenticated(self):
+        request = Mock()
+        request.side_effect = [authRequest(), throttled(401, "401-005"), throttled(401, "401-005")]
+        sensorcloud.webrequest.Requests.Request = request
+
+        limiter = RateLimiter(initial_backoff=0.001, max_retries=1)
+        device = sensorcloud.Device("FAKE", "fake", rate_limiter=limiter)
+        response = device.url("/fake/").get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(request.call_count, 3)
+
+class TestUploadScheduler(unittest.TestCase):
+
+    def test_liveBeforeBackfill(self):
+        limiter = RateLimiter()
+        scheduler = UploadScheduler(limiter, workers=1, start=False)
+        order = []
+        run = lambda name: order.append((name, limiter.current_priority()))
+        scheduler.submit(run, BACKFILL, "backfill1")
+        scheduler.submit(run, BACKFILL, "backfill2")
+        job = scheduler.submit(run, LIVE, "live")
+        self.assertEqual(scheduler.pending(), 3)
+
+        scheduler.start()
+        job.wait()
+        scheduler.close()
+        self.assertEqual(order, [("live", LIVE), ("backfill1", BACKFILL), ("backfill2", BACKFILL)])
+
+    def test_jobErrorRaisedOnWait(self):
+        scheduler = UploadScheduler(workers=1)
+        job = scheduler.submit(Mock(side_effect=ValueError("bad")))
+        self.assertRaises(ValueError, job.wait)
+        scheduler.close()
@@ -0,0 +1,112 @@
+import unittest
+
+from mock import Mock, patch
+
+import sensorcloud
+from sensorcloud.ringbuffer import RingBuffer, RingBufferPool
+from sensorcloud.partition import PartitionIndex, TimeSeriesKey
+
+from helpers import *
+
+class TestRingBuffer(unittest.TestCase):
+
+    def test_wrapAround(self):
+        ring = RingBuffer(4)
+        self.assertEqual(ring.peek(), None)
+        self.assertEqual(len(ring.tail()), 0)
+
+        ring.push([1, 2, 3], [1.0, 2.0, 3.0])
+        ring.push([4, 5, 6], [4.0, 5.0, 6.0])
+        self.assertEqual(len(ring), 4)
+        self.assertEqual(ring.tail(), sensorcloud.PointBlock([3, 4, 5, 6], [3.0, 4.0, 5.0, 6.0]))
+        self.assertEqual(ring.tail(2), sensorcloud.PointBlock([5, 6], [5.0, 6.0]))
+        self.assertEqual(ring.tail(10), ring.tail())
+        self.assertEqual(ring.peek(), sensorcloud.Point(6, 6.0))
+        self.assertEqual(ring.peek(4), sensorcloud.Point(3, 3.0))
+        self.assertEqual(ring.peek(5), None)
+
+        # more than the capacity at once keeps the newest
+        ring.push(range(10, 20), [float(i) for i in range(10, 20)])
+        self.assertEqual(list(ring.tail().timestamps), [16, 17, 18, 19])
+
+    def test_olderPointsSkipped(self):
+        ring = RingBuffer(5)
+        ring.extend([sensorcloud.Point(10, 1.0), sensorcloud.Point(20, 2.0)])
+        ring.extend(sensorcloud.PointBlock([5, 20, 30], [0.5, 2.0, 3.0]))
+        self.assertEqual(list(ring.tail().timestamps), [10, 20, 30])
+        self.assertEqual(ring.latest, 30)
+
+        ring.reset(sensorcloud.PointBlock([1, 2], [1.0, 2.0]))
+        self.assertEqual(list(ring.tail().timestamps), [1, 2])
+
+    def test_poolCap(self):
+        pool = RingBufferPool(points_per_channel=10, max_points=25)
+        a = pool.buffer("a")
+        pool.buffer("b")
+        self.assertTrue(pool.buffer("a") is a)
+        self.assertEqual(pool.allocated_points, 20)
+
+        # b is the least recently used, it's dropped to make room for c
+        pool.buffer("c")
+        self.assertEqual(len(pool), 2)
+        self.assertTrue("a" in pool and "b" not in pool)
+        self.assertEqual(pool.get("b"), None)
+        self.assertRaises(ValueError, RingBufferPool, 10, 5)
+
+class TestChannelRingBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.device = sensorcloud.Device("FAKE", "fake", ring_buffers=RingBufferPool(points_per_channel=3))
+        self.channel = self.device.sensor("sensor").channel("channel")
+        self.channel._histogram_partitions = PartitionIndex()
+
+    def test_fillFromUploads(self):
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=[authRequest(), created(), created()])
+        self.channel._timeseries_partitions = PartitionIndex()
+        rate = sensorcloud.SampleRate.hertz(10)
+
+        self.assertEqual(self.channel.peek(), None)
+        self.channel.timeseries_append(rate, [sensorcloud.Point(1, 1.0), sensorcloud.Point(2, 2.0)])
+        self.channel.timeseries_append_blob(rate, sensorcloud.PointBlock([3, 4], [3.0, 4.0]).to_xdr())
+
+        self.assertEqual(self.channel.tail(), sensorcloud.PointBlock([2, 3, 4], [2.0, 3.0, 4.0]))
+        self.assertEqual(self.channel.peek(), sensorcloud.Point(4, 4.0))
+
+    def test_fillFromDetectedRuns(self):
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=[authRequest(), created(), created()])
+        self.channel._timeseries_partitions = PartitionIndex()
+        timestamps = [i * 10 ** 8 for i in range(10)] + [i * 10 ** 9 for i in range(2, 12)]
+        block = sensorcloud.PointBlock(timestamps, range(20))
+
+        extended = []
+        extend = RingBuffer.extend
+        def record(ring, points):
+            extended.append(len(points))
+            extend(ring, points)
+        with patch.object(RingBuffer, "extend", record):
+            self.channel.timeseries_append_detect(block)
+
+        # each run is added to the buffer once
+        self.assertEqual(extended, [10, 10])
+        self.assertEqual(self.channel.tail(), block[-3:])
+
+    def test_fillFromDownload(self):
+        rate = sensorcloud.SampleRate.hertz(10)
+        self.channel._timeseries_partitions = PartitionIndex([(TimeSeriesKey(rate),
+                                                              {"sample_rate": rate, "end_time": 5})])
+
+        def page(*timestamps):
+            response = ok()
+            response.raw = sensorcloud.PointBlock(timestamps, [float(t) for t in timestamps]).to_xdr()
+            return response
+
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=[authRequest(), timeseriesInfo(), page(1, 2),
+                                                                   page(3, 4), page(4, 5), page()])
+
+        # a download that stops before the end of the data doesn't fill the buffer
+        list(self.channel.timeseries_data(start=0, end=4))
+        self.assertEqual(self.channel.peek(), None)
+
+        # a download that reaches the end of the data does
+        list(self.channel.timeseries_data(start=4, end=100))
+        self.assertEqual(self.channel.tail(), sensorcloud.PointBlock([4, 5], [4.0, 5.0]))
@@ -1,10 +1,11 @@
 import unittest
+import xdrlib
 import mock
 from mock import Mock
 
 import sensorcloud
 
-from helpers import authRequest
+from helpers import authRequest, mockCallArg
 
 class TestAutoCreate(unittest.TestCase):
 
@@ -50,3 +51,144 @@ class TestAutoCreate(unittest.TestCase):
             device = sensorcloud.Device("FAKE", "fake")
             sensor = device.sensor("sensor")
             "channel" in sensor
+
+def packChannelInfo(packer, name, units=None):
+    packer.pack_string(name)
+    packer.pack_string(name + " label")
+    packer.pack_string("")
+    if units is None:
+        packer.pack_uint(0)
+        return
+    packer.pack_uint(1)
+    packer.pack_string("TS_V1")
+    packer.pack_int(0)
+    packer.pack_uint(len(units))
+    for stored, preferred, timestamp, slope, offset in units:
+        packer.pack_string(stored)
+        packer.pack_string(preferred)
+        packer.pack_uhyper(timestamp)
+        packer.pack_float(slope)
+        packer.pack_float(offset)
+
+class TestListing(unittest.TestCase):
+
+    def test_allSensors(self):
+        packer = xdrlib.Packer()
+        packer.pack_int(1)
+        packer.pack_uint(1)
+        packer.pack_string("sensor")
+        packer.pack_string("type")
+        packer.pack_string("label")
+        packer.pack_string("description")
+        packer.pack_uint(2)
+        packChannelInfo(packer, "ch1", [("C", "F", 0, 1.8, 32.0)])
+        packChannelInfo(packer, "ch2")
+        sensors = Mock()
+        sensors.status_code = 200
+        sensors.raw = packer.get_buffer()
+
+        request = Mock()
+        request.side_effect = [authRequest(), sensors]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        sensor, = list(device)
+        self.assertEqual(sensor.name, "sensor")
+        self.assertEqual(sensor.label, "label")
+        ch1, ch2 = sorted(sensor._channels.values(), key=lambda c: c.name)
+        self.assertEqual(ch1.label, "ch1 label")
+        self.assertEqual(ch1._units[0].preferred_unit, "F")
+        self.assertTrue(sensor.channel("ch1") is ch1)
+        self.assertTrue(mockCallArg(request.mock_calls[1], 2, "options").headers["Accept-Encoding"] == "gzip")
+
+        # ch2 doesn't have a timeseries stream, so no partitions need to be requested
+        self.assertEqual(ch2.last_timeseries_timestamp(), 0)
+        self.assertEqual(len(request.mock_calls), 2)
+
+    def test_channels(self):
+        packer = xdrlib.Packer()
+        packer.pack_int(1)
+        packer.pack_uint(2)
+        packChannelInfo(packer, "ch1", [])
+        packChannelInfo(packer, "ch2", [])
+        channels = Mock()
+        channels.status_code = 200
+        channels.raw = packer.get_buffer()
+
+        request = Mock()
+        request.side_effect = [authRequest(), channels]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        names = [channel.name for channel in device.sensor("sensor")]
+        self.assertEqual(names, ["ch1", "ch2"])
+        request.assert_has_calls([mock.call('GET', 'https://dsx.sensorcloud.microstrain.com/SensorCloud/devices/FAKE/sensors/sensor/channels/', mock.ANY)])
+
+class TestProvisioning(unittest.TestCase):
+
+    def listing(self):
+        packer = xdrlib.Packer()
+        packer.pack_int(1)
+        packer.pack_uint(1)
+        packer.pack_string("s1")
+        packer.pack_string("")
+        packer.pack_string("")
+        packer.pack_string("")
+        packer.pack_uint(1)
+        packChannelInfo(packer, "a")
+        sensors = Mock()
+        sensors.status_code = 200
+        sensors.raw = packer.get_buffer()
+        return sensors
+
+    def test_ensureChannels(self):
+        calls = []
+        def fakeRequest(method, url, options):
+            if "/authenticate/" in url:
+                return authRequest()
+            calls.append((method, url.split("/devices/FAKE")[1]))
+            if method == "GET":
+                return self.listing()
+            created = Mock()
+            created.status_code = 201
+            return created
+
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=fakeRequest)
+
+        device = sensorcloud.Device("FAKE", "fake")
+        result = device.ensure_channels({"s1": ["a", "b"], "s2": {"c": {"label": "C"}}}, parallel=2)
+
+        self.assertEqual(result.sensors_created, ["s2"])
+        self.assertEqual(sorted(result.channels_created), [("s1", "b"), ("s2", "c")])
+        self.assertEqual(calls[0], ("GET", "/sensors/"))
+        self.assertEqual(sorted(calls[1:]), [("PUT", "/sensors/s1/channels/b/"),
+                                             ("PUT", "/sensors/s2/"),
+                                             ("PUT", "/sensors/s2/channels/c/")])
+
+        # everything is known to exist now, so nothing else goes to the server
+        del calls[:]
+        result = device.ensure_channels(["s1:a", "s1:b", ("s2", "c")])
+        self.assertEqual(result, ([], []))
+        self.assertTrue("b" in device.sensor("s1"))
+        self.assertTrue("s2" in device)
+        self.assertEqual(calls, [])
+
+    def test_createBeforeUploadWhenMissing(self):
+        request = Mock()
+        sensorcloud.webrequest.Requests.Request = request
+
+        created = Mock()
+        created.status_code = 201
+        request.side_effect = [authRequest(), self.listing(), created, created]
+
+        device = sensorcloud.Device("FAKE", "fake")
+        channel = device.sensor("s1").channel("new")
+        list(device)
+
+        # the listing showed the channel doesn't exist, so it's created before the data is sent
+        channel.timeseries_append_blob(sensorcloud.SampleRate.hertz(10), sensorcloud.PointBlock([1], [1.0]).to_xdr())
+        request.assert_has_calls([
+            mock.call('PUT', 'https://dsx.sensorcloud.microstrain.com/SensorCloud/devices/FAKE/sensors/s1/channels/new/', mock.ANY),
+            mock.call('POST', 'https://dsx.sensorcloud.microstrain.com/SensorCloud/devices/FAKE/sensors/s1/channels/new/streams/timeseries/data/', mock.ANY),
+        ])
+        self.assertEqual(len(request.mock_calls), 4)
@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.partition import PartitionIndex
+
+from helpers import *
+
+class TestSpoolEncoding(unittest.TestCase):
+
+    def test_roundTrip(self):
+        from sensorcloud.spool import encode_block, decode_block
+
+        rate = sensorcloud.SampleRate.hertz(10)
+        # irregular timestamps, a gap and a step back in time still round trip exactly
+        block = sensorcloud.PointBlock([1000, 2000, 3001, 3002, 10 ** 18, 5], [1.5, -2.25, 0.0, float("inf"), 3e38, 1e-38])
+        spooled = decode_block(encode_block("sensor", "channel", rate, block))
+        self.assertEqual(spooled.sensor, "sensor")
+        self.assertEqual(spooled.channel, "channel")
+        self.assertTrue(spooled.sample_rate is rate)
+        self.assertEqual(spooled.block, block)
+
+    def test_regularDataShrinks(self):
+        from sensorcloud.spool import encode_block
+
+        rate = sensorcloud.SampleRate.hertz(100)
+        values = [round(i % 200 * 0.05, 2) for i in range(10000)]
+        block = sensorcloud.PointBlock(rate.timestamps(1400000000 * 10 ** 9, 0, len(values)), values)
+        self.assertTrue(len(encode_block("sensor", "channel", rate, block)) * 10 < len(block.to_xdr()))
+
+    def test_transcodeToXdr(self):
+        from sensorcloud.spool import encode_block, transcode_to_xdr
+
+        rate = sensorcloud.SampleRate.seconds(5)
+        block = sensorcloud.PointBlock([5, 10, 15], [1.0, 2.0, 3.0])
+        self.assertEqual(transcode_to_xdr(encode_block("s", "c", rate, block)).block, block.to_xdr())
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_drain(self):
+        from sensorcloud.spool import Spool
+
+        rate = sensorcloud.SampleRate.hertz(10)
+        spool = Spool(self.directory)
+        spool.append("sensor", "a", rate, sensorcloud.PointBlock([1, 2], [1.0, 2.0]))
+        spool.append("sensor", "b", rate, sensorcloud.PointBlock([3], [3.0]))
+        spool.append("sensor", "a", rate, sensorcloud.PointBlock([4], [4.0]))
+        self.assertEqual(len(spool.pending()), 3)
+
+        # a new spool on the same directory keeps adding after the existing blocks
+        last = spool.pending()[-1]
+        self.assertTrue(Spool(self.directory).append("sensor", "b", rate, [sensorcloud.Point(5, 5.0)]) > last)
+
+        uploads = []
+        def upload(method, url, options):
+            if url.endswith("/authenticate/"):
+                return authRequest()
+            uploads.append(url.split("/")[-5])
+            if len(uploads) == 3:
+                response = Mock()
+                response.status_code = 500
+                return response
+            return created()
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=upload)
+
+        device = sensorcloud.Device("FAKE", "fake")
+        for name in ["a", "b"]:
+            device.sensor("sensor").channel(name)._timeseries_partitions = PartitionIndex()
+            device.sensor("sensor").channel(name)._histogram_partitions = PartitionIndex()
+
+        self.assertRaises(sensorcloud.ServerError, spool.drain, device)
+        self.assertEqual(uploads, ["a", "b", "a"])
+        self.assertEqual(len(spool.pending()), 2)
+        self.assertEqual(device.sensor("sensor").channel("b").last_timestamp_nanoseconds, 3)
+
+        self.assertEqual(spool.drain(device), 2)
+        self.assertEqual(spool.pending(), [])
+        self.assertEqual(device.sensor("sensor").channel("b").last_timestamp_nanoseconds, 5)
@@ -0,0 +1,88 @@
+import unittest
+import xdrlib
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.samplerate import HERTZ, SECONDS
+
+from helpers import *
+
+def boundary(packer, rate_type, rate):
+    packer.pack_uhyper(0)
+    packer.pack_enum(rate_type)
+    packer.pack_int(rate)
+
+def point(packer, timestamp, value):
+    packer.pack_uhyper(timestamp)
+    packer.pack_float(value)
+
+def response(packer):
+    r = ok()
+    r.raw = packer.get_buffer()
+    return r
+
+class TestSegments(unittest.TestCase):
+
+    def test_segmentsSplitOnBoundariesAndGaps(self):
+        page1 = xdrlib.Packer()
+        boundary(page1, HERTZ, 3)
+        for i in range(4):
+            point(page1, 1000 + i * 1000000000 // 3, float(i))
+        # a gap, the next point isn't on the grid
+        point(page1, 5000000000, 10.0)
+        point(page1, 5000000000 + 333333333, 11.0)
+        boundary(page1, SECONDS, 2)
+        point(page1, 8000000000, 20.0)
+
+        page2 = xdrlib.Packer()
+        point(page2, 10000000000, 21.0)
+
+        request = Mock()
+        request.side_effect = [authRequest(), timeseriesInfo(), response(page1), response(page2), response(xdrlib.Packer())]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        channel = device.sensor("sensor").channel("channel")
+        segments = list(channel.timeseries_data(start=0, end=20000000000).segments())
+
+        self.assertEqual([(s.sample_rate, s.start, list(s.values)) for s in segments], [
+            (sensorcloud.SampleRate.hertz(3), 1000, [0.0, 1.0, 2.0, 3.0]),
+            (sensorcloud.SampleRate.hertz(3), 5000000000, [10.0, 11.0]),
+            (sensorcloud.SampleRate.seconds(2), 8000000000, [20.0, 21.0]),
+        ])
+        self.assertEqual(segments[0].end, 1000 + 1000000000)
+        self.assertEqual(list(segments[2].timestamps), [8000000000, 10000000000])
+
+        options = mockCallArg(request.mock_calls[2], 2, "options")
+        self.assertEqual(options.queryParams["showSampleRateBoundary"], "true")
+        self.assertEqual(mockCallArg(request.mock_calls[3], 2, "options").queryParams["starttime"], "8000000001")
+
+    def test_specificSampleRate(self):
+        page = xdrlib.Packer()
+        point(page, 100, 1.5)
+
+        request = Mock()
+        request.side_effect = [authRequest(), timeseriesInfo(), response(page), response(xdrlib.Packer())]
+        sensorcloud.webrequest.Requests.Request = request
+
+        device = sensorcloud.Device("FAKE", "fake")
+        channel = device.sensor("sensor").channel("channel")
+        data = list(channel.timeseries_data(start=0, end=1000, samplerate=sensorcloud.SampleRate.hertz(23)))
+
+        self.assertEqual(data, [sensorcloud.Point(100, 1.5)])
+        options = mockCallArg(request.mock_calls[2], 2, "options")
+        self.assertEqual(options.queryParams["specificsamplerate"], "hertz-23")
+        self.assertFalse("showSampleRateBoundary" in options.queryParams)
+
+class TestUnitConversion(unittest.TestCase):
+
+    def test_unitRanges(self):
+        from sensorcloud.channel import Unit
+        from sensorcloud.timeseries import UnitConversion
+
+        conversion = UnitConversion([Unit("C", "F", 100, 1.8, 32.0), Unit("F", "F", 300, 1.0, 0.0)])
+        block = sensorcloud.PointBlock([50, 100, 200, 300, 400], [10.0, 10.0, 20.0, 30.0, 40.0])
+        self.assertEqual(list(conversion.convert(block).values), [10.0, 50.0, 68.0, 30.0, 40.0])
+        self.assertEqual(list(conversion._convertSlices(block).values), [10.0, 50.0, 68.0, 30.0, 40.0])
+        self.assertTrue(UnitConversion([Unit("C", "C", 0, 1.0, 0.0)]).identity)
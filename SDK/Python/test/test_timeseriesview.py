@@ -0,0 +1,81 @@
+import unittest
+
+from mock import Mock
+
+import sensorcloud
+from sensorcloud.partition import PartitionIndex, TimeSeriesKey
+from sensorcloud.timeseriesview import PageCache, TimeSeriesView
+
+from helpers import *
+
+class TestTimeSeriesView(unittest.TestCase):
+
+    def setUp(self):
+        # the points 10, 20, ... 200 are served a page of 4 points at a time
+        self.server = FakeTimeseriesServer({"channel": [(t, t / 10.0) for t in range(10, 201, 10)]}, page_size=4)
+        sensorcloud.webrequest.Requests.Request = Mock(side_effect=self.server)
+
+        self.device = sensorcloud.Device("FAKE", "fake")
+        self.channel = self.device.sensor("sensor").channel("channel")
+        rate = sensorcloud.SampleRate.hertz(100)
+        self.channel._timeseries_partitions = PartitionIndex([(TimeSeriesKey(rate), {
+            "sample_rate": rate, "start_time": 10, "end_time": 200})])
+
+    def test_slice(self):
+        view = self.channel.view()
+        self.assertEqual(list(view[55:95].timestamps), [60, 70, 80, 90])
+        self.assertEqual(self.server.starts(), [55, 91])
+
+        # the pages are cached, the same range doesn't download again and an overlapping one only downloads the rest
+        self.assertEqual(list(view[60:95].timestamps), [60, 70, 80, 90])
+        self.assertEqual(list(view[85:141].timestamps), [90, 100, 110, 120, 130, 140])
+        self.assertEqual(self.server.starts(), [55, 91, 131])
+
+        self.assertEqual(list(view[195:].timestamps), [200])
+        self.assertEqual(list(view[:20].timestamps), [10])
+        self.assertEqual(view[300:400], sensorcloud.PointBlock())
+        self.assertRaises(TypeError, lambda: view[10])
+
+    def test_pagesOverlap(self):
+        view = self.channel.view()
+        view[100:101]
+        # a page downloaded from 15 stops at the known page that starts at 100
+        self.assertEqual(list(view[15:140].timestamps), range(20, 140, 10))
+        self.assertEqual(self.server.starts(), [100, 15, 51, 91, 131])
+
+    def test_at(self):
+        view = self.channel.view()
+        self.assertEqual(view.at(95), sensorcloud.Point(90, 9.0))
+        self.assertEqual(view.at(90), sensorcloud.Point(90, 9.0))
+        self.assertEqual(view.at(5), None)
+        self.assertEqual(view.at(10 ** 12), sensorcloud.Point(200, 20.0))
+
+        # nothing in the first lookback, the search goes further back
+        self.assertEqual(view.at(95, lookback=3), sensorcloud.Point(90, 9.0))
+
+    def test_eviction(self):
+        cache = PageCache(max_bytes=5 * 12)
+        view = TimeSeriesView(self.channel, cache=cache)
+        view[10:50]
+        view[50:90]
+        self.assertEqual(cache.bytes, 4 * 12)
+
+        # the first page was dropped, it's downloaded again from the start the index remembers
+        self.assertEqual(list(view[30:41].timestamps), [30, 40])
+        self.assertEqual(self.server.starts(), [10, 41, 81, 10])
+        self.assertEqual(cache.page(view._key, 35), (10, 40))
+
+    def test_allRatesCachedToEarliestPartitionEnd(self):
+        hz100, hz1 = sensorcloud.SampleRate.hertz(100), sensorcloud.SampleRate.hertz(1)
+        self.channel._timeseries_partitions = PartitionIndex([
+            (TimeSeriesKey(hz100), {"sample_rate": hz100, "start_time": 10, "end_time": 200}),
+            (TimeSeriesKey(hz1), {"sample_rate": hz1, "start_time": 10, "end_time": 100})])
+        self.channel._histogram_partitions = PartitionIndex()
+        self.assertEqual(len(self.channel.view()[0:201]), 20)
+
+        # an upload to the 1 hertz partition adds a point inside a page that was already downloaded
+        self.channel.timeseries_append(hz1, [sensorcloud.Point(155, 1.0)])
+        self.server.add("channel", [(155, 1.0)])
+        self.server.data["channel"].sort()
+
+        self.assertEqual(list(self.channel.view()[140:160].timestamps), [140, 150, 155])
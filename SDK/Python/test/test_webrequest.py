@@ -0,0 +1,142 @@
+import unittest
+import tempfile
+import mmap
+import zlib
+import os
+import socket
+
+import mock
+
+from sensorcloud.webrequest import Requests, ConnectionPool, _send_streamed
+
+class TestRequestBody(unittest.TestCase):
+
+    def setUp(self):
+        self.chunk_size = Requests.chunk_size
+        Requests.chunk_size = 4
+
+    def tearDown(self):
+        Requests.chunk_size = self.chunk_size
+
+    def test_partsNotJoined(self):
+        data = bytearray("0123456789")
+        body = Requests.RequestBody("head", data, memoryview("abcde"), ["x", "yz"])
+        self.assertEqual(body.size, 4 + 10 + 5 + 3)
+
+        blocks = list(body)
+        self.assertEqual([str(block) for block in blocks], ["head", "0123", "4567", "89", "abcd", "e", "x", "yz"])
+        # the buffer parts are sliced, not copied
+        self.assertTrue(isinstance(blocks[1], buffer))
+
+        # a body can be sent again
+        self.assertEqual(body.getvalue(), "head0123456789abcdexyz")
+        self.assertEqual(body.getvalue(), "head0123456789abcdexyz")
+
+    def test_fileAndMmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write("skip0123456789")
+            f.flush()
+            f.seek(4)
+            body = Requests.RequestBody(f)
+            self.assertEqual(body.size, 10)
+            self.assertEqual(body.getvalue(), "0123456789")
+            self.assertEqual(body.getvalue(), "0123456789")
+
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            body = Requests.RequestBody("x", buffer(m, 4, 6))
+            self.assertEqual(body.getvalue(), "x012345")
+            m.close()
+
+    def test_unknownSize(self):
+        body = Requests.RequestBody(block for block in ["a", "b"])
+        self.assertEqual(body.size, None)
+
+    def test_streamedBodyCompressed(self):
+        options = Requests.RequestOptions()
+        options.requestBody = Requests.RequestBody("header", "x" * 1000)
+        self.assertEqual(options.headers["content-encoding"], "gzip")
+        self.assertEqual(options.requestBody.size, None)
+        self.assertEqual(options.bodySize, 1006)
+        self.assertEqual(zlib.decompress(options.requestBody.getvalue()), "header" + "x" * 1000)
+
+    def test_chunkedTransfer(self):
+        options = Requests.RequestOptions()
+        options.requestBody = Requests.RequestBody("header", "x" * 1000)
+        conn = mock.Mock()
+        _send_streamed(conn, "POST", "/", options.headers, options.requestBody)
+
+        conn.putheader.assert_any_call("Transfer-Encoding", "chunked")
+        sent = "".join(str(call[0][0]) for call in conn.send.call_args_list)
+        self.assertTrue(sent.endswith("0\r\n\r\n"))
+
+        # undo the chunked framing
+        data = ""
+        while True:
+            size, sent = sent.split("\r\n", 1)
+            size = int(size, 16)
+            if size == 0:
+                break
+            data, sent = data + sent[:size], sent[size + 2:]
+        self.assertEqual(zlib.decompress(data), "header" + "x" * 1000)
+
+# other tests replace Requests.Request with a mock
+Request = Requests.Request
+
+def response():
+    response = mock.Mock(status=200, reason="OK", will_close=False)
+    response.getheaders.return_value = []
+    response.read.return_value = ""
+    return response
+
+class TestConnectionReuse(unittest.TestCase):
+
+    def setUp(self):
+        self.conns = []
+        patcher = mock.patch("sensorcloud.webrequest._connect", side_effect=self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(Requests, "connection_pool", ConnectionPool())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, protocol, server):
+        conn = mock.Mock(sock=None)
+        conn.getresponse.side_effect = response
+        self.conns.append(conn)
+        return conn
+
+    def request(self, method):
+        options = Requests.RequestOptions()
+        if method == "POST":
+            options.requestBody = "data"
+        return Request(method, "https://example.com/points", options)
+
+    def test_connectionReused(self):
+        self.request("GET")
+        self.request("POST")
+        self.assertEqual(len(self.conns), 1)
+        self.assertEqual(self.conns[0].request.call_count, 2)
+
+    def test_unsentRequestRetried(self):
+        self.request("GET")
+        self.conns[0].request.side_effect = socket.error("broken pipe")
+        request = self.request("POST")
+        self.assertEqual(request.status_code, 200)
+        self.assertEqual(len(self.conns), 2)
+        self.assertEqual(self.conns[1].request.call_args[0][0], "POST")
+
+    def test_sentRequestNotRetried(self):
+        self.request("GET")
+        # the body was written but the connection closed before the response came back
+        self.conns[0].getresponse.side_effect = socket.error("connection reset")
+        self.assertRaises(socket.error, self.request, "POST")
+        self.assertEqual(len(self.conns), 1)
+        self.assertEqual(self.conns[0].request.call_count, 2)
+        self.conns[0].close.assert_called_once_with()
+
+    def test_sentIdempotentRequestRetried(self):
+        self.request("GET")
+        self.conns[0].getresponse.side_effect = socket.error("connection reset")
+        request = self.request("GET")
+        self.assertEqual(request.status_code, 200)
+        self.assertEqual(len(self.conns), 2)